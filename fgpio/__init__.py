@@ -1,2 +1,14 @@
-from fgpio import GPIO
-import boards
+from .fgpio import GPIO
+from .handle import GPIOHandle, EINTHandle
+from .backends import DevMemBackend, FileBackend, SimBackend
+from .waveform import Waveform
+from .sampler import Sampler
+from .dispatcher import EINTDispatcher
+from .encoder import EncoderPoller
+from .pwmsched import PWMScheduler
+from .softpwm import SoftPWM
+from .scheduler import OutputScheduler
+from .spi import SPI
+from .i2c import I2C
+from .stats import Instrument
+from . import boards
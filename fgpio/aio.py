@@ -0,0 +1,229 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" asyncio interface for fgpio, Python 3 only.
+
+    from fgpio.aio import AsyncGPIO
+"""
+
+import asyncio
+
+
+class AsyncGPIO(object):
+    """ asyncio wrapper around a GPIO object.
+
+        All coroutines waiting on EINT pins share one poller task, which
+        reads EINT_PEND once per tick for every waiter, clears the fired
+        bits with one write and wakes the waiters of those bits. The
+        poller only runs while something is waiting.
+
+        PWM setters go through sysfs, they run in the loop's default
+        executor.
+
+        Example:
+            agpio = AsyncGPIO(gpio)
+            if await agpio.wait_for_edge(38, 'falling', timeout=5):
+                await agpio.pwm_duty_cycle(22, 500000)
+    """
+
+    def __init__(self, gpio, interval=0.001):
+        """ Initialize AsyncGPIO
+
+        Arguments:
+            gpio:GPIO           GPIO object.
+            interval:Float      Seconds between EINT_PEND polls.
+        """
+
+        self.gpio = gpio
+        self.interval = interval
+        self._waiters = {}
+        self._queues = {}
+        self._pins = {}
+        self._poller = None
+
+    async def wait_for_edge(self, pin, trigger=None, timeout=None):
+        """ Wait for an EINT event on pin.
+
+        The pin is initialized with eint_init if not in use yet. Waiters
+        of the same pin share its trigger.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+            trigger:Str     low, high, rising, falling, or both. None
+                            keeps the pin's configured trigger.
+            timeout:Float   Seconds to wait, None waits forever.
+
+        Returns:Float   Loop time the event was seen, None on timeout.
+        """
+
+        bit = self._eint_setup(pin, trigger)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(bit, []).append(fut)
+        self._poller_start()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(bit, [])
+
+            if fut in waiters:
+                waiters.remove(fut)
+
+                if not waiters:
+                    del self._waiters[bit]
+
+    async def events(self, pins, maxsize=0):
+        """ Async iterator over EINT events of pins.
+
+        Pins must be initialized with eint_init.
+
+        Arguments:
+            pins:List       Pin numbers of board connector.
+            maxsize:Int     Events queued before the oldest are dropped,
+                            0 for unbounded.
+
+        Yields:Tuple    (pin, trigger, loop time) per event.
+        """
+
+        q = asyncio.Queue(maxsize)
+        bits = [self._eint_setup(pin, None) for pin in pins]
+
+        for bit in bits:
+            self._queues.setdefault(bit, []).append(q)
+
+        self._poller_start()
+
+        try:
+            while True:
+                yield await q.get()
+        finally:
+            for bit in bits:
+                queues = self._queues.get(bit, [])
+
+                if q in queues:
+                    queues.remove(q)
+
+                    if not queues:
+                        del self._queues[bit]
+
+    async def pwm_init(self, pin, period, duty_cycle):
+        """ Awaitable GPIO.pwm_init."""
+
+        await self._executor(self.gpio.pwm_init, pin, period, duty_cycle)
+
+    async def pwm_period(self, pin, period):
+        """ Awaitable GPIO.pwm_period."""
+
+        await self._executor(self.gpio.pwm_period, pin, period)
+
+    async def pwm_duty_cycle(self, pin, duty_cycle):
+        """ Awaitable GPIO.pwm_duty_cycle."""
+
+        await self._executor(self.gpio.pwm_duty_cycle, pin, duty_cycle)
+
+    async def pwm_start(self, pin):
+        """ Awaitable GPIO.pwm_start."""
+
+        await self._executor(self.gpio.pwm_start, pin)
+
+    async def pwm_stop(self, pin):
+        """ Awaitable GPIO.pwm_stop."""
+
+        await self._executor(self.gpio.pwm_stop, pin)
+
+    async def pwm_close(self, pin):
+        """ Awaitable GPIO.pwm_close."""
+
+        await self._executor(self.gpio.pwm_close, pin)
+
+    def _executor(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _eint_setup(self, pin, trigger):
+        gpio = self.gpio
+
+        if gpio._used.get(pin) is False:
+            if trigger is None:
+                gpio._value_error('Trigger needed to initialize pin %s.' % pin)
+
+            gpio.eint_init(pin, trigger)
+        else:
+            gpio._pin_check(pin, gpio._type_eint)
+
+        bit = 1 << gpio._eint_num[pin]
+
+        if trigger is not None and trigger != gpio._eint_triggers.get(pin):
+            if bit in self._waiters or bit in self._queues:
+                gpio._exception('pin %s already waited on with trigger %s.' % (pin, gpio._eint_triggers.get(pin)))
+
+            gpio._eint_trigger(pin, trigger)
+            gpio._eint_clear_event(pin)
+
+        self._pins[bit] = pin
+        return bit
+
+    def _poller_start(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        gpio = self.gpio
+        addr = gpio._eint_mem_addr(gpio.board.EINT_PEND_OFFSET)
+        loop = asyncio.get_running_loop()
+
+        while self._waiters or self._queues:
+            mask = 0
+
+            for bit in self._waiters:
+                mask |= bit
+
+            for bit in self._queues:
+                mask |= bit
+
+            fired = gpio._mem_read(addr) & mask
+
+            if fired:
+                gpio._mem_write(addr, fired)
+                now = loop.time()
+
+                while fired:
+                    bit = fired & -fired
+                    fired ^= bit
+
+                    for fut in self._waiters.pop(bit, []):
+                        if not fut.done():
+                            fut.set_result(now)
+
+                    pin = self._pins[bit]
+
+                    for q in self._queues.get(bit, []):
+                        if q.full():
+                            q.get_nowait()
+
+                        q.put_nowait((pin, gpio._eint_triggers.get(pin), now))
+
+            await asyncio.sleep(self.interval)
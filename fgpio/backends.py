@@ -0,0 +1,415 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" Register backends for GPIO.
+
+    A backend maps the board register window and returns a Registers
+    like object: words indexable by word index, read/write/modify by
+    byte offset from MEM_OFFSET, and close().
+
+    DevMemBackend   /dev/mem on the board, the default.
+    FileBackend     A plain file standing in for the window, off target.
+    SimBackend      In memory model of the S3C2451 GPIO/EINT behaviour,
+                    with scripted input stimulus.
+
+    DevMemBackend and FileBackend with a path share mappings through
+    mapping.manager.
+"""
+
+import os
+import heapq
+import mmap
+import tempfile
+from array import array
+from timeit import default_timer as _clock
+
+from .registers import Registers, CLOSED
+from . import mapping
+
+
+class Backend(object):
+    """ Base class of register backends."""
+
+    def open(self, board):
+        """ Map the board register window.
+
+        Arguments:
+            board:Config    board config from boards/
+
+        Returns:Registers
+        """
+
+        raise NotImplementedError
+
+
+class DevMemBackend(Backend):
+    """ Registers mapped from /dev/mem at the board's MEM_OFFSET.
+
+        Any file at least MEM_OFFSET + MEM_LENGTH long (sparse is fine)
+        can stand in for /dev/mem. Boards with registers outside the
+        window list them in MEM_WINDOWS, a Dict of name to (address,
+        length), mapped as well into the returned registers' windows.
+    """
+
+    def __init__(self, path='/dev/mem', manager=None):
+        """ Initialize DevMemBackend
+
+        Arguments:
+            path:Str                Memory device.
+            manager:MappingManager  Defaults to mapping.manager.
+        """
+
+        self.path = path
+        self.manager = manager if manager is not None else mapping.manager
+
+    def open(self, board):
+        regs = self.manager.open(self.path, board.MEM_OFFSET, board.MEM_LENGTH)
+        windows = getattr(board, 'MEM_WINDOWS', {})
+
+        try:
+            for name in windows:
+                regs.windows[name] = self.manager.open(self.path, windows[name][0], windows[name][1])
+        except:
+            regs.close()
+            raise
+
+        return regs
+
+
+class FileBackend(Backend):
+    """ Registers mapped from a plain file holding just the window.
+
+        Offset 0 of the file is MEM_OFFSET. Plain memory, so it has none
+        of the side effects of the real registers, ie EINT_PEND is not
+        write 1 to clear.
+    """
+
+    def __init__(self, path=None, manager=None):
+        """ Initialize FileBackend
+
+        Arguments:
+            path:Str                File to map, created if missing. None
+                                    maps an anonymous temporary file, zeroed
+                                    each open and not shared.
+            manager:MappingManager  Defaults to mapping.manager.
+        """
+
+        self.path = path
+        self.manager = manager if manager is not None else mapping.manager
+
+    def open(self, board):
+        size = (board.MEM_LENGTH + mmap.PAGESIZE - 1) & ~(mmap.PAGESIZE - 1)
+
+        if self.path is not None:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) < size:
+                f = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+                try:
+                    if os.fstat(f).st_size < size:
+                        os.ftruncate(f, size)
+                finally:
+                    os.close(f)
+
+            return self.manager.open(self.path, 0, size, os.O_RDWR)
+
+        f, path = tempfile.mkstemp(prefix='fgpio-mem-')
+        os.unlink(path)
+
+        try:
+            if os.fstat(f).st_size < size:
+                os.ftruncate(f, size)
+
+            mm = mmap.mmap(f, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(f)
+
+        return Registers(mm)
+
+
+class SimBackend(Backend):
+    """ In memory model of the board registers.
+
+        Emulates the S3C2451 behaviour fgpio relies on:
+
+        * GPIO_DATA reads give the output latch for pins set as outputs
+          and the driven input level for others. Undriven inputs read
+          their pull up as 1, otherwise 0.
+        * Driving an input with drive()/schedule() sets its EINT_PEND bit
+          when the pin is in EINT function and the edge matches the EINT
+          control trigger. Level triggers set it while the level holds.
+        * EINT_PEND is write 1 to clear.
+
+        Simulated devices, ie i2c.SimI2CDevice, follow pin levels with
+        watch() and answer with drive().
+
+        The same SimBackend keeps its register state across opens, so a
+        test can inspect it after GPIO closes.
+
+        Example:
+            sim = SimBackend(board)
+            gpio = GPIO(board, backend=sim)
+            gpio.eint_init(38, 'falling')
+            sim.drive(38, 1)
+            sim.drive(38, 0)
+            gpio.eint_event(38)     # 1
+    """
+
+    def __init__(self, board):
+        """ Initialize SimBackend
+
+        Arguments:
+            board:Config    board config from boards/
+        """
+
+        self.board = board
+        self._mem = array('I', [0]) * (board.MEM_LENGTH // 4)
+        self._levels = {}
+        self._events = []
+        self._seq = 0
+        self._pins = {}
+        self._data = {}
+        self._watchers = []
+        self._notifying = False
+
+        for pin in board.pins:
+            cfg = board.pins[pin]
+            base = board.banks[cfg['bank']] >> 2
+            eint = cfg['eint']['num'] if 'eint' in cfg else None
+            self._pins[pin] = (base, cfg['gpio']['num'], eint)
+            self._data.setdefault(base + (board.GPIO_DATA_OFFSET >> 2), (base, []))[1].append(pin)
+
+        self._pend = board.EINT_PEND_OFFSET >> 2
+
+    def open(self, board):
+        return SimRegisters(self)
+
+    def drive(self, pin, level):
+        """ Drive an input pin from outside.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+            level:Int       1 or 0, None stops driving it.
+        """
+
+        if pin not in self._pins:
+            raise ValueError('fgpio: Not a valid pin number: %s' % pin)
+
+        old = self.level(pin)
+
+        if level is None:
+            self._levels.pop(pin, None)
+        else:
+            self._levels[pin] = 1 if level else 0
+
+        self._edge(pin, old, self.level(pin))
+
+        if self._watchers:
+            self._notify()
+
+    def schedule(self, events):
+        """ Script input changes, applied on register accesses once due.
+
+        Arguments:
+            events:List     (delay, pin, level) with delay in seconds
+                            from now.
+        """
+
+        now = _clock()
+
+        for delay, pin, level in events:
+            self._seq += 1
+            heapq.heappush(self._events, (now + delay, self._seq, pin, level))
+
+    def pending(self):
+        """ Scripted events not applied yet.
+
+        Returns:Int
+        """
+
+        return len(self._events)
+
+    def watch(self, callback):
+        """ Call callback() after every register write and drive(), ie
+        for simulated devices following pin levels. Changes the callback
+        makes do not call it again.
+
+        Arguments:
+            callback:Callable   Called with no arguments.
+        """
+
+        self._watchers.append(callback)
+
+    def unwatch(self, callback):
+        """ Stop calling a watch() callback."""
+
+        self._watchers.remove(callback)
+
+    def level(self, pin):
+        """ Level the pin reads on GPIO_DATA.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+
+        Returns:Int     1 or 0.
+        """
+
+        base, num, eint = self._pins[pin]
+        data = self._mem[base + (self.board.GPIO_DATA_OFFSET >> 2)]
+
+        if self._func(pin) == self.board.FUNC_OUT:
+            return (data >> num) & 1
+
+        if pin in self._levels:
+            return self._levels[pin]
+
+        updn = (self._mem[base + (self.board.GPIO_UPD_OFFSET >> 2)] >> (num * 2)) & 3
+        return 1 if updn == self.board.UPDN_UP else 0
+
+    def _func(self, pin):
+        base, num, eint = self._pins[pin]
+        return (self._mem[base + (self.board.GPIO_CON_OFFSET >> 2)] >> (num * 2)) & 3
+
+    def _trigger(self, pin):
+        base, num, eint = self._pins[pin]
+
+        if eint is None or self._func(pin) != self.board.FUNC_EINT:
+            return None
+
+        word = self._mem[(self.board.EINT_CONT_OFFSET >> 2) + ((eint * 4) // 32)]
+        code = (word >> ((eint * 4) % 32)) & 7
+        b = self.board
+
+        if code == b.EINT_LOW:
+            return 'low'
+        elif code == b.EINT_HIGH:
+            return 'high'
+        elif code & b.EINT_FALL and code & b.EINT_RISE:
+            return 'both'
+        elif code & b.EINT_RISE:
+            return 'rising'
+
+        return 'falling'
+
+    def _edge(self, pin, old, new):
+        trigger = self._trigger(pin)
+
+        if trigger is None or old == new:
+            return
+
+        if trigger == 'both' or (trigger == 'rising' and new) or (trigger == 'falling' and not new):
+            self._mem[self._pend] |= 1 << self._pins[pin][2]
+
+    def _advance(self):
+        events = self._events
+        now = _clock()
+
+        while events and events[0][0] <= now:
+            t, seq, pin, level = heapq.heappop(events)
+            self.drive(pin, level)
+
+    def _get(self, index):
+        if self._events:
+            self._advance()
+
+        if index == self._pend:
+            # Level triggers stay pending while the level holds.
+            for pin in self._levels:
+                trigger = self._trigger(pin)
+
+                if trigger == 'low' and not self._levels[pin] or trigger == 'high' and self._levels[pin]:
+                    self._mem[index] |= 1 << self._pins[pin][2]
+
+            return self._mem[index]
+
+        if index in self._data:
+            base, pins = self._data[index]
+            con = self._mem[base + (self.board.GPIO_CON_OFFSET >> 2)]
+            data = self._mem[index]
+
+            for pin in pins:
+                num = self._pins[pin][1]
+
+                if (con >> (num * 2)) & 3 != self.board.FUNC_OUT:
+                    data = (data & ~(1 << num)) | (self.level(pin) << num)
+
+            return data
+
+        return self._mem[index]
+
+    def _set(self, index, value):
+        if self._events:
+            self._advance()
+
+        if index == self._pend:
+            self._mem[index] &= ~value
+            return
+
+        self._mem[index] = value
+
+        if self._watchers:
+            self._notify()
+
+    def _notify(self):
+        if self._notifying:
+            return
+
+        self._notifying = True
+
+        try:
+            for callback in self._watchers:
+                callback()
+        finally:
+            self._notifying = False
+
+
+class SimRegisters(Registers):
+    """ Registers view of a SimBackend."""
+
+    def __init__(self, sim):
+        self._sim = sim
+        self.words = _SimWords(sim)
+        self._view = None
+        self._locks = {}
+
+    def close(self):
+        self.words = CLOSED
+
+
+class _SimWords(object):
+    __slots__ = ('_get', '_set', '_len')
+
+    def __init__(self, sim):
+        self._get = sim._get
+        self._set = sim._set
+        self._len = len(sim._mem)
+
+    def __getitem__(self, index):
+        return self._get(index)
+
+    def __setitem__(self, index, value):
+        self._set(index, value & 0xffffffff)
+
+    def __len__(self):
+        return self._len
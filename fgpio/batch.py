@@ -0,0 +1,223 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+
+class Batch(object):
+    """ Coalesces register updates of a GPIO object into one write each.
+
+        While a batch is open every register update made through the GPIO
+        methods (gpio_*, eint_*, port_write, ...) is collected as a
+        (mask, value) pair per register instead of being written. commit()
+        writes each touched register once, in the order GPIO_DATA,
+        GPIO_UPD, GPIO_CON, EINT control, other, EINT_PEND, so outputs
+        latch their value before being switched to output. Reads made
+        during the batch see the pending values. Handles and the engines
+        that write registers directly are not batched, nor are PWM sysfs
+        writes.
+
+        Leaving a with block commits, or aborts if an exception was
+        raised. abort() drops the pending writes and puts pin use state
+        back as it was when the batch began. Ownership claims of pins
+        closed in the batch are released on commit, so abort keeps them.
+
+        Example:
+            with gpio.batch() as b:
+                gpio.gpio_init(40, 'out')
+                gpio.gpio_write(40, 1)
+                gpio.gpio_init(38, 'in', 'up')
+            print(b.saved)
+    """
+
+    def __init__(self, gpio):
+        """ Initialize Batch
+
+        Arguments:
+            gpio:GPIO       GPIO object to batch.
+        """
+
+        self._gpio = gpio
+        self._pending = {}
+        self._clears = {}
+        self._releases = set()
+        self._state = None
+        self.requested = 0
+        self.written = 0
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._state is None:
+            return False
+
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+        return False
+
+    @property
+    def saved(self):
+        """ Device writes saved by batching."""
+
+        return self.requested - self.written
+
+    def begin(self):
+        """ Start collecting register updates."""
+
+        gpio = self._gpio
+
+        if gpio._batch is not None:
+            gpio._exception('Batch already open.')
+
+        self._state = (dict(gpio._used),
+                       dict(gpio._eint_triggers))
+        self._pending = {}
+        self._clears = {}
+        self._releases = set()
+        gpio._batch = self
+
+    def commit(self):
+        """ Write the collected updates, one write per register."""
+
+        gpio = self._gpio
+        self._end()
+        regs = gpio._regs
+
+        try:
+            for addr in sorted(self._pending, key=gpio._mem_rank):
+                mask, value = self._pending[addr]
+
+                if mask == 0xffffffff:
+                    regs.write(addr, value)
+                else:
+                    regs.modify(addr, mask, value)
+
+                self.written += 1
+
+            # Write 1 to clear registers, after configuration.
+            for addr in sorted(self._clears):
+                regs.write(addr, self._clears[addr])
+                self.written += 1
+        finally:
+            self._pending = {}
+            self._clears = {}
+            self._release()
+            gpio._mem_close()
+
+    def abort(self):
+        """ Drop the collected updates and restore pin use state."""
+
+        gpio = self._gpio
+        used, triggers = self._state
+        self._end()
+        self._pending = {}
+        self._clears = {}
+
+        self._releases = set()
+
+        for pin in used:
+            if gpio._used[pin] != used[pin]:
+                gpio._handle_release(pin)
+
+            gpio._pin_use(pin, used[pin])
+
+            # Pins closed in the batch kept their claim, put its function back.
+            if gpio._ownership is not None and used[pin] is not False:
+                gpio._ownership.claim(pin, used[pin])
+
+        gpio._eint_triggers.clear()
+        gpio._eint_triggers.update(triggers)
+        gpio._mem_close()
+
+    def _release(self):
+        # Ownership claims of pins closed in the batch.
+        gpio = self._gpio
+
+        for pin in sorted(self._releases):
+            if gpio._used[pin] is False:
+                gpio._ownership.release(pin)
+
+        self._releases = set()
+
+    def modify(self, addr, mask, value):
+        """ Collect a masked register update.
+
+        Arguments:
+            addr:Int        Byte offset of register.
+            mask:Int        Bits to change.
+            value:Int       New value of the masked bits.
+        """
+
+        self.requested += 1
+        p = self._pending.get(addr)
+
+        if p is None:
+            self._pending[addr] = [mask, value & mask]
+        else:
+            p[0] |= mask
+            p[1] = (p[1] & ~mask) | (value & mask)
+
+    def write(self, addr, value):
+        """ Collect a whole register write.
+
+        Writes to write 1 to clear registers accumulate their bits.
+
+        Arguments:
+            addr:Int        Byte offset of register.
+            value:Int       Register value.
+        """
+
+        if addr in self._gpio._mem_w1c:
+            self.requested += 1
+            self._clears[addr] = self._clears.get(addr, 0) | value
+        else:
+            self.modify(addr, 0xffffffff, value)
+
+    def read(self, addr, live):
+        """ Apply pending updates to a value read from the device.
+
+        Arguments:
+            addr:Int        Byte offset of register.
+            live:Int        Register value read from the device.
+
+        Returns:Int     Value the register will have after commit.
+        """
+
+        p = self._pending.get(addr)
+
+        if p is None:
+            return live
+
+        return (live & ~p[0]) | p[1]
+
+    def _end(self):
+        if self._gpio._batch is not self:
+            self._gpio._exception('Batch not open.')
+
+        self._gpio._batch = None
+        self._state = None
@@ -0,0 +1,1241 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" Benchmark suite for fgpio.
+
+    Measures GPIO toggle rate, read latency, EINT event to callback
+    latency, bulk and port operations, close_all time, PWM update rate,
+    bit-banged SPI and I2C throughput, quadrature decoding rate and
+    output scheduler lateness, board layout load and GPIO construction
+    time, and emits JSON with percentiles and
+    environment metadata so runs can be compared across releases and
+    boards.
+
+    Off target the file or simulated register backend and a temporary
+    directory standing in for /sys/class/pwm are used. Those numbers show
+    Python overhead of the access paths, not the speed of the real bus
+    or PWM driver. With --backend devmem it runs on the board's real
+    registers and sysfs, the pins used must be free to toggle.
+
+    python -m fgpio.bench [--backend file|sim|devmem] [-n COUNT]
+                          [--only NAME,...] [--format json|text] [-o FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import tempfile
+import argparse
+import threading
+import multiprocessing
+from timeit import default_timer as timer
+
+from .fgpio import GPIO
+from .backends import DevMemBackend, FileBackend, SimBackend
+from .dispatcher import EINTDispatcher
+from .encoder import EncoderPoller
+from .daemon import GPIODaemon, GPIOClient
+from .ownership import Ownership
+from .spi import SPI
+from .scheduler import OutputScheduler
+from .i2c import I2C, SimI2CDevice
+from . import mapping
+from . import layout
+from .boards import nanopi
+
+BENCHES = ['toggle', 'read', 'eint', 'bulk', 'close_all', 'churn', 'threads', 'processes', 'daemon', 'pwm', 'spi', 'i2c', 'encoder', 'scheduler', 'startup']
+
+
+def sys_pwm_dir(board, path=None):
+    """ Create a directory tree standing in for /sys/class/pwm.
+
+    Arguments:
+        board:Config    board config from boards/
+        path:Str        Directory to create in, temporary if None.
+
+    Returns:Str     Path of the directory.
+    """
+
+    if path is None:
+        path = tempfile.mkdtemp(prefix='fgpio-pwm-')
+
+    chip = os.path.join(path, 'pwmchip%s' % board.PWMCHIP_ID)
+    os.makedirs(chip)
+
+    for name in ['export', 'unexport']:
+        open(os.path.join(chip, name), 'w').close()
+
+    for pin in board.pins:
+        if 'pwm' in board.pins[pin]:
+            pwm = os.path.join(chip, 'pwm%s' % board.pins[pin]['pwm']['num'])
+            os.makedirs(pwm)
+
+            for name in ['period', 'duty_cycle', 'enable']:
+                with open(os.path.join(pwm, name), 'w') as f:
+                    f.write('0')
+
+    return path
+
+
+def percentiles(samples):
+    """ Summarize latency samples.
+
+    Arguments:
+        samples:List    Latencies in seconds.
+
+    Returns:Dict    count, mean, min, p50, p90, p99, p999 and max in
+                    microseconds.
+    """
+
+    if not samples:
+        return {'count': 0}
+
+    s = sorted(samples)
+    n = len(s)
+    ret = {'count': n, 'mean': sum(s) / n * 1e6, 'min': s[0] * 1e6, 'max': s[-1] * 1e6}
+
+    for name, q in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999)]:
+        ret[name] = s[min(int(q * n), n - 1)] * 1e6
+
+    return ret
+
+
+def environment(board, backend):
+    """ Metadata describing where a run happened.
+
+    Arguments:
+        board:Config    board config from boards/
+        backend:Backend Register backend used.
+
+    Returns:Dict
+    """
+
+    try:
+        import pkg_resources
+        version = pkg_resources.get_distribution('pyfa_gpio').version
+    except Exception:
+        version = None
+
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'host': socket.gethostname(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpus': _cpus(),
+            'fgpio': version,
+            'board': '%s.%s' % (board.__class__.__module__, board.__class__.__name__),
+            'backend': backend.__class__.__name__,
+            'timer_resolution': _timer_resolution()}
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+
+def _timer_resolution():
+    # Smallest step seen from the benchmark timer, seconds.
+    best = 1.0
+
+    for i in range(1000):
+        t0 = timer()
+        t1 = timer()
+
+        while t1 == t0:
+            t1 = timer()
+
+        best = min(best, t1 - t0)
+
+    return best
+
+
+def _rate(func, count):
+    start = timer()
+    func(count)
+    return count / (timer() - start)
+
+
+def _latencies(func, count):
+    # Time each call, minus the cost of reading the timer.
+    overhead = min(_overhead() for i in range(5))
+    ret = [0.0] * count
+
+    for i in range(count):
+        t0 = timer()
+        func()
+        ret[i] = max(0.0, timer() - t0 - overhead)
+
+    return ret
+
+
+def _overhead():
+    t0 = timer()
+    for i in range(1000):
+        timer()
+    return (timer() - t0) / 1000
+
+
+def bench_toggle(gpio, pin, count):
+    """ Compare gpio_write against GPIOHandle.write on one pin.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pin must not be in use.
+        pin:Int         Pin number of board connector.
+        count:Int       Number of writes per run.
+
+    Returns:Dict    Writes per second for each path.
+    """
+
+    h = gpio.gpio_init(pin, 'out', handle=True)
+
+    def write(n):
+        w = gpio.gpio_write
+        for i in range(n):
+            w(pin, i & 1)
+
+    def handle_write(n):
+        w = h.write
+        for i in range(n):
+            w(i & 1)
+
+    def handle_toggle(n):
+        t = h.toggle
+        for i in range(n):
+            t()
+
+    try:
+        return {'gpio_write': _rate(write, count),
+                'handle_write': _rate(handle_write, count),
+                'handle_toggle': _rate(handle_toggle, count)}
+    finally:
+        gpio.gpio_close(pin)
+
+
+def bench_read(gpio, pin, count):
+    """ Latency distribution of gpio_read and GPIOHandle.read.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pin must not be in use.
+        pin:Int         Pin number of board connector.
+        count:Int       Number of reads.
+
+    Returns:Dict    percentiles() per path.
+    """
+
+    h = gpio.gpio_init(pin, 'in', handle=True)
+
+    try:
+        return {'gpio_read': percentiles(_latencies(lambda: gpio.gpio_read(pin), count)),
+                'handle_read': percentiles(_latencies(h.read, count))}
+    finally:
+        gpio.gpio_close(pin)
+
+
+def bench_eint(gpio, pin, count, stimulus, out_pin=None):
+    """ EINT event to EINTDispatcher callback latency.
+
+    Arguments:
+        gpio:GPIO           GPIO object, pins must not be in use.
+        pin:Int             EINT pin number, triggered on both edges.
+        count:Int           Number of events.
+        stimulus:Callable   stimulus(level) makes the edge, ie
+                            SimBackend.drive or an output wired to pin.
+        out_pin:Int         Output pin driving pin, initialized and
+                            closed here if given.
+
+    Returns:Dict    percentiles() of latency, and missed events.
+    """
+
+    gpio.eint_init(pin, 'both')
+
+    if out_pin is not None:
+        gpio.gpio_init(out_pin, 'out')
+
+    fired = threading.Event()
+    seen = [0.0]
+
+    def callback(p, trigger, timestamp):
+        seen[0] = timer()
+        fired.set()
+
+    d = EINTDispatcher(gpio, workers=1, spin=0.01)
+    d.register(pin, callback)
+    d.start()
+    samples = []
+    missed = 0
+
+    try:
+        for i in range(count):
+            fired.clear()
+            t0 = timer()
+            stimulus((i + 1) & 1)
+
+            if fired.wait(1.0):
+                samples.append(seen[0] - t0)
+            else:
+                missed += 1
+    finally:
+        d.stop()
+        gpio.eint_close(pin)
+
+        if out_pin is not None:
+            gpio.gpio_close(out_pin)
+
+    ret = percentiles(samples)
+    ret['missed'] = missed
+    return ret
+
+
+def bench_bulk(gpio, pins, count):
+    """ Compare per pin calls against bulk and port operations.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       Pin numbers, all on one bank.
+        count:Int       Number of operations per run.
+
+    Returns:Dict    Operations per second for each path, one operation
+                    covering all pins.
+    """
+
+    gpio.gpio_init_many(pins, 'out')
+    bank = gpio.layout.bank[pins[0]]
+    mask = 0
+
+    for pin in pins:
+        mask |= 1 << gpio._num[pin]
+
+    def write_each(n):
+        w = gpio.gpio_write
+        for i in range(n):
+            for pin in pins:
+                w(pin, i & 1)
+
+    def write_many(n):
+        w = gpio.gpio_write_many
+        values = [dict((pin, 0) for pin in pins), dict((pin, 1) for pin in pins)]
+        for i in range(n):
+            w(values[i & 1])
+
+    def read_each(n):
+        r = gpio.gpio_read
+        for i in range(n):
+            for pin in pins:
+                r(pin)
+
+    def read_many(n):
+        r = gpio.gpio_read_many
+        for i in range(n):
+            r(pins)
+
+    def port_write(n):
+        w = gpio.port_write
+        values = [0, mask]
+        for i in range(n):
+            w(bank, mask, values[i & 1])
+
+    def port_read(n):
+        r = gpio.port_read
+        for i in range(n):
+            r(bank)
+
+    try:
+        return {'gpio_write_each': _rate(write_each, count),
+                'gpio_write_many': _rate(write_many, count),
+                'gpio_read_each': _rate(read_each, count),
+                'gpio_read_many': _rate(read_many, count),
+                'port_write': _rate(port_write, count),
+                'port_read': _rate(port_read, count)}
+    finally:
+        for pin in pins:
+            gpio.gpio_close(pin)
+
+
+class _NoLock(object):
+    def acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _YieldWords(object):
+    # Yields to other threads around every register read, so a
+    # read-modify-write not under a lock gets interleaved, and a read
+    # back sees updates other threads lost meanwhile. sleep(0) rarely
+    # hands the GIL over on Python 2, so it sleeps a little.
+    def __init__(self, words):
+        self._words = words
+
+    def __getitem__(self, index):
+        time.sleep(0.000001)
+        value = self._words[index]
+        time.sleep(0.000001)
+        return value
+
+    def __setitem__(self, index, value):
+        self._words[index] = value
+
+    def __len__(self):
+        return len(self._words)
+
+
+def bench_threads(gpio, pins, count, modes=('word', 'global', 'unlocked'), widen=True):
+    """ Stress concurrent writes, a thread per pin.
+
+    Each thread writes alternating values to its pin through a handle
+    and reads the bit back, a value another thread's read-modify-write
+    put back is counted as lost. Runs with the per word register locks,
+    with one lock for all registers, and with no locks to show what the
+    locks prevent. The thread switch interval is shortened while running
+    to provoke races.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       Pin numbers, ie spread over two banks.
+        count:Int       Writes per thread.
+        modes:List      Lock modes to run.
+        widen:Bool      Yield between the read and the write of each
+                        read-modify-write, without it unlocked updates
+                        are rarely lost. Rates then include a thread
+                        switch per register read.
+
+    Returns:Dict    rate (writes/s over all threads) and lost per mode.
+    """
+
+    ret = {}
+
+    for mode in modes:
+        gpio.gpio_init_many(pins, 'out')
+        regs = gpio._regs
+
+        if mode == 'global':
+            lock = threading.Lock()
+            regs.lock = lambda offset: lock
+        elif mode == 'unlocked':
+            regs.lock = lambda offset: _NoLock()
+
+        words = regs.words
+
+        if widen:
+            regs.words = _YieldWords(words)
+
+        handles = [gpio._gpio_handle(pin) for pin in pins]
+        lost = [0] * len(pins)
+        go = threading.Event()
+
+        def worker(n):
+            h = handles[n]
+            write = h.write
+            read = h.read
+            bad = 0
+            go.wait()
+
+            for i in range(count):
+                v = i & 1
+                write(v)
+
+                if read() != v:
+                    bad += 1
+
+            lost[n] = bad
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(len(pins))]
+
+        for t in threads:
+            t.start()
+
+        switch = _switch_interval(1e-6)
+
+        try:
+            start = timer()
+            go.set()
+
+            for t in threads:
+                t.join()
+
+            elapsed = timer() - start
+        finally:
+            _switch_interval(switch)
+            regs.words = words
+
+            if mode != 'word':
+                del regs.lock
+
+            for pin in pins:
+                gpio.gpio_close(pin)
+
+        ret[mode] = {'rate': count * len(pins) / elapsed, 'lost': sum(lost)}
+
+    return ret
+
+
+def _switch_interval(interval):
+    # Python 2 counts bytecodes instead.
+    try:
+        old = sys.getswitchinterval()
+        sys.setswitchinterval(interval)
+    except AttributeError:
+        old = sys.getcheckinterval()
+        sys.setcheckinterval(1 if interval < old else int(interval))
+
+    return old
+
+
+def _process_worker(board, new_backend, directory, pin, count, start, results):
+    gpio = GPIO(board, backend=new_backend(), ownership=Ownership(board, directory))
+    gpio.gpio_init(pin, 'out')
+    write = gpio.gpio_write
+    start.wait()
+    t0 = timer()
+
+    for i in range(count):
+        write(pin, i & 1)
+
+    elapsed = timer() - t0
+    results.put((elapsed, gpio._ownership.stats()))
+    gpio.gpio_close(pin)
+    gpio._ownership.close()
+
+
+def bench_processes(board, new_backend, pins, count, procs=(1, 2, 4)):
+    """ gpio_write throughput of processes sharing the registers.
+
+    Each process has its own GPIO with an Ownership in one temporary
+    directory, claims one of pins and writes it count times. Pins on
+    the same bank contend for the bank lock.
+
+    Arguments:
+        board:Config            board config from boards/
+        new_backend:Callable    Returns a Backend on the shared registers,
+                                called in each process.
+        pins:List               Pin numbers, one per process.
+        count:Int               Writes per process.
+        procs:List              Process counts to run.
+
+    Returns:Dict    Per process count, rate (writes/s over all), and the
+                    bank lock hold_mean, hold_max, wait_mean, wait_max
+                    in microseconds, worst over processes.
+    """
+
+    directory = tempfile.mkdtemp(prefix='fgpio-own-')
+    ret = {}
+
+    try:
+        for n in procs:
+            start = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_process_worker,
+                                               args=(board, new_backend, directory, pins[k], count, start, results))
+                       for k in range(n)]
+
+            for w in workers:
+                w.start()
+
+            start.set()
+            stats = [results.get(timeout=120) for w in workers]
+
+            for w in workers:
+                w.join()
+
+            res = {'rate': n * count / max(s[0] for s in stats)}
+
+            for key in ['hold_mean', 'hold_max', 'wait_mean', 'wait_max']:
+                res[key] = max(max(b[key] for b in s[1].values()) for s in stats) * 1e6
+
+            ret['%d' % n] = res
+    finally:
+        shutil.rmtree(directory)
+
+    return ret
+
+
+def _daemon_worker(path, pin, count, batch, start, results):
+    client = GPIOClient(path)
+    client.gpio_init(pin, 'out')
+    write = client.gpio_write
+    start.wait()
+    samples = _latencies(lambda: write(pin, 1), count)
+    frames = max(count // batch, 1)
+    t0 = timer()
+
+    for i in range(frames):
+        with client.pipeline() as p:
+            for k in range(batch):
+                p.gpio_write(pin, k & 1)
+
+    elapsed = timer() - t0
+    results.put((samples, sum(samples), frames * batch, elapsed))
+    client.close()
+
+
+def bench_daemon(gpio, pins, count, clients=(1, 4, 16), batch=100):
+    """ GPIODaemon round trip latency and throughput.
+
+    Serves gpio from a temporary socket to client processes, each
+    owning one of pins. Each client times count single gpio_write round
+    trips, then writes count times in pipelines of batch operations.
+
+    Arguments:
+        gpio:GPIO       GPIO object, no pins in use.
+        pins:List       Pin numbers, one per client.
+        count:Int       Writes per client and mode.
+        clients:List    Client counts to run, at most len(pins).
+        batch:Int       Operations per pipelined round trip.
+
+    Returns:Dict    Per client count, latency percentiles of single
+                    round trips, rate (round trips/s over all clients)
+                    and pipelined rate (writes/s over all clients).
+    """
+
+    directory = tempfile.mkdtemp(prefix='fgpio-daemon-')
+    daemon = GPIODaemon(gpio, os.path.join(directory, 'sock'))
+    daemon.start()
+    ret = {}
+
+    try:
+        for n in clients:
+            if n > len(pins):
+                continue
+
+            start = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_daemon_worker,
+                                               args=(daemon.path, pins[k], count, batch, start, results))
+                       for k in range(n)]
+
+            for w in workers:
+                w.start()
+
+            start.set()
+            stats = [results.get(timeout=120) for w in workers]
+
+            for w in workers:
+                w.join()
+
+            ret['%d' % n] = {'latency': percentiles([t for s in stats for t in s[0]]),
+                             'rate': n * count / max(s[1] for s in stats),
+                             'pipelined': sum(s[2] for s in stats) / max(s[3] for s in stats)}
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory)
+
+    return ret
+
+
+def bench_churn(board, new_backend, pin, count, lingers=(0, 1.0)):
+    """ gpio_init/gpio_close cycles of a lone pin, mapping and unmapping.
+
+    With linger 0 every cycle opens, maps and unmaps the registers, with
+    a linger time the mapping manager keeps the mapping between cycles.
+
+    Arguments:
+        board:Config            board config from boards/
+        new_backend:Callable    Returns a Backend using mapping.manager.
+        pin:Int                 Pin number, must not be in use.
+        count:Int               Cycles per linger.
+        lingers:List            mapping.manager.linger values to run.
+
+    Returns:Dict    percentiles() of cycle time and mappings made, per
+                    linger.
+    """
+
+    manager = mapping.manager
+    old = manager.linger
+    ret = {}
+
+    try:
+        for linger in lingers:
+            manager.linger = linger
+            manager.flush()
+            opens = manager.opens
+            gpio = GPIO(board, backend=new_backend())
+            samples = []
+
+            for i in range(count):
+                t0 = timer()
+                gpio.gpio_init(pin, 'out')
+                gpio.gpio_close(pin)
+                samples.append(timer() - t0)
+
+            res = percentiles(samples)
+            res['mappings'] = manager.opens - opens
+            ret['linger_%s' % linger] = res
+    finally:
+        manager.linger = old
+        manager.flush()
+
+    return ret
+
+
+def bench_close_all(gpio, pins, count):
+    """ Time of gpio_close_all with pins initialized.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       Pin numbers to initialize before each close.
+        count:Int       Number of closes.
+
+    Returns:Dict    percentiles() of close_all time.
+    """
+
+    samples = []
+
+    for i in range(count):
+        gpio.gpio_init_many(pins, 'out')
+        t0 = timer()
+        gpio.gpio_close_all()
+        samples.append(timer() - t0)
+
+    return percentiles(samples)
+
+
+def bench_pwm(gpio, pin, count):
+    """ Compare PWM duty cycle updates against open/write/close per update.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pin must not be in use.
+        pin:Int         PWM pin number of board connector.
+        count:Int       Number of updates per run.
+
+    Returns:Dict    Updates per second for each path.
+    """
+
+    gpio.pwm_init(pin, 1000000, 0)
+    num = gpio._pwm_num[pin]
+    period_path = gpio._sys_pwm_period % num
+    duty_path = gpio._sys_pwm_duty_cycle % num
+
+    def sysfs(n):
+        # The per update work pwm_duty_cycle did before fds were cached.
+        for i in range(n):
+            gpio._int_check(i, 'duty cycle')
+            os.path.exists(period_path)
+            gpio._sys_read(period_path)
+            os.path.exists(duty_path)
+            gpio._sys_write(duty_path, i % 1000)
+
+    def cached(n):
+        d = gpio.pwm_duty_cycle
+        for i in range(n):
+            d(pin, i % 1000)
+
+    try:
+        return {'pwm_sysfs_open': _rate(sysfs, count),
+                'pwm_duty_cycle': _rate(cached, count)}
+    finally:
+        gpio.pwm_close(pin)
+
+
+def bench_spi(gpio, pins, count):
+    """ Bit-banged SPI throughput in bytes/s.
+
+    MISO is wired to MOSI in software, reading back the output latch.
+    gpio_calls is the same mode 0 transfer done with gpio_write and
+    gpio_read per bit, for comparison.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       SCLK, MOSI and CS pin numbers.
+        count:Int       Bytes per run.
+
+    Returns:Dict    Bytes per second for write, transfer and gpio_calls.
+    """
+
+    sclk, mosi, cs = pins
+    gpio.gpio_init_many(pins, 'out')
+
+    try:
+        spi = SPI(gpio, sclk=sclk, mosi=mosi, miso=mosi, cs=cs)
+        data = bytearray(i & 0xff for i in range(count))
+        out = bytearray(count)
+
+        def calls(n):
+            write = gpio.gpio_write
+            read = gpio.gpio_read
+            write(cs, 0)
+
+            for k in range(n):
+                byte = data[k]
+                r = 0
+
+                for bit in range(7, -1, -1):
+                    write(mosi, (byte >> bit) & 1)
+                    write(sclk, 1)
+                    r = (r << 1) | read(mosi)
+                    write(sclk, 0)
+
+                out[k] = r
+
+            write(cs, 1)
+
+        return {'write': _rate(lambda n: spi.write(data[:n]), count),
+                'transfer': _rate(lambda n: spi.transfer(data[:n], out), count),
+                'gpio_calls': _rate(calls, max(count // 10, 1))}
+    finally:
+        for pin in pins:
+            gpio.gpio_close(pin)
+
+
+def bench_i2c(gpio, pins, count, address):
+    """ Bit-banged I2C throughput against a slave.
+
+    The slave must store written bytes from a register pointer set by
+    the first one and read them back, like an EEPROM or
+    i2c.SimI2CDevice. Runs unthrottled and at 100 kHz.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       SDA and SCL pin numbers.
+        count:Int       Bytes per transfer, at most 255.
+        address:Int     Slave address.
+
+    Returns:Dict    Per frequency, write and read bytes/s and the SCL
+                    rate in kHz they amount to, 9 clocks per byte.
+    """
+
+    gpio.gpio_init_many(pins, 'in')
+    data = bytearray(i & 0xff for i in range(count))
+    out = bytearray(count)
+    ret = {}
+
+    try:
+        for frequency in (0, 100000):
+            i2c = I2C(gpio, pins[0], pins[1], frequency=frequency)
+            write = _rate(lambda n: i2c.write(address, b'\0' + data[:n]), count)
+            read = _rate(lambda n: i2c.write_read(address, b'\0', n, out), count)
+
+            if out != data:
+                gpio._exception('I2C read back differs from data written.')
+
+            ret['%d' % frequency if frequency else 'unthrottled'] = {
+                'write': write, 'read': read, 'scl_khz': min(write, read) * 9 / 1000}
+    finally:
+        for pin in pins:
+            gpio.gpio_close(pin)
+
+    return ret
+
+
+def bench_encoder(gpio, pins, count, drive):
+    """ Quadrature decoding rate with EncoderPoller.
+
+    Each step drives one channel to the next quadrature state and polls
+    once, against the same steps handled with eint_event/eint_clear per
+    pin, which does not read levels or decode. Both include the cost of
+    drive, and on SimBackend of simulating the GPIO_DATA read, which
+    outweighs the decoding.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       Channel A and B pins, EINT capable.
+        count:Int       Steps per run.
+        drive:Callable  drive(pin, level) sets an input level, ie
+                        SimBackend.drive.
+
+    Returns:Dict    poll and eint_event edges/s, idle polls/s, and
+                    missed counts of the poll run.
+    """
+
+    poller = EncoderPoller(gpio)
+    a, b = pins
+    levels = [(0, 0), (1, 0), (1, 1), (0, 1)]
+
+    for pin in pins:
+        drive(pin, 0)
+
+    enc = poller.encoder(a, b)
+
+    def decode(n):
+        poll = poller.poll
+
+        for i in range(1, n + 1):
+            if i & 1:
+                drive(a, levels[i & 3][0])
+            else:
+                drive(b, levels[i & 3][1])
+
+            poll()
+
+    def events(n):
+        event = gpio.eint_event
+        clear = gpio.eint_clear
+
+        for i in range(1, n + 1):
+            if i & 1:
+                drive(a, levels[i & 3][0])
+            else:
+                drive(b, levels[i & 3][1])
+
+            for pin in pins:
+                if event(pin):
+                    clear(pin)
+
+    def idle(n):
+        poll = poller.poll
+
+        for i in range(n):
+            poll()
+
+    try:
+        ret = {'poll': _rate(decode, count)}
+        ret['missed'] = enc.missed
+
+        if enc.position != count:
+            gpio._exception('Encoder position %s after %s steps.' % (enc.position, count))
+
+        ret['eint_event'] = _rate(events, count)
+        ret['poll_idle'] = _rate(idle, count)
+        return ret
+    finally:
+        poller.remove(enc)
+
+        for pin in pins:
+            drive(pin, None)
+
+
+def bench_scheduler(gpio, pins, count, period=0.0001):
+    """ OutputScheduler lateness, plain and in real-time mode.
+
+    Queues count deadlines period apart on pins of one bank, each
+    toggling every pin so they merge into one write, starting 50ms
+    out. Real-time mode runs on CPU 0 with SCHED_FIFO and mlockall
+    where permitted, memory stays locked for the rest of the process.
+
+    Arguments:
+        gpio:GPIO       GPIO object, pins must not be in use.
+        pins:List       Output pins on one bank.
+        count:Int       Deadlines per run.
+        period:Float    Seconds between deadlines.
+
+    Returns:Dict    percentiles() of lateness for normal and realtime,
+                    writes per run and whether real-time scheduling
+                    was applied.
+    """
+
+    gpio.gpio_init_many(pins, 'out')
+    ret = {}
+
+    try:
+        for name, realtime in [('normal', False), ('realtime', True)]:
+            sched = OutputScheduler(gpio, history=count * len(pins))
+            sched.start(cpu=0 if realtime else None, realtime=realtime)
+
+            try:
+                start = sched.now() + 50000000
+                step = int(period * 1000000000)
+
+                for n in range(count):
+                    for pin in pins:
+                        sched.schedule(start + n * step, pin, n & 1)
+
+                sched.wait()
+                stats = sched.stats()
+            finally:
+                sched.stop()
+
+            late = stats['late']
+            ret[name] = dict((k, late[k] * 1e6 if k != 'count' else late[k]) for k in late)
+
+            if realtime:
+                ret['realtime_applied'] = stats['realtime']
+
+            ret['writes'] = stats['writes']
+    finally:
+        for pin in pins:
+            gpio.gpio_close(pin)
+
+    return ret
+
+
+def bench_startup(gpio, definition, count):
+    """ Board load and GPIO construction time.
+
+    Arguments:
+        gpio:GPIO           GPIO object, its backend is reused unopened.
+        definition:Str      Board definition file, see layout.
+        count:Int           Loads and constructions per measurement.
+
+    Returns:Dict    percentiles() of compiling the definition, loading
+                    it from the on disk cache, compiling an old style
+                    Config with from_config, and constructing GPIO.
+    """
+
+    memo = dict(layout._memo)
+    ret = {}
+
+    def load(cache):
+        layout._memo.clear()
+        layout.load(definition, cache)
+
+    try:
+        ret['compile'] = percentiles(_latencies(lambda: load(False), count))
+        load(True)
+        ret['cached'] = percentiles(_latencies(lambda: load(True), count))
+    finally:
+        layout._memo.clear()
+        layout._memo.update(memo)
+
+    ret['from_config'] = percentiles(_latencies(lambda: layout.from_config(gpio.board), count))
+    ret['gpio'] = percentiles(_latencies(lambda: GPIO(gpio.board, backend=gpio._backend), count))
+    return ret
+
+
+def run(gpio, benches, count, stimulus=None, eint_pin=38, eint_out=None,
+        pin=40, pwm_pin=22, bulk_pins=None, thread_pins=None, new_backend=None, spi_pins=(29, 31, 24),
+        i2c_pins=(27, 28), i2c_address=None, i2c_sim=None, encoder_pins=(36, 37), drive=None,
+        definition=nanopi.DEFINITION):
+    """ Run benchmarks.
+
+    Arguments:
+        gpio:GPIO           GPIO object, no pins in use.
+        benches:List        Names from BENCHES.
+        count:Int           Base operation count, slower benchmarks
+                            scale it down.
+        stimulus:Callable   EINT edge maker, see bench_eint. eint is
+                            skipped without one.
+        eint_pin:Int        EINT pin.
+        eint_out:Int        Output pin wired to eint_pin.
+        pin:Int             Pin for toggle and read.
+        pwm_pin:Int         PWM pin.
+        bulk_pins:List      Pins on one bank for bulk and close_all.
+        thread_pins:List    Pins for threads, spread over banks.
+        new_backend:Callable    Returns a Backend sharing gpio's registers,
+                            for processes, skipped without one.
+        spi_pins:List       SCLK, MOSI and CS pins for spi.
+        i2c_pins:List       SDA and SCL pins for i2c.
+        i2c_address:Int     Address of an EEPROM like slave on i2c_pins,
+                            i2c is skipped without one.
+        i2c_sim:SimBackend  Simulate the slave on this backend with
+                            i2c.SimI2CDevice during i2c.
+        encoder_pins:List   Channel A and B pins for encoder.
+        drive:Callable      drive(pin, level) of input levels, ie
+                            SimBackend.drive, encoder is skipped without.
+        definition:Str      Board definition file for startup.
+
+    Returns:Dict    Results per benchmark name.
+    """
+
+    if bulk_pins is None:
+        bulk_pins = [29, 31, 32, 33, 35, 36, 37, 38]
+
+    if thread_pins is None:
+        thread_pins = [16, 27, 28, 29, 31, 32, 33, 35]
+
+    daemon_pins = [p for p in gpio.layout.pins if p != pwm_pin]
+
+    ret = {}
+
+    for name in benches:
+        try:
+            if name == 'toggle':
+                ret[name] = bench_toggle(gpio, pin, count)
+            elif name == 'read':
+                ret[name] = bench_read(gpio, pin, max(count // 10, 1))
+            elif name == 'eint':
+                if stimulus is None:
+                    ret[name] = {'skipped': 'no EINT stimulus for this backend'}
+                else:
+                    ret[name] = bench_eint(gpio, eint_pin, max(count // 1000, 10), stimulus, eint_out)
+            elif name == 'bulk':
+                ret[name] = bench_bulk(gpio, bulk_pins, max(count // 10, 1))
+            elif name == 'threads':
+                ret[name] = bench_threads(gpio, thread_pins, max(count // 50, 1))
+            elif name == 'processes':
+                if new_backend is None:
+                    ret[name] = {'skipped': 'backend registers can not be shared between processes'}
+                else:
+                    ret[name] = bench_processes(gpio.board, new_backend, bulk_pins, max(count // 10, 1))
+            elif name == 'daemon':
+                ret[name] = bench_daemon(gpio, daemon_pins, max(count // 100, 10))
+            elif name == 'churn':
+                if new_backend is None:
+                    ret[name] = {'skipped': 'backend does not use the mapping manager'}
+                else:
+                    ret[name] = bench_churn(gpio.board, new_backend, pin, max(count // 100, 1))
+            elif name == 'close_all':
+                ret[name] = bench_close_all(gpio, bulk_pins, max(count // 100, 1))
+            elif name == 'pwm':
+                ret[name] = bench_pwm(gpio, pwm_pin, max(count // 10, 1))
+            elif name == 'spi':
+                ret[name] = bench_spi(gpio, spi_pins, max(count // 100, 16))
+            elif name == 'i2c':
+                if i2c_address is None:
+                    ret[name] = {'skipped': 'no I2C slave, use --backend sim or --i2c-address'}
+                else:
+                    dev = SimI2CDevice(i2c_sim, i2c_address, *i2c_pins) if i2c_sim is not None else None
+
+                    try:
+                        ret[name] = bench_i2c(gpio, i2c_pins, min(max(count // 1000, 16), 255), i2c_address)
+                    finally:
+                        if dev is not None:
+                            dev.close()
+            elif name == 'scheduler':
+                ret[name] = bench_scheduler(gpio, bulk_pins[:4], max(count // 100, 100))
+            elif name == 'encoder':
+                if drive is None:
+                    ret[name] = {'skipped': 'no input drive for this backend, use --backend sim'}
+                else:
+                    ret[name] = bench_encoder(gpio, encoder_pins, max(count // 10, 4), drive)
+            elif name == 'startup':
+                ret[name] = bench_startup(gpio, definition, max(count // 1000, 10))
+            else:
+                gpio._value_error('Unknown benchmark: %s' % name)
+        except Exception as e:
+            ret[name] = {'error': '%s' % e}
+
+    return ret
+
+
+_PERCENTILE_KEYS = ['count', 'mean', 'min', 'p50', 'p90', 'p99', 'p999', 'max']
+
+
+def _text(report):
+    lines = []
+
+    for name in sorted(report['results']):
+        res = report['results'][name]
+
+        if 'p50' in res:
+            res = dict((k, v) for k, v in res.items() if k not in _PERCENTILE_KEYS)
+            res['latency'] = report['results'][name]
+
+        for key in sorted(res):
+            value = res[key]
+
+            if isinstance(value, dict) and 'mappings' in value:
+                value = 'p50=%.2f p99=%.2f max=%.2f us, %s mappings' % (value['p50'], value['p99'], value['max'],
+                                                                     value['mappings'])
+            elif isinstance(value, dict) and 'hold_max' in value:
+                value = '%.0f writes/s, hold max %.2f us, wait max %.2f us' % (value['rate'], value['hold_max'],
+                                                                             value['wait_max'])
+            elif isinstance(value, dict) and 'pipelined' in value:
+                value = 'p50=%.2f p99=%.2f us, %.0f round trips/s, %.0f pipelined writes/s' % (
+                    value['latency']['p50'], value['latency']['p99'], value['rate'], value['pipelined'])
+            elif isinstance(value, dict) and 'scl_khz' in value:
+                value = 'write %.0f bytes/s, read %.0f bytes/s, SCL %.1f kHz' % (value['write'], value['read'],
+                                                                               value['scl_khz'])
+            elif isinstance(value, dict) and 'rate' in value:
+                value = '%.0f writes/s, %s lost' % (value['rate'], value['lost'])
+            elif isinstance(value, dict):
+                value = ' '.join('%s=%.2f' % (k, value[k]) for k in ['p50', 'p99', 'max'] if k in value) + ' us'
+            elif isinstance(value, float) and name not in ('eint', 'close_all'):
+                value = '%.0f %s' % (value, 'bytes/s' if name in ('spi', 'i2c') else 'ops/s')
+
+            lines.append('%-10s %-18s %s' % (name, key, value))
+
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='fgpio.bench', description=__doc__.split('\n\n')[1].strip())
+    parser.add_argument('--backend', choices=['file', 'sim', 'devmem'], default='file',
+                        help='Register backend, devmem needs root on the board.')
+    parser.add_argument('-n', '--count', type=int, default=100000, help='Base operations per run.')
+    parser.add_argument('--only', default=','.join(BENCHES), help='Comma separated benchmarks to run.')
+    parser.add_argument('-p', '--pin', type=int, default=40, help='Pin for toggle and read.')
+    parser.add_argument('--pwm-pin', type=int, default=22, help='PWM pin to update.')
+    parser.add_argument('--eint-pin', type=int, default=38, help='EINT pin.')
+    parser.add_argument('--eint-out', type=int, help='Output pin wired to the EINT pin, for devmem.')
+    parser.add_argument('--i2c-address', type=lambda v: int(v, 0),
+                        help='EEPROM like I2C slave on pins 27/28 for devmem, overwrites its first bytes.')
+    parser.add_argument('--sys-pwm', help='sysfs PWM directory, temporary stand-in if not given.')
+    parser.add_argument('--format', choices=['json', 'text'], default='json')
+    parser.add_argument('-o', '--output', help='Write to file instead of stdout.')
+    args = parser.parse_args(argv)
+
+    board = nanopi.Config()
+    benches = [b for b in args.only.split(',') if b]
+    stimulus = None
+    pwm_path = args.sys_pwm
+
+    tmp = tempfile.mkdtemp(prefix='fgpio-bench-')
+    new_backend = None
+    i2c_address = args.i2c_address
+    i2c_sim = None
+    drive = None
+
+    if args.backend == 'devmem':
+        new_backend = DevMemBackend
+        pwm_path = pwm_path or '/sys/class/pwm'
+    elif args.backend == 'sim':
+        backend = SimBackend(board)
+        stimulus = lambda level: backend.drive(args.eint_pin, level)
+        i2c_sim = backend
+        drive = backend.drive
+        i2c_address = 0x50
+    else:
+        mem = os.path.join(tmp, 'mem')
+        new_backend = lambda: FileBackend(mem)
+
+    if new_backend is not None:
+        backend = new_backend()
+
+    if pwm_path is None:
+        pwm_path = sys_pwm_dir(board, os.path.join(tmp, 'pwm'))
+
+    try:
+        gpio = GPIO(board, backend=backend, sys_pwm=pwm_path)
+
+        if args.eint_out is not None:
+            gpio_ref = gpio
+            stimulus = lambda level: gpio_ref.gpio_write(args.eint_out, level)
+
+        results = run(gpio, benches, args.count, stimulus, args.eint_pin, args.eint_out,
+                      args.pin, args.pwm_pin, new_backend=new_backend,
+                      i2c_address=i2c_address, i2c_sim=i2c_sim, drive=drive)
+    finally:
+        shutil.rmtree(tmp)
+
+    report = {'environment': environment(board, backend), 'count': args.count, 'results': results}
+
+    if args.format == 'json':
+        out = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    else:
+        out = _text(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,969 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" GPIO daemon serving clients over a Unix domain socket.
+
+    The daemon runs as root and owns the GPIO object, clients connect to
+    its socket with GPIOClient, which has the GPIO API, and need no
+    privileges or mapping of their own.
+
+    Protocol, all little endian:
+
+    frame       FRAME (payload length, type, sequence) and payload.
+    request     type REQUEST, payload of OP (opcode, pin, a, b) per
+                operation, a and b unsigned. Operations of a frame run in order with no
+                other client's operations in between. At most MAX_OPS
+                operations, the daemon answers a larger or truncated
+                request with one error RESULT and drops the connection.
+    response    type RESPONSE, same sequence as the request, payload of
+                RESULT (status, value) per operation. On error value is
+                the length of the UTF-8 message following the RESULT.
+    event       type EVENT, sequence 0, payload EVENT (pin, trigger,
+                timestamp), pushed for subscribed EINT pins.
+
+    Strings are sent as their index in DIRECTIONS, UPDOWNS or TRIGGERS,
+    bank names as their ASCII bytes in a.
+
+    python -m fgpio.daemon [--socket PATH] [--sim]
+"""
+
+import os
+import sys
+import errno
+import socket
+import struct
+import argparse
+import threading
+
+from .dispatcher import EINTDispatcher
+
+FRAME = struct.Struct('<IBI')
+OP = struct.Struct('<BBQQ')
+RESULT = struct.Struct('<Bq')
+EVENT = struct.Struct('<BBd')
+
+# Operations per request, bounds what the daemon buffers for a client.
+MAX_OPS = 4096
+MAX_PAYLOAD = MAX_OPS * OP.size
+
+REQUEST = 0
+RESPONSE = 1
+EVENT_PUSH = 2
+
+OK = 0
+ERROR = 1
+VALUE_ERROR = 2
+
+DIRECTIONS = ['in', 'out']
+UPDOWNS = ['none', 'up', 'down']
+TRIGGERS = ['none', 'low', 'high', 'rising', 'falling', 'both']
+
+# Opcodes are the index, True for operations returning a value.
+OPS = [('gpio_init', False),
+       ('gpio_close', False),
+       ('gpio_close_all', False),
+       ('gpio_read', True),
+       ('gpio_write', False),
+       ('gpio_direction', False),
+       ('gpio_updown', False),
+       ('port_read', True),
+       ('port_write', False),
+       ('eint_init', False),
+       ('eint_close', False),
+       ('eint_close_all', False),
+       ('eint_event', True),
+       ('eint_clear', False),
+       ('pwm_init', False),
+       ('pwm_close', False),
+       ('pwm_close_all', False),
+       ('pwm_get_period', True),
+       ('pwm_period', False),
+       ('pwm_get_duty_cycle', True),
+       ('pwm_duty_cycle', False),
+       ('pwm_start', False),
+       ('pwm_stop', False),
+       ('subscribe', False),
+       ('unsubscribe', False)]
+
+OPCODES = dict((OPS[i][0], i) for i in range(len(OPS)))
+
+
+def bank_code(bank):
+    """ Bank name as an OP argument.
+
+    Arguments:
+        bank:Str        Bank name, ie 'GPG'.
+
+    Returns:Int
+    """
+
+    return struct.unpack('<Q', bank.encode('ascii')[:8].ljust(8, b'\0'))[0]
+
+
+def bank_name(code):
+    """ Bank name from bank_code().
+
+    Arguments:
+        code:Int        bank_code() value.
+
+    Returns:Str
+    """
+
+    return struct.pack('<Q', code).rstrip(b'\0').decode('ascii')
+
+
+def recv_frame(sock, limit=None):
+    """ Read one frame.
+
+    Arguments:
+        sock:socket     Connected socket.
+        limit:Int       Largest payload accepted, None for any.
+
+    Returns:Tuple   (type, sequence, payload bytes), None on EOF. payload
+                    is None and left unread if it is over limit.
+    """
+
+    head = _recv_exact(sock, FRAME.size)
+
+    if head is None:
+        return None
+
+    length, ftype, seq = FRAME.unpack(head)
+
+    if limit is not None and length > limit:
+        return ftype, seq, None
+
+    payload = _recv_exact(sock, length) if length else b''
+
+    if payload is None:
+        return None
+
+    return ftype, seq, payload
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+
+    while pos < size:
+        n = sock.recv_into(view[pos:], size - pos)
+
+        if not n:
+            return None
+
+        pos += n
+
+    return bytes(buf)
+
+
+class _Client(object):
+    """ Daemon side state of a connection."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.pins = {}
+
+    def send(self, data):
+        with self.send_lock:
+            self.sock.sendall(data)
+
+
+class GPIODaemon(object):
+    """ Serves a GPIO object to GPIOClients over a Unix domain socket.
+
+        Each client gets a thread. Pins belong to the client that
+        initialized them, other clients get an error using them, and a
+        client's pins are closed when it disconnects. *_close_all only
+        closes the calling client's pins. port_write needs every bit
+        under the mask to be a pin the client initialized as gpio,
+        port_read only returns the bits of the client's gpio and eint
+        pins.
+
+        Subscribed EINT pins are polled by an EINTDispatcher and their
+        events pushed to the client, eint_event/eint_clear on them race
+        with the dispatcher clearing events.
+    """
+
+    def __init__(self, gpio, path='/run/fgpio.sock', mode=0o660):
+        """ Initialize GPIODaemon
+
+        Arguments:
+            gpio:GPIO       GPIO object served, no pins in use.
+            path:Str        Socket path, replaced if it exists.
+            mode:Int        Socket file permissions.
+        """
+
+        self._gpio = gpio
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._clients = set()
+        self._sock = None
+        self._thread = None
+        self._dispatcher = None
+        self._stopped = []
+        self._subs = {}
+        self.requests = 0
+        self.operations = 0
+
+    def start(self):
+        """ Listen and serve from a background thread."""
+
+        self._listen()
+        self._thread = threading.Thread(target=self._accept, name='fgpio-daemon')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        """ Listen and serve until stop() from another thread."""
+
+        self._listen()
+        self._accept()
+
+    def stop(self):
+        """ Stop serving, disconnect clients and close their pins."""
+
+        sock = self._sock
+        self._sock = None
+
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+            sock.close()
+
+        for client in list(self._clients):
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _listen(self):
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, self.mode)
+        sock.listen(64)
+        self._sock = sock
+
+    def _accept(self):
+        while self._sock is not None:
+            try:
+                conn, addr = self._sock.accept()
+            except (socket.error, AttributeError):
+                break
+
+            client = _Client(conn)
+            self._clients.add(client)
+            t = threading.Thread(target=self._serve, args=(client,), name='fgpio-daemon-client')
+            t.daemon = True
+            t.start()
+
+    def _serve(self, client):
+        try:
+            while True:
+                frame = recv_frame(client.sock, MAX_PAYLOAD)
+
+                if frame is None:
+                    break
+
+                ftype, seq, payload = frame
+
+                if ftype != REQUEST:
+                    break
+
+                if payload is None or len(payload) % OP.size:
+                    body = self._error(VALUE_ERROR, 'fgpio: Bad request, over %s operations or truncated.' % MAX_OPS)
+                    client.send(FRAME.pack(len(body), RESPONSE, seq) + body)
+                    break
+
+                out = [None]
+
+                with self._lock:
+                    self.requests += 1
+
+                    for pos in range(0, len(payload), OP.size):
+                        out.append(self._run(client, *OP.unpack_from(payload, pos)))
+
+                    self.operations += len(out) - 1
+
+                body = b''.join(out[1:])
+                client.send(FRAME.pack(len(body), RESPONSE, seq) + body)
+                self._reap()
+        except socket.error:
+            pass
+        finally:
+            with self._lock:
+                self._drop(client)
+
+            self._reap()
+            self._clients.discard(client)
+            client.sock.close()
+
+    def _run(self, client, opcode, pin, a, b):
+        try:
+            name = OPS[opcode][0]
+        except IndexError:
+            return self._error(ERROR, 'fgpio: Unknown opcode %s.' % opcode)
+
+        try:
+            value = getattr(self, '_op_' + name)(client, pin, a, b)
+        except ValueError as e:
+            return self._error(VALUE_ERROR, '%s' % e)
+        except Exception as e:
+            return self._error(ERROR, '%s' % e)
+
+        return RESULT.pack(OK, value or 0)
+
+    def _error(self, status, msg):
+        data = msg.encode('utf-8')
+        return RESULT.pack(status, len(data)) + data
+
+    def _owned(self, client, pin):
+        owner = self._owners.get(pin)
+
+        if owner is not None and owner is not client:
+            self._gpio._exception('pin %s belongs to another client.' % pin)
+
+    def _claim(self, client, pin, ptype):
+        self._owned(client, pin)
+        self._owners[pin] = client
+        client.pins[pin] = ptype
+
+    def _release(self, client, pin):
+        if self._owners.get(pin) is client:
+            del self._owners[pin]
+
+        client.pins.pop(pin, None)
+        self._unsubscribe(pin)
+
+    def _drop(self, client):
+        gpio = self._gpio
+
+        for pin in list(client.pins):
+            try:
+                if client.pins[pin] == gpio._type_pwm:
+                    gpio.pwm_close(pin)
+                elif client.pins[pin] == gpio._type_eint:
+                    self._unsubscribe(pin)
+                    gpio.eint_close(pin)
+                else:
+                    gpio.gpio_close(pin)
+            except Exception:
+                pass
+
+            self._release(client, pin)
+
+    def _close_all(self, client, ptype, close):
+        for pin in [p for p in client.pins if client.pins[p] == ptype]:
+            if ptype == self._gpio._type_eint:
+                self._unsubscribe(pin)
+
+            close(pin)
+            self._release(client, pin)
+
+    def _op_gpio_init(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.gpio_init(pin, DIRECTIONS[a], UPDOWNS[b])
+        self._claim(client, pin, self._gpio._type_gpio)
+
+    def _op_gpio_close(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.gpio_close(pin)
+        self._release(client, pin)
+
+    def _op_gpio_close_all(self, client, pin, a, b):
+        self._close_all(client, self._gpio._type_gpio, self._gpio.gpio_close)
+
+    def _op_gpio_read(self, client, pin, a, b):
+        self._owned(client, pin)
+        return self._gpio.gpio_read(pin)
+
+    def _op_gpio_write(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.gpio_write(pin, a)
+
+    def _op_gpio_direction(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.gpio_direction(pin, DIRECTIONS[a])
+
+    def _op_gpio_updown(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.gpio_updown(pin, UPDOWNS[a])
+
+    def _op_port_read(self, client, pin, a, b):
+        gpio = self._gpio
+        bank = bank_name(a)
+        allowed = self._port_mask(client, bank, (gpio._type_gpio, gpio._type_eint))
+
+        if not allowed:
+            gpio._exception('port_read of bank %s, no pins of it initialized by this client.' % bank)
+
+        return gpio.port_read(bank) & allowed
+
+    def _op_port_write(self, client, pin, a, b):
+        # mask and value are unsigned 32 bit, sent in b as mask << 32 | value.
+        gpio = self._gpio
+        bank = bank_name(a)
+        mask = (b >> 32) & 0xffffffff
+        value = b & 0xffffffff
+        other = mask & ~self._port_mask(client, bank, (gpio._type_gpio,))
+
+        if other:
+            gpio._exception('port_write mask bits 0x%08x are not pins initialized as gpio by this client.' % other)
+
+        gpio.port_write(bank, mask, value)
+
+    def _port_mask(self, client, bank, ptypes):
+        # Bits of the bank's pins the client initialized as one of ptypes.
+        gpio = self._gpio
+
+        if bank not in gpio.layout.banks:
+            gpio._value_error('Not a valid bank: %s' % bank)
+
+        mask = 0
+
+        for p in client.pins:
+            if gpio.layout.bank[p] == bank and client.pins[p] in ptypes:
+                mask |= 1 << gpio._num[p]
+
+        return mask
+
+    def _op_eint_init(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.eint_init(pin, TRIGGERS[a])
+        self._claim(client, pin, self._gpio._type_eint)
+
+    def _op_eint_close(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._unsubscribe(pin)
+        self._gpio.eint_close(pin)
+        self._release(client, pin)
+
+    def _op_eint_close_all(self, client, pin, a, b):
+        self._close_all(client, self._gpio._type_eint, self._gpio.eint_close)
+
+    def _op_eint_event(self, client, pin, a, b):
+        self._owned(client, pin)
+        return self._gpio.eint_event(pin)
+
+    def _op_eint_clear(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.eint_clear(pin)
+
+    def _op_pwm_init(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_init(pin, a, b)
+        self._claim(client, pin, self._gpio._type_pwm)
+
+    def _op_pwm_close(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_close(pin)
+        self._release(client, pin)
+
+    def _op_pwm_close_all(self, client, pin, a, b):
+        self._close_all(client, self._gpio._type_pwm, self._gpio.pwm_close)
+
+    def _op_pwm_get_period(self, client, pin, a, b):
+        self._owned(client, pin)
+        return self._gpio.pwm_get_period(pin)
+
+    def _op_pwm_period(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_period(pin, a)
+
+    def _op_pwm_get_duty_cycle(self, client, pin, a, b):
+        self._owned(client, pin)
+        return self._gpio.pwm_get_duty_cycle(pin)
+
+    def _op_pwm_duty_cycle(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_duty_cycle(pin, a)
+
+    def _op_pwm_start(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_start(pin)
+
+    def _op_pwm_stop(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._gpio.pwm_stop(pin)
+
+    def _op_subscribe(self, client, pin, a, b):
+        if client.pins.get(pin) != self._gpio._type_eint:
+            self._gpio._exception('pin %s not initialized as eint by this client.' % pin)
+
+        if self._dispatcher is None:
+            self._dispatcher = EINTDispatcher(self._gpio, workers=1)
+            self._dispatcher.start()
+
+        self._dispatcher.register(pin, self._event)
+        self._subs[pin] = client
+
+    def _op_unsubscribe(self, client, pin, a, b):
+        self._owned(client, pin)
+        self._unsubscribe(pin)
+
+    def _unsubscribe(self, pin):
+        if self._subs.pop(pin, None) is None:
+            return
+
+        self._dispatcher.unregister(pin)
+
+        if not self._subs:
+            # Stop polling now, the mapping may go with the last pin. The
+            # workers can be blocked sending to a slow client, they are
+            # joined by _reap() outside the daemon lock.
+            self._dispatcher.stop(wait=False)
+            self._stopped.append(self._dispatcher)
+            self._dispatcher = None
+
+    def _reap(self):
+        # Called from every client thread, take the list under the lock.
+        with self._lock:
+            stopped, self._stopped = self._stopped, []
+
+        for dispatcher in stopped:
+            dispatcher.join()
+
+    def _event(self, pin, trigger, timestamp):
+        client = self._subs.get(pin)
+
+        if client is None:
+            return
+
+        body = EVENT.pack(pin, TRIGGERS.index(trigger) if trigger in TRIGGERS else 0, timestamp)
+
+        try:
+            client.send(FRAME.pack(len(body), EVENT_PUSH, 0) + body)
+        except socket.error:
+            pass
+
+
+def _code(names, value, msg):
+    try:
+        return names.index(value.lower())
+    except (ValueError, AttributeError):
+        raise ValueError('fgpio: %s: %s' % (msg, value))
+
+
+class _Calls(object):
+    """ GPIO API on top of _call(), shared by GPIOClient and Pipeline."""
+
+    def gpio_init(self, pin, direction='in', updown='none'):
+        """ See GPIO.gpio_init, handles are not available remotely."""
+
+        return self._call('gpio_init', pin, _code(DIRECTIONS, direction, 'Bad GPIO func'),
+                          _code(UPDOWNS, updown, 'Bad GPIO updown'))
+
+    def gpio_close(self, pin):
+        return self._call('gpio_close', pin)
+
+    def gpio_close_all(self):
+        """ Close all GPIO pins of this client."""
+
+        return self._call('gpio_close_all')
+
+    def gpio_read(self, pin):
+        return self._call('gpio_read', pin)
+
+    def gpio_write(self, pin, value):
+        return self._call('gpio_write', pin, 1 if value else 0)
+
+    def gpio_direction(self, pin, direction):
+        return self._call('gpio_direction', pin, _code(DIRECTIONS, direction, 'Bad GPIO func'))
+
+    def gpio_updown(self, pin, updown='none'):
+        return self._call('gpio_updown', pin, _code(UPDOWNS, updown, 'Bad GPIO updown'))
+
+    def port_read(self, bank):
+        return self._call('port_read', 0, bank_code(bank))
+
+    def port_write(self, bank, mask, value):
+        return self._call('port_write', 0, bank_code(bank), ((mask & 0xffffffff) << 32) | (value & 0xffffffff))
+
+    def eint_init(self, pin, trigger):
+        """ See GPIO.eint_init, handles are not available remotely."""
+
+        return self._call('eint_init', pin,
+                          _code(TRIGGERS, trigger, 'Trigger must be low,  high, rising, falling, none, or both.'))
+
+    def eint_close(self, pin):
+        return self._call('eint_close', pin)
+
+    def eint_close_all(self):
+        """ Close all EINT pins of this client."""
+
+        return self._call('eint_close_all')
+
+    def eint_event(self, pin):
+        return self._call('eint_event', pin)
+
+    def eint_clear(self, pin):
+        return self._call('eint_clear', pin)
+
+    def pwm_init(self, pin, period, duty_cycle):
+        return self._call('pwm_init', pin, period, duty_cycle)
+
+    def pwm_close(self, pin):
+        return self._call('pwm_close', pin)
+
+    def pwm_close_all(self):
+        """ Close all PWM pins of this client."""
+
+        return self._call('pwm_close_all')
+
+    def pwm_get_period(self, pin):
+        return self._call('pwm_get_period', pin)
+
+    def pwm_period(self, pin, period):
+        return self._call('pwm_period', pin, period)
+
+    def pwm_get_duty_cycle(self, pin):
+        return self._call('pwm_get_duty_cycle', pin)
+
+    def pwm_duty_cycle(self, pin, duty_cycle):
+        return self._call('pwm_duty_cycle', pin, duty_cycle)
+
+    def pwm_start(self, pin):
+        return self._call('pwm_start', pin)
+
+    def pwm_stop(self, pin):
+        return self._call('pwm_stop', pin)
+
+
+class Pipeline(_Calls):
+    """ Operations sent to the daemon together in one round trip.
+
+        Methods are those of GPIOClient, queued instead of sent. On
+        execute() or leaving a with block they go in one request frame,
+        run with no other client's operations in between, and results
+        holds one entry per operation, the value or the exception.
+        execute() raises the first exception after filling results.
+
+        Example:
+            with client.pipeline() as p:
+                p.gpio_write(40, 1)
+                p.gpio_read(38)
+            print(p.results)
+    """
+
+    def __init__(self, client):
+        """ Initialize Pipeline
+
+        Arguments:
+            client:GPIOClient   Connected client.
+        """
+
+        self._client = client
+        self._ops = []
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+        return False
+
+    def __len__(self):
+        return len(self._ops)
+
+    def execute(self):
+        """ Send the queued operations and wait for their results.
+
+        Returns:List    Result per operation.
+        """
+
+        ops, self._ops = self._ops, []
+        self.results = self._client._request(ops) if ops else []
+
+        for r in self.results:
+            if isinstance(r, Exception):
+                raise r
+
+        return self.results
+
+    def _call(self, name, pin=0, a=0, b=0):
+        self._ops.append((name, pin, a, b))
+
+
+class GPIOClient(_Calls):
+    """ GPIO API served by a GPIODaemon.
+
+        Each call is one round trip, use pipeline() or the *_many methods
+        to send many operations per round trip. subscribe() has EINT
+        events pushed instead of polling eint_event(), callbacks run on
+        a reader thread as callback(pin, trigger, timestamp), timestamp
+        being the daemon's clock (the system monotonic clock) when the
+        event was seen.
+
+        Example:
+            client = GPIOClient()
+            client.gpio_init(40, 'out')
+            client.gpio_write(40, 1)
+    """
+
+    def __init__(self, path='/run/fgpio.sock'):
+        """ Initialize GPIOClient
+
+        Arguments:
+            path:Str        Daemon socket path.
+        """
+
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._callbacks = {}
+        self._reader = None
+        self._cond = threading.Condition(threading.Lock())
+        self._responses = {}
+        self._closed = False
+
+    def close(self):
+        """ Disconnect, the daemon closes this client's pins."""
+
+        self._closed = True
+
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+        self._sock.close()
+
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join()
+
+    def pipeline(self):
+        """ Queue operations for one round trip.
+
+        Returns:Pipeline
+        """
+
+        return Pipeline(self)
+
+    def gpio_init_many(self, pins, direction='in', updown='none'):
+        with self.pipeline() as p:
+            for pin in pins:
+                p.gpio_init(pin, direction, updown)
+
+    def gpio_read_many(self, pins):
+        """ Read several pins in one round trip.
+
+        Returns:Dict    Pin number to value.
+        """
+
+        pins = list(pins)
+
+        with self.pipeline() as p:
+            for pin in pins:
+                p.gpio_read(pin)
+
+        return dict(zip(pins, p.results))
+
+    def gpio_write_many(self, values):
+        """ Write several pins in one round trip.
+
+        Arguments:
+            values:Dict     Pin number to value.
+        """
+
+        with self.pipeline() as p:
+            for pin in values:
+                p.gpio_write(pin, values[pin])
+
+    def subscribe(self, pin, callback):
+        """ Have EINT events of pin pushed to callback.
+
+        Arguments:
+            pin:Int             EINT pin initialized by this client.
+            callback:Callable   Called as callback(pin, trigger, timestamp).
+        """
+
+        self._callbacks[pin] = callback
+
+        with self._lock:
+            if self._reader is None:
+                self._reader = threading.Thread(target=self._read, name='fgpio-client')
+                self._reader.daemon = True
+                self._reader.start()
+
+        try:
+            self._call('subscribe', pin)
+        except Exception:
+            self._callbacks.pop(pin, None)
+            raise
+
+    def unsubscribe(self, pin):
+        """ Stop pushing events of pin."""
+
+        self._call('unsubscribe', pin)
+        self._callbacks.pop(pin, None)
+
+    def _call(self, name, pin=0, a=0, b=0):
+        r = self._request([(name, pin, a, b)])[0]
+
+        if isinstance(r, Exception):
+            raise r
+
+        return r
+
+    def _request(self, ops):
+        if len(ops) > MAX_OPS:
+            raise ValueError('fgpio: Over %s operations in one request.' % MAX_OPS)
+
+        try:
+            body = b''.join([OP.pack(OPCODES[name], pin, a, b) for name, pin, a, b in ops])
+        except struct.error as e:
+            raise ValueError('fgpio: Bad argument. %s' % e)
+
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xffffffff
+            seq = self._seq
+            self._sock.sendall(FRAME.pack(len(body), REQUEST, seq) + body)
+
+            if self._reader is None:
+                # No events subscribed, read the response here.
+                while True:
+                    frame = recv_frame(self._sock)
+
+                    if frame is None:
+                        raise Exception('fgpio: Daemon closed the connection.')
+
+                    if frame[0] == RESPONSE and frame[1] == seq:
+                        return self._results(ops, frame[2])
+
+                    if frame[0] == EVENT_PUSH:
+                        self._event(frame[2])
+
+        with self._cond:
+            while seq not in self._responses:
+                if self._closed:
+                    raise Exception('fgpio: Daemon closed the connection.')
+
+                self._cond.wait()
+
+            return self._results(ops, self._responses.pop(seq))
+
+    def _results(self, ops, payload):
+        ret = []
+        pos = 0
+
+        for name, pin, a, b in ops:
+            if ret and pos == len(payload):
+                # A rejected request has one error for all operations.
+                ret.append(ret[-1])
+                continue
+
+            status, value = RESULT.unpack_from(payload, pos)
+            pos += RESULT.size
+
+            if status == OK:
+                ret.append(value if OPS[OPCODES[name]][1] else None)
+            else:
+                msg = payload[pos:pos + value].decode('utf-8', 'replace')
+                pos += value
+                ret.append(ValueError(msg) if status == VALUE_ERROR else Exception(msg))
+
+        return ret
+
+    def _event(self, payload):
+        pin, trigger, timestamp = EVENT.unpack(payload)
+        callback = self._callbacks.get(pin)
+
+        if callback is not None:
+            callback(pin, TRIGGERS[trigger], timestamp)
+
+    def _read(self):
+        try:
+            while True:
+                frame = recv_frame(self._sock)
+
+                if frame is None:
+                    break
+
+                if frame[0] == EVENT_PUSH:
+                    self._event(frame[2])
+                elif frame[0] == RESPONSE:
+                    with self._cond:
+                        self._responses[frame[1]] = frame[2]
+                        self._cond.notify_all()
+        except (socket.error, ValueError):
+            pass
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+
+
+def main(argv=None):
+    from .fgpio import GPIO
+    from .backends import SimBackend
+    from .boards import nanopi
+
+    parser = argparse.ArgumentParser(prog='fgpio.daemon', description='Serve GPIO over a Unix domain socket.')
+    parser.add_argument('--socket', default='/run/fgpio.sock', help='Socket path.')
+    parser.add_argument('--mode', default='660', help='Socket permissions, octal.')
+    parser.add_argument('--sim', action='store_true', help='Serve a simulated board.')
+    parser.add_argument('--sys-pwm', default='/sys/class/pwm', help='sysfs PWM directory.')
+    args = parser.parse_args(argv)
+
+    board = nanopi.Config()
+    backend = SimBackend(board) if args.sim else None
+    daemon = GPIODaemon(GPIO(board, sys_pwm=args.sys_pwm, backend=backend), args.socket, int(args.mode, 8))
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
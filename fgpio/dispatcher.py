@@ -0,0 +1,254 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import threading
+from time import sleep
+from collections import deque
+from timeit import default_timer as _clock
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class EINTDispatcher(object):
+    """ Single thread EINT poller dispatching callbacks to a worker pool.
+
+        Each poll cycle reads EINT_PEND once, tests every registered EINT
+        bit with one mask and clears all fired bits with one write (the
+        register is write 1 to clear). Callbacks run on worker threads as
+        callback(pin, trigger, timestamp), timestamp being the clock time
+        the event was seen.
+
+        The poll interval adapts, spinning for spin seconds after an
+        event, then doubling the sleep between polls up to max_interval
+        while idle.
+
+        Example:
+            gpio.eint_init(38, 'falling')
+            d = EINTDispatcher(gpio)
+            d.register(38, on_press)
+            d.start()
+    """
+
+    def __init__(self, gpio, workers=2, spin=0.005, max_interval=0.01):
+        """ Initialize EINTDispatcher
+
+        Arguments:
+            gpio:GPIO           GPIO object.
+            workers:Int         Callback worker threads.
+            spin:Float          Seconds to poll without sleeping after an event.
+            max_interval:Float  Longest sleep between polls when idle, seconds.
+        """
+
+        gpio._int_check(workers, 'workers')
+
+        if workers < 1:
+            gpio._value_error('Need at least one worker.')
+
+        self._gpio = gpio
+        self.workers = workers
+        self.spin = spin
+        self.max_interval = max_interval
+        self._callbacks = {}
+        self._mask = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._running = False
+        self.stats_reset()
+
+    def register(self, pin, callback):
+        """ Call callback when pin's EINT event fires.
+
+        Arguments:
+            pin:Int             Pin number, initialized with eint_init.
+            callback:Callable   Called as callback(pin, trigger, timestamp).
+        """
+
+        gpio = self._gpio
+        gpio._pin_check(pin, gpio._type_eint)
+        bit = 1 << gpio._eint_num[pin]
+        trigger = gpio._eint_triggers.get(pin)
+
+        with self._lock:
+            callbacks = dict(self._callbacks)
+            callbacks[bit] = (pin, trigger, callback)
+            self._callbacks = callbacks
+            self._mask |= bit
+
+    def unregister(self, pin):
+        """ Stop dispatching events of pin.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+        """
+
+        with self._lock:
+            callbacks = dict((bit, cb) for bit, cb in self._callbacks.items() if cb[0] != pin)
+            self._callbacks = callbacks
+            self._mask = 0
+
+            for bit in callbacks:
+                self._mask |= bit
+
+    def start(self):
+        """ Start the poller and worker threads."""
+
+        if self._running:
+            self._gpio._exception('Dispatcher already running.')
+
+        self._running = True
+        self._threads = [threading.Thread(target=self._poll, name='fgpio-eint-poll')]
+
+        for n in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name='fgpio-eint-%s' % n))
+
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self, wait=True):
+        """ Stop polling, let workers finish queued callbacks and exit.
+
+        Arguments:
+            wait:Bool       Wait for the workers, otherwise only for the
+                            poller and join() them later.
+        """
+
+        self._running = False
+
+        if self._threads and self._threads[0] is not threading.current_thread():
+            self._threads[0].join()
+
+        for n in range(self.workers):
+            self._queue.put(None)
+
+        if wait:
+            self.join()
+
+    def join(self):
+        """ Wait for the threads of a stopped dispatcher to exit."""
+
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join()
+
+        self._threads = []
+
+    def stats(self):
+        """ Dispatcher statistics.
+
+        Returns:Dict    polls, events, dispatched and errors counts,
+                        latency_mean, latency_max and latency_p99 in
+                        seconds from event seen to callback start (p99
+                        over the last 1024 events).
+        """
+
+        with self._lock:
+            recent = sorted(self._recent)
+            ret = {'polls': self._polls,
+                   'events': self._events,
+                   'dispatched': self._dispatched,
+                   'errors': self._errors,
+                   'latency_mean': self._latency_total / self._dispatched if self._dispatched else 0.0,
+                   'latency_max': self._latency_max,
+                   'latency_p99': recent[int(len(recent) * 0.99)] if recent else 0.0}
+
+        return ret
+
+    def stats_reset(self):
+        """ Reset statistics."""
+
+        self._polls = 0
+        self._events = 0
+        self._dispatched = 0
+        self._errors = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._recent = deque(maxlen=1024)
+
+    def _poll(self):
+        w = self._gpio._regs.words
+        pend = self._gpio.board.EINT_PEND_OFFSET >> 2
+        put = self._queue.put
+        clock = _clock
+        interval = 0.0
+        active = clock()
+
+        while self._running:
+            self._polls += 1
+            fired = w[pend] & self._mask
+
+            if fired:
+                now = clock()
+                w[pend] = fired
+                callbacks = self._callbacks
+                self._events += bin(fired).count('1')
+
+                while fired:
+                    bit = fired & -fired
+                    fired ^= bit
+                    cb = callbacks.get(bit)
+
+                    if cb is not None:
+                        put((cb, now))
+
+                active = now
+                interval = 0.0
+            elif clock() - active < self.spin:
+                # Let other threads run without giving up the tight loop.
+                sleep(0)
+            else:
+                interval = min(self.max_interval, interval * 2 or 0.0001)
+                sleep(interval)
+
+    def _work(self):
+        get = self._queue.get
+        clock = _clock
+
+        while True:
+            item = get()
+
+            if item is None:
+                break
+
+            (pin, trigger, callback), seen = item
+            latency = clock() - seen
+
+            with self._lock:
+                self._dispatched += 1
+                self._latency_total += latency
+                self._recent.append(latency)
+
+                if latency > self._latency_max:
+                    self._latency_max = latency
+
+            try:
+                callback(pin, trigger, seen)
+            except Exception:
+                with self._lock:
+                    self._errors += 1
@@ -0,0 +1,429 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import threading
+from time import sleep
+from collections import deque
+from timeit import default_timer as _clock
+
+# Quadrature step per (old state << 2 | new state), state being
+# A << 1 | B. None where both channels changed, direction unknown.
+_FORWARD = [0, 2, 3, 1]
+_STEPS = [0] * 16
+
+for _n in range(4):
+    _STEPS[_FORWARD[_n] << 2 | _FORWARD[(_n + 1) % 4]] = 1
+    _STEPS[_FORWARD[(_n + 1) % 4] << 2 | _FORWARD[_n]] = -1
+    _STEPS[_FORWARD[_n] << 2 | _FORWARD[(_n + 2) % 4]] = None
+
+
+class _Rate(object):
+    """ Position history for velocity over a time window."""
+
+    def __init__(self, window):
+        self.window = window
+        self.position = 0
+        self._samples = deque()
+
+    def velocity(self):
+        """ Average rate over the window.
+
+        Returns:Float   Counts per second.
+        """
+
+        now = _clock()
+        samples = self._samples
+        self._trim(now)
+
+        if not samples or now <= samples[0][0]:
+            return 0.0
+
+        t, position = samples[0]
+        return (self.position - position) / (now - t)
+
+    def _add(self, now):
+        self._samples.append((now, self.position))
+        self._trim(now)
+
+    def _trim(self, now):
+        # Keep one sample from before the window as its start.
+        samples = self._samples
+        start = now - self.window
+
+        while len(samples) > 1 and samples[1][0] <= start:
+            samples.popleft()
+
+
+class Encoder(_Rate):
+    """ Quadrature encoder on two EINT pins, from EncoderPoller.encoder().
+
+        position counts every edge of both channels, up when A leads B.
+        When both channels changed between polls the direction is lost,
+        the two edges are counted in the last direction seen and missed
+        goes up by one. overflow is True once that happened since
+        reset().
+    """
+
+    def __init__(self, a, b, window):
+        _Rate.__init__(self, window)
+        self.a = a
+        self.b = b
+        self.missed = 0
+        self._state = 0
+        self._direction = 1
+
+    @property
+    def overflow(self):
+        """ Edges came faster than polls since reset()."""
+
+        return self.missed > 0
+
+    def reset(self, position=0):
+        """ Set position, clear missed and velocity history.
+
+        Arguments:
+            position:Int    New position.
+        """
+
+        self.position = position
+        self.missed = 0
+        self._samples.clear()
+
+
+class Counter(_Rate):
+    """ Pulse counter on one EINT pin, from EncoderPoller.counter().
+
+        count is the number of trigger edges. Edges between two polls
+        merge into one, except with trigger both, where a pending event
+        with the level unchanged counts as the two edges it must have
+        been and missed goes up by one. With rising or falling merged
+        edges can not be seen and missed stays 0.
+    """
+
+    def __init__(self, pin, trigger, window):
+        _Rate.__init__(self, window)
+        self.pin = pin
+        self.trigger = trigger
+        self.missed = 0
+        self._level = 0
+
+    @property
+    def count(self):
+        return self.position
+
+    @property
+    def overflow(self):
+        """ Edges came faster than polls since reset()."""
+
+        return self.missed > 0
+
+    def reset(self, count=0):
+        """ Set count, clear missed and velocity history.
+
+        Arguments:
+            count:Int       New count.
+        """
+
+        self.position = count
+        self.missed = 0
+        self._samples.clear()
+
+
+class EncoderPoller(object):
+    """ Decodes quadrature encoders and counts pulses on EINT pins.
+
+        One polling loop serves every encoder and counter. Each poll
+        reads EINT_PEND once and, when any of their bits fired, clears
+        them with one write and reads the GPIO_DATA word of each bank
+        involved, then decodes all of them from those words. An edge
+        costs about three register accesses however many encoders are
+        registered.
+
+        The poll interval adapts like EINTDispatcher's, keep max_interval
+        below the time between edges to avoid missed counts.
+
+        Example:
+            enc = EncoderPoller(gpio)
+            wheel = enc.encoder(36, 37, window=0.1)
+            enc.start()
+            print(wheel.position, wheel.velocity(), wheel.missed)
+    """
+
+    def __init__(self, gpio, spin=0.05, max_interval=0.0005):
+        """ Initialize EncoderPoller
+
+        Arguments:
+            gpio:GPIO           GPIO object.
+            spin:Float          Seconds to poll without sleeping after an edge.
+            max_interval:Float  Longest sleep between polls when idle, seconds.
+        """
+
+        self._gpio = gpio
+        self.spin = spin
+        self.max_interval = max_interval
+        self._items = []
+        self._lock = threading.Lock()
+        self._table = ([], [], 0)
+        self._pend = gpio.board.EINT_PEND_OFFSET >> 2
+        self._thread = None
+        self._running = False
+        self.stats_reset()
+
+    def encoder(self, a, b, window=0.1):
+        """ Add a quadrature encoder, initializing both pins as EINT with
+        trigger both.
+
+        Arguments:
+            a:Int           Channel A pin, EINT capable.
+            b:Int           Channel B pin, EINT capable.
+            window:Float    Seconds velocity() averages over.
+
+        Returns:Encoder
+        """
+
+        if a == b:
+            self._gpio._value_error('Encoder pins must be different.')
+
+        self._eint_init([a, b], 'both')
+        enc = Encoder(a, b, window)
+        self._add(enc, [a, b])
+        return enc
+
+    def counter(self, pin, trigger='rising', window=1.0):
+        """ Add a pulse counter, initializing pin as EINT.
+
+        Arguments:
+            pin:Int         EINT capable pin.
+            trigger:Str     rising, falling or both.
+            window:Float    Seconds velocity() averages over.
+
+        Returns:Counter
+        """
+
+        if trigger not in ('rising', 'falling', 'both'):
+            self._gpio._value_error('Counter trigger must be rising, falling or both.')
+
+        self._eint_init([pin], trigger)
+        cnt = Counter(pin, trigger, window)
+        self._add(cnt, [pin])
+        return cnt
+
+    def remove(self, item):
+        """ Stop decoding an Encoder or Counter and close its pins.
+
+        Arguments:
+            item:Encoder    Encoder or Counter from this poller.
+        """
+
+        with self._lock:
+            items = [i for i in self._items if i[0] is not item]
+
+            if len(items) == len(self._items):
+                self._gpio._value_error('Not an encoder or counter of this poller.')
+
+            pins = [i[1] for i in self._items if i[0] is item][0]
+            self._items = items
+            self._compile()
+
+        for pin in pins:
+            self._gpio.eint_close(pin)
+
+    def start(self):
+        """ Poll from a background thread."""
+
+        if self._running:
+            self._gpio._exception('Encoder poller already running.')
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='fgpio-encoder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the polling thread."""
+
+        self._running = False
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self):
+        """ Poll once, for callers running their own loop.
+
+        Returns:Int     EINT events handled.
+        """
+
+        return self._poll(self._gpio._regs.words, _clock())
+
+    def stats(self):
+        """ Poller statistics.
+
+        Returns:Dict    polls, events (EINT bits handled) and max_gap,
+                        the longest time between polls in seconds.
+        """
+
+        return {'polls': self._polls, 'events': self._events, 'max_gap': self._max_gap}
+
+    def stats_reset(self):
+        """ Reset statistics."""
+
+        self._polls = 0
+        self._events = 0
+        self._max_gap = 0.0
+        self._last = None
+
+    def _eint_init(self, pins, trigger):
+        done = []
+
+        try:
+            for pin in pins:
+                self._gpio.eint_init(pin, trigger)
+                done.append(pin)
+        except:
+            for pin in done:
+                self._gpio.eint_close(pin)
+
+            raise
+
+    def _add(self, item, pins):
+        gpio = self._gpio
+        board = gpio.board
+        fields = []
+
+        for pin in pins:
+            index = gpio._gpio_mem_addr(pin, board.GPIO_DATA_OFFSET) >> 2
+            fields.append((index, gpio._num[pin], 1 << gpio._eint_num[pin]))
+
+        # Start from the current levels.
+        w = gpio._regs.words
+        levels = [(w[index] >> num) & 1 for index, num, bit in fields]
+
+        if isinstance(item, Encoder):
+            item._state = levels[0] << 1 | levels[1]
+        else:
+            item._level = levels[0]
+
+        with self._lock:
+            self._items.append((item, pins, fields))
+            self._compile()
+
+    def _compile(self):
+        # Per item the DATA word slots and bits to decode from, and the
+        # EINT mask of all items, swapped in whole for the poll loop.
+        indexes = []
+        entries = []
+        mask = 0
+
+        for item, pins, fields in self._items:
+            decoded = []
+
+            for index, num, bit in fields:
+                if index not in indexes:
+                    indexes.append(index)
+
+                decoded.append((indexes.index(index), num))
+                mask |= bit
+
+            entries.append((item, sum(f[2] for f in fields), decoded))
+
+        self._table = (indexes, entries, mask)
+
+    def _poll(self, w, now):
+        indexes, entries, mask = self._table
+        pend = self._pend
+        self._polls += 1
+
+        if self._last is not None and now - self._last > self._max_gap:
+            self._max_gap = now - self._last
+
+        self._last = now
+        fired = w[pend] & mask
+
+        if not fired:
+            return 0
+
+        # Clear before reading levels, so later edges stay pending.
+        w[pend] = fired
+        words = [w[i] for i in indexes]
+        steps = _STEPS
+
+        for item, bits, decoded in entries:
+            if not fired & bits:
+                continue
+
+            if len(decoded) == 2:
+                (sa, na), (sb, nb) = decoded
+                state = ((words[sa] >> na) & 1) << 1 | ((words[sb] >> nb) & 1)
+                step = steps[item._state << 2 | state]
+
+                if step is None:
+                    step = 2 * item._direction
+                    item.missed += 1
+                elif step:
+                    item._direction = step
+
+                item._state = state
+
+                if not step:
+                    continue
+
+                item.position += step
+            else:
+                s, n = decoded[0]
+                level = (words[s] >> n) & 1
+
+                if item.trigger == 'both' and level == item._level:
+                    item.missed += 1
+                    item.position += 2
+                else:
+                    item.position += 1
+
+                item._level = level
+
+            item._add(now)
+
+        count = bin(fired).count('1')
+        self._events += count
+        return count
+
+    def _run(self):
+        w = self._gpio._regs.words
+        clock = _clock
+        poll = self._poll
+        interval = 0.0
+        active = clock()
+
+        while self._running:
+            now = clock()
+
+            if poll(w, now):
+                active = now
+                interval = 0.0
+            elif now - active < self.spin:
+                sleep(0)
+            else:
+                interval = min(self.max_interval, interval * 2 or 0.00005)
+                sleep(interval)
@@ -25,9 +25,29 @@
 
 import os
 import math
-import mmap
-import struct
 from time import sleep
+from .handle import GPIOHandle, GPIOSetClearHandle, EINTHandle
+from .backends import DevMemBackend
+from .shadow import ShadowRegisters
+from .batch import Batch
+from .stats import Instrument
+from .snapshot import Snapshot, diff
+from .layout import from_config
+
+if hasattr(os, 'pwrite'):
+    def _pwrite(fd, data):
+        os.pwrite(fd, data, 0)
+
+    def _pread(fd, size):
+        return os.pread(fd, size, 0)
+else:
+    def _pwrite(fd, data):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, data)
+
+    def _pread(fd, size):
+        os.lseek(fd, 0, os.SEEK_SET)
+        return os.read(fd, size)
 
 class GPIO(object):
     """ GPIO gives access to the board gpio pins on the main connector.
@@ -36,11 +56,24 @@ class GPIO(object):
         Also provides PWM configuration for TOUTx capable pins.
     """
 
-    def __init__(self, board):
+    def __init__(self, board, mem_dev='/dev/mem', sys_pwm='/sys/class/pwm',
+                 shadow=False, shadow_verify=0, backend=None, ownership=None):
         """ Initialize GPIO
 
         Arguments:
-            board:Config    board config from boards/
+            board:Config        board config from boards/
+            mem_dev:Str         Memory device the registers are mapped from,
+                                any file at least MEM_OFFSET + MEM_LENGTH long
+                                can stand in for /dev/mem off target.
+            sys_pwm:Str         sysfs PWM class directory holding pwmchipN.
+            shadow:Bool         Keep a shadow of the configuration and output
+                                registers, see ShadowRegisters.
+            shadow_verify:Int   Verify the shadow every this many register
+                                updates, 0 only on shadow_verify().
+            backend:Backend     Register backend from backends, defaults to
+                                DevMemBackend(mem_dev).
+            ownership:Ownership Claim pins and lock banks between processes,
+                                see Ownership.
 
         Example:
             from boards import nanopi
@@ -54,45 +87,253 @@ class GPIO(object):
 
 
         self.board = board
-
-        for pin in self.board.pins:
-            self.board.pins[pin]['used'] = False
-
-        self._mm = None
-        self._mem_base_addr = (self.board.MEM_OFFSET & ~(mmap.PAGESIZE-1))
-        self._mem_base_addr_offset = self.board.MEM_OFFSET - self._mem_base_addr
-
-        self._sys_pwmchip = '/sys/class/pwm/pwmchip%s' % self.board.PWMCHIP_ID
+        # Pin tables compiled from the board, see layout. Pin use is kept
+        # here, so GPIO objects sharing a board don't see each other's.
+        self.layout = getattr(board, 'layout', None) or from_config(board)
+        self._used = dict((pin, False) for pin in self.layout.pins)
+        self._base = self.layout.base
+        self._num = self.layout.num
+        self._eint_num = self.layout.eint
+        self._eint_word = self.layout.eint_word
+        self._eint_shift = self.layout.eint_shift
+        self._pwm_num = self.layout.pwm
+
+        self._regs = None
+        self._backend = backend if backend is not None else DevMemBackend(mem_dev)
+        self._shadow = shadow
+        self._shadow_verify = shadow_verify
+        # Single bit writes to set/clear registers where the board has them,
+        # the shadow and batches need the DATA register written.
+        self._setclr = (not shadow and hasattr(board, 'GPIO_SET_OFFSET')
+                        and hasattr(board, 'GPIO_CLR_OFFSET'))
+        self._batch = None
+        self._mem_ranks = None
+        self._snapshot_offsets = None
+        self._reset_cache = {}
+        self._mem_w1c = set([self.board.EINT_PEND_OFFSET])
+        self._handles = {}
+        self._eint_triggers = {}
+        self._instrument = None
+        self._ownership = ownership
+
+        self._sys_pwmchip = os.path.join(sys_pwm, 'pwmchip%s' % self.board.PWMCHIP_ID)
         self._sys_pwm_export = os.path.join(self._sys_pwmchip, 'export')
         self._sys_pwm_unexport = os.path.join(self._sys_pwmchip, 'unexport')
         self._sys_pwm = os.path.join(self._sys_pwmchip, 'pwm%s')
         self._sys_pwm_period = os.path.join(self._sys_pwm, 'period')
         self._sys_pwm_duty_cycle = os.path.join(self._sys_pwm, 'duty_cycle')
         self._sys_pwm_enable = os.path.join(self._sys_pwm, 'enable')
+        self._sys_pwm_paths = {'period': self._sys_pwm_period,
+                               'duty_cycle': self._sys_pwm_duty_cycle,
+                               'enable': self._sys_pwm_enable}
+        self._pwm_fds = {}
+        self._pwm_values = {}
 
-    def gpio_init(self, pin, direction='in', updown='none'):
+    def gpio_init(self, pin, direction='in', updown='none', handle=False):
         """ Initialize a pin for GPIO use.
 
         Arguments:
             pin:Int             Pin number GPxN on board connector.
             direction:Str       Input or output, 'in' or 'out'
             updown:Str          Pullup/down, 'up', 'down', or 'none'
+            handle:Bool         Return a GPIOHandle for fast access.
+
+        Returns:GPIOHandle  If handle is True, otherwise None.
         """
 
         self._pin_available(pin, self._type_gpio)
 
-        if self._mm == None:
+        try:
+            if self._regs == None:
+                self._mem_open()
+
+            self._gpio_direction(pin, direction)
+            self._gpio_updn(pin, self._gpio_init_updn(direction, updown))
+        except:
+            self._pin_abort(pin)
+            raise
+
+        self._pin_use(pin, self._type_gpio)
+
+        if handle:
+            return self._gpio_handle(pin)
+
+    def gpio_init_many(self, pins, direction='in', updown='none'):
+        """ Initialize several pins for GPIO use at once.
+
+        GPIO_CON and GPIO_UPD are written once per bank rather than once
+        per pin.
+
+        Arguments:
+            pins:List           Pin numbers of board connector.
+            direction:Str       Input or output, 'in' or 'out'
+            updown:Str          Pullup/down, 'up', 'down', or 'none'
+        """
+
+        pins = list(pins)
+
+        if len(set(pins)) != len(pins):
+            self._value_error('Duplicate pin numbers: %s' % pins)
+
+        func_num = self._gpio_func_num(direction)
+        updn = self._gpio_init_updn(direction, updown)
+
+        try:
+            for pin in pins:
+                self._pin_available(pin, self._type_gpio)
+        except:
+            for pin in pins:
+                if self._used.get(pin) is False:
+                    self._pin_use(pin, False)
+            raise
+
+        if self._regs == None:
             self._mem_open()
 
-        self._gpio_direction(pin, direction)
+        self._gpio_mem_write_many(self.board.GPIO_CON_OFFSET, dict((pin, func_num) for pin in pins), 2)
+        self._gpio_mem_write_many(self.board.GPIO_UPD_OFFSET, dict((pin, updn) for pin in pins), 2)
 
-        # Safety check
-        if direction.lower() == self.board.FUNC_OUT:
-            self._gpio_updown(pin, 'none')
-        else:
-            self._gpio_updown(pin, updown)
+        for pin in pins:
+            self._pin_use(pin, self._type_gpio)
+
+    def shadow_resync(self):
+        """ Reload the register shadow from the device.
+
+        Use after something other than this object changed pin
+        configuration or outputs.
+        """
+
+        self._shadow_check()
+        self._regs.resync()
+
+    def shadow_verify(self):
+        """ Compare the register shadow with the device.
+
+        Returns:List    Byte offsets from MEM_OFFSET of registers that differ.
+        """
+
+        self._shadow_check()
+        return self._regs.verify()
+
+    def batch(self):
+        """ Group register updates into one write per register.
+
+        Use as a context manager, or call begin() and commit()/abort().
+
+        Example:
+            with gpio.batch() as b:
+                gpio.gpio_init(40, 'out')
+                gpio.gpio_write(40, 1)
+
+        Returns:Batch
+        """
+
+        return Batch(self)
+
+    def snapshot(self):
+        """ Read GPIO_CON, GPIO_DATA, GPIO_UPD of every bank and the EINT
+        control registers.
+
+        Pin use isn't part of the snapshot, only the registers.
+
+        Returns:Snapshot
+        """
+
+        if self._regs == None:
+            self._mem_open()
+
+        try:
+            return self._snapshot()
+        finally:
+            self._mem_close()
+
+    def diff(self, a, b):
+        """ Registers that differ between two snapshots.
+
+        Arguments:
+            a:Snapshot      First snapshot.
+            b:Snapshot      Second snapshot.
+
+        Returns:Dict    Byte offset from MEM_OFFSET to (a value, b value).
+        """
+
+        return diff(a, b)
+
+    def restore(self, snapshot):
+        """ Write back the registers of a snapshot that have changed.
+
+        Changed registers are written whole, once each, data before
+        pull up/down before function. Pin use is not changed, pins
+        initialized since the snapshot stay initialized. Registers the
+        snapshot doesn't have, ie from a partial from_dict(), are left
+        as they are.
+
+        Arguments:
+            snapshot:Snapshot   From snapshot(), or Snapshot.from_dict().
+
+        Returns:Int     Registers written.
+        """
+
+        if snapshot.base != self.board.MEM_OFFSET:
+            self._value_error('Snapshot of another board, MEM_OFFSET 0x%x.' % snapshot.base)
+
+        addrs = set(self._snapshot_addrs())
+
+        for offset in snapshot.offsets:
+            if offset not in addrs:
+                self._value_error('Snapshot register 0x%x is not a GPIO or EINT control register.' % offset)
+
+        if self._regs == None:
+            self._mem_open()
+
+        try:
+            changes = diff(self._snapshot(), snapshot)
+            changes = dict((offset, changes[offset]) for offset in changes if changes[offset][1] is not None)
 
-        self.board.pins[pin]['used'] = self._type_gpio
+            for offset in sorted(changes, key=self._mem_rank):
+                self._mem_write(offset, changes[offset][1])
+        finally:
+            self._mem_close()
+
+        return len(changes)
+
+    def instrument(self, enable=True, trace=0):
+        """ Turn call counters, latency histograms and register tracing on or off.
+
+        While off nothing is wrapped, so there is no cost. Turning it on
+        again starts from zero.
+
+        Arguments:
+            enable:Bool     Install or remove instrumentation.
+            trace:Int       Register writes to keep in a trace ring, 0 off.
+
+        Returns:Instrument  If enabled, otherwise None.
+        """
+
+        if self._instrument is not None:
+            self._instrument.remove()
+            self._instrument = None
+
+        if enable:
+            self._instrument = Instrument(self, trace)
+            self._instrument.install()
+
+        return self._instrument
+
+    def stats(self):
+        """ Snapshot of instrumentation counters, see Instrument.stats().
+
+        Returns:Dict
+        """
+
+        self._instrument_check()
+        return self._instrument.stats()
+
+    def stats_reset(self):
+        """ Zero instrumentation counters, histograms and trace."""
+
+        self._instrument_check()
+        self._instrument.reset()
 
     def gpio_close(self, pin):
         """ Close GPIO setting values to chip reset values.
@@ -106,12 +347,12 @@ class GPIO(object):
         self._mem_close()
 
     def gpio_close_all(self):
-        """ Close all GPIO pins."""
+        """ Close all GPIO and EINT pins.
 
-        for pin in self.board.pins:
-            self._gpio_close(pin)
+        Registers are reset with one write per changed register.
+        """
 
-        self._mem_close()
+        self._close_all([self._type_gpio, self._type_eint])
 
     def gpio_read(self, pin):
         """ Read pin value.
@@ -136,6 +377,71 @@ class GPIO(object):
         self._pin_check(pin, self._type_gpio)
         self._gpio_write(pin, value)
 
+    def gpio_read_many(self, pins):
+        """ Read several pin values, one register read per bank.
+
+        Arguments:
+            pins:List       Pin numbers of board connector.
+
+        Returns:Dict    Pin number to 1 for high, 0 for low.
+        """
+
+        for pin in pins:
+            self._pin_check(pin, self._type_gpio)
+
+        data = {}
+        ret = {}
+
+        for pin in pins:
+            addr = self._gpio_mem_addr(pin, self.board.GPIO_DATA_OFFSET)
+
+            if addr not in data:
+                data[addr] = self._mem_read(addr)
+
+            ret[pin] = 0x01 & (data[addr] >> self._num[pin])
+
+        return ret
+
+    def gpio_write_many(self, values):
+        """ Set several pin values, one read-modify-write per bank.
+
+        Arguments:
+            values:Dict     Pin number to value 1 or 0.
+        """
+
+        for pin in values:
+            self._pin_check(pin, self._type_gpio)
+
+        values = dict((pin, 1 if values[pin] else 0) for pin in values)
+        self._gpio_mem_write_many(self.board.GPIO_DATA_OFFSET, values, 1)
+
+    def port_read(self, bank):
+        """ Read the raw GPIO_DATA register of a bank.
+
+        Arguments:
+            bank:Str        Bank name from board config, ie 'GPG'.
+
+        Returns:Int     Register value, bit N is GPxN.
+        """
+
+        return self._mem_read(self._port_addr(bank))
+
+    def port_write(self, bank, mask, value):
+        """ Set the masked bits of the raw GPIO_DATA register of a bank.
+
+        Bits are not checked against initialized pins, only use on
+        pins set as outputs.
+
+        Arguments:
+            bank:Str        Bank name from board config, ie 'GPG'.
+            mask:Int        Bits to change, bit N is GPxN.
+            value:Int       New value of the masked bits.
+        """
+
+        self._int_check(mask, 'mask')
+        self._int_check(value, 'value')
+        self._mem_modify(self._port_addr(bank), mask, value)
+
     def gpio_direction(self, pin, direction):
         """ Set direction of pin.
 
@@ -158,27 +464,37 @@ class GPIO(object):
         self._pin_check(pin, self._type_gpio)
         self._gpio_updown(pin, updown)
 
-    def eint_init(self, pin, trigger):
+    def eint_init(self, pin, trigger, handle=False):
         """ Configure interrupt pin.
 
         Arguments:
             pin:Int         Pin number of board connector.
             trigger:Str     Trigger low, high, rising, falling, or both
+            handle:Bool     Return an EINTHandle for fast access.
+
+        Returns:EINTHandle  If handle is True, otherwise None.
         """
 
         self._pin_available(pin, self._type_eint)
 
-        if self._mm == None:
-            self._mem_open()
+        try:
+            if trigger not in ['low', 'high', 'rising', 'falling', 'none', 'both']:
+                self._value_error('Trigger must be low,  high, rising, falling, none, or both.')
 
-        self._gpio_function(pin, self.board.FUNC_EINT)
+            if self._regs == None:
+                self._mem_open()
 
-        if trigger not in ['low', 'high', 'rising', 'falling', 'none', 'both']:
-            self._value_error('Trigger must be low,  high, rising, falling, none, or both.')
+            self._gpio_function(pin, self.board.FUNC_EINT)
+            self._eint_trigger(pin, trigger)
+            self._eint_clear_event(pin)
+        except:
+            self._pin_abort(pin)
+            raise
 
-        self._eint_trigger(pin, trigger)
-        self._eint_clear_event(pin)
-        self.board.pins[pin]['used'] = self._type_eint
+        self._pin_use(pin, self._type_eint)
+
+        if handle:
+            return self._eint_handle(pin)
 
     def eint_close(self, pin):
         """Close interrupt pin.
@@ -191,12 +507,12 @@ class GPIO(object):
         self._mem_close()
 
     def eint_close_all(self):
-        """ Close all EINT pins."""
+        """ Close all EINT pins.
 
-        for pin in self.board.pins:
-            self._eint_close(pin)
+        Registers are reset with one write per changed register.
+        """
 
-        self._mem_close()
+        self._close_all([self._type_eint])
 
     def eint_event(self, pin):
         """Check if event triggered.
@@ -221,26 +537,36 @@ class GPIO(object):
 
         self._pin_available(pin, self._type_pwm)
 
-        if not os.path.exists(self._sys_pwm_export):
-            self._exception('sys PWM path does not exist.')
+        try:
+            if not os.path.exists(self._sys_pwm_export):
+                self._exception('sys PWM path does not exist.')
 
+            if self._regs == None:
+                self._mem_open()
 
-        # set pin to alternate function.
-        self._gpio_function(pin, self.board.FUNC_PWM)
+            # set pin to alternate function.
+            self._gpio_function(pin, self.board.FUNC_PWM)
 
-        # Error if pin is already exported.
-        try:
-            self._sys_write(self._sys_pwm_export, self.board.pins[pin][self._type_pwm]['num'])
-        except:
-            pass
+            # Error if pin is already exported.
+            try:
+                self._sys_write(self._sys_pwm_export, self._pwm_num[pin])
+            except:
+                pass
 
-        # clear old value if any.
-        if self._pwm_get_period(pin) > 0:
-            self._pwm_duty_cycle(pin, 0)
+            self._pwm_open(pin)
 
-        self._pwm_period(pin, period)
-        self._pwm_duty_cycle(pin, duty_cycle)
-        self.board.pins[pin]['used'] = self._type_pwm
+            # clear old value if any.
+            if self._pwm_get_period(pin) > 0:
+                self._pwm_duty_cycle(pin, 0)
+
+            self._pwm_period(pin, period)
+            self._pwm_duty_cycle(pin, duty_cycle)
+        except:
+            self._pwm_fds_close(pin)
+            self._pin_abort(pin)
+            raise
+
+        self._pin_use(pin, self._type_pwm)
 
     def pwm_close(self, pin):
         """ Close PWM pin
@@ -250,14 +576,17 @@ class GPIO(object):
 
         self._pin_check(pin, self._type_pwm)
         self._pwm_close(pin)
+        self._mem_close()
 
     def pwm_close_all(self):
-        """ Close all PWM pins."""
+        """ Close all PWM pins.
+
+        Pin functions are reset with one write per changed register.
+        """
 
-        for pin in self.board.pins:
-            self._pwm_close(pin)
+        self._close_all([self._type_pwm])
 
-    def pwm_get_period(self, pin, period):
+    def pwm_get_period(self, pin):
         """ Get the PWM period in nanoseconds.
         Returns:Int         Period in nanoseconds.
         """
@@ -324,37 +653,194 @@ class GPIO(object):
         if not num >= 0:
             self._value_error('%s is not greater than 0.')
 
+    def _shadow_check(self):
+        if not self._shadow:
+            self._exception('Register shadow not enabled.')
+
+        if self._regs == None:
+            self._exception('Registers not mapped, no pins initialized.')
+
+    def _instrument_check(self):
+        if self._instrument is None:
+            self._exception('Instrumentation not enabled.')
+
     def _pin_available(self, pin, ptype):
-        if pin not in self.board.pins:
+        if pin not in self._used:
             self._value_error('Not a valid pin number: %s' % pin)
 
-        if ptype not in self.board.pins[pin]:
+        if ptype not in self.layout.types[pin]:
             self._exception('Bad function type %s for pin %s' % (ptype, pin))
 
-        if self.board.pins[pin]['used'] != False:
-            self._exception('pin %s already in use as %s.' % (pin, self.board.pins[pin]['used']))
+        if self._used[pin] != False:
+            self._exception('pin %s already in use as %s.' % (pin, self._used[pin]))
+
+        if self._ownership is not None:
+            self._ownership.claim(pin, ptype)
+
+    def _pin_use(self, pin, used):
+        self._used[pin] = used
+
+        if self._ownership is not None and used is False:
+            if self._batch is not None:
+                # Released on commit, abort keeps the claim.
+                self._batch._releases.add(pin)
+            else:
+                self._ownership.release(pin)
+
+    def _pin_abort(self, pin):
+        # Undo _pin_available after a failed init.
+        self._pin_use(pin, False)
+        self._mem_close()
 
     def _pin_check(self, pin, ptype):
-        if pin not in self.board.pins:
+        used = self._used.get(pin)
+
+        if used == ptype:
+            return
+
+        if used is None:
             self._value_error('Not a valid pin number: %s' % pin)
 
-        if self.board.pins[pin]['used'] == False:
+        if used == False:
             self._exception('pin %s not initialized as %s.' % (pin, ptype))
 
-        if self.board.pins[pin]['used'] != ptype:
-            self._exception('pin %s already in use as %s.' % (pin, self.board.pins[pin]['used']))
+        self._exception('pin %s already in use as %s.' % (pin, used))
+
+    def _gpio_handle(self, pin):
+        addr = self._gpio_mem_addr(pin, self.board.GPIO_DATA_OFFSET)
+        num = self._num[pin]
+
+        if self._setclr:
+            h = GPIOSetClearHandle(pin, self._regs, addr, num,
+                                   self._gpio_mem_addr(pin, self.board.GPIO_SET_OFFSET),
+                                   self._gpio_mem_addr(pin, self.board.GPIO_CLR_OFFSET))
+        else:
+            h = GPIOHandle(pin, self._regs, addr, num)
+
+        self._handles[pin] = h
+        return h
+
+    def _eint_handle(self, pin):
+        addr = self._gpio_mem_addr(pin, self.board.GPIO_DATA_OFFSET)
+        h = EINTHandle(pin, self._regs, addr, self._num[pin],
+                       self.board.EINT_PEND_OFFSET, self._eint_num[pin])
+        self._handles[pin] = h
+        return h
+
+    def _handle_release(self, pin):
+        h = self._handles.pop(pin, None)
+
+        if h is not None:
+            h._release()
+
+    def _close_all(self, ptypes):
+        # Reset fields of all pins of ptypes from one snapshot, writing
+        # each changed register once.
+        pins = [pin for pin in self.layout.pins if self._used[pin] in ptypes]
+
+        if not pins:
+            self._mem_close()
+            return
+
+        if self._regs == None:
+            self._mem_open()
+
+        current = dict(self._snapshot().items())
+        fields = {}
+
+        for pin in pins:
+            used = self._used[pin]
+
+            if used == self._type_pwm:
+                self._pwm_release(pin)
+            else:
+                self._handle_release(pin)
+
+            if used == self._type_eint:
+                self._eint_triggers.pop(pin, None)
+
+            for addr, mask, value in self._reset_fields(pin, used):
+                m = fields.get(addr)
+
+                if m is None:
+                    fields[addr] = [mask, value]
+                else:
+                    m[0] |= mask
+                    m[1] |= value
+
+            self._pin_use(pin, False)
+
+        try:
+            for addr in sorted(fields, key=self._mem_rank):
+                mask, value = fields[addr]
+
+                if current[addr] & mask != value:
+                    self._mem_modify(addr, mask, value)
+        finally:
+            self._mem_close()
+
+    def _reset_fields(self, pin, used):
+        # (addr, mask, value) of the chip reset value of each register
+        # field closing pin from use resets.
+        key = (pin, used)
+        ret = self._reset_cache.get(key)
+
+        if ret is None:
+            num = self._num[pin]
+            ret = [(self._gpio_mem_addr(pin, self.board.GPIO_CON_OFFSET), 3 << (num * 2),
+                    (self.board.FUNC_RESET & 3) << (num * 2))]
+
+            if used != self._type_pwm:
+                ret.append((self._gpio_mem_addr(pin, self.board.GPIO_DATA_OFFSET), 1 << num,
+                            (self.board.DATA_RESET & 1) << num))
+                ret.append((self._gpio_mem_addr(pin, self.board.GPIO_UPD_OFFSET), 3 << (num * 2),
+                            (self.board.UPDN_RESET & 3) << (num * 2)))
+
+            if used == self._type_eint:
+                addr, shift = self._eint_field(pin)
+                ret.append((addr, 7 << shift, (self.board.EINT_RESET & 7) << shift))
+
+            ret = self._reset_cache[key] = tuple(ret)
+
+        return ret
+
+    def _snapshot(self):
+        # One pass over the registers, mapping must be open.
+        offsets = self._snapshot_addrs()
+
+        if self._batch is None:
+            w = self._regs.words
+            values = [w[offset >> 2] for offset in offsets]
+        else:
+            values = [self._mem_read(offset) for offset in offsets]
+
+        return Snapshot(offsets, values, self.board.MEM_OFFSET)
+
+    def _snapshot_addrs(self):
+        if self._snapshot_offsets is None:
+            addrs = []
+
+            for bank in sorted(self.layout.banks):
+                base = self.layout.banks[bank]
+                addrs.extend([base + self.board.GPIO_CON_OFFSET,
+                              base + self.board.GPIO_DATA_OFFSET,
+                              base + self.board.GPIO_UPD_OFFSET])
+
+            self._snapshot_offsets = sorted(addrs + self._eint_control_addrs())
+
+        return self._snapshot_offsets
 
     def _gpio_close(self, pin):
-        if self.board.pins[pin]['used'] in [self._type_gpio, self._type_eint]:
+        if self._used[pin] in [self._type_gpio, self._type_eint]:
+            self._handle_release(pin)
             self._gpio_write(pin, self.board.DATA_RESET)
             self._gpio_function(pin, self.board.FUNC_RESET)
             self._gpio_updn(pin, self.board.UPDN_RESET)
-            self.board.pins[pin]['used'] = False
+            self._pin_use(pin, False)
 
     def _gpio_read(self, pin):
-        self._gpio_mem_seek_addr(pin, self.board.GPIO_DATA_OFFSET)
-        data = self._mem_read()
-        return 0x01 & (data >> self.board.pins[pin][self._type_gpio]['num'])
+        data = self._mem_read(self._base[pin] + self.board.GPIO_DATA_OFFSET)
+        return 0x01 & (data >> self._num[pin])
 
     def _gpio_write(self, pin, value):
         if value:
@@ -362,10 +848,17 @@ class GPIO(object):
         else:
             value =  0
 
-        self._gpio_mem_seek_addr(pin, self.board.GPIO_DATA_OFFSET)
-        self._gpio_mem_write(pin, value)
+        if self._setclr and self._batch is None:
+            offset = self.board.GPIO_SET_OFFSET if value else self.board.GPIO_CLR_OFFSET
+            self._mem_write(self._base[pin] + offset, 1 << self._num[pin])
+            return
+
+        self._gpio_mem_write(self._base[pin] + self.board.GPIO_DATA_OFFSET, pin, value)
 
     def _gpio_direction(self, pin, direction):
+        self._gpio_function(pin, self._gpio_func_num(direction))
+
+    def _gpio_func_num(self, direction):
         direction = direction.lower()
         if direction == 'out':
             func_num = self.board.FUNC_OUT
@@ -374,13 +867,15 @@ class GPIO(object):
         else:
             self._value_error('Bad GPIO func: %s' % direction)
 
-        self._gpio_function(pin, func_num)
+        return func_num
 
     def _gpio_function(self, pin, func):
-        self._gpio_mem_seek_addr(pin, self.board.GPIO_CON_OFFSET)
-        self._gpio_mem_write2(pin, func)
+        self._gpio_mem_write2(self._gpio_mem_addr(pin, self.board.GPIO_CON_OFFSET), pin, func)
 
     def _gpio_updown(self, pin, updown):
+        self._gpio_updn(pin, self._gpio_updn_num(updown))
+
+    def _gpio_updn_num(self, updown):
         updown = updown.lower()
         if updown == 'up':
             updn = self.board.UPDN_UP
@@ -391,31 +886,58 @@ class GPIO(object):
         else:
             self._value_error('Bad GPIO updown: %s' % updown)
 
-        self._gpio_updn(pin, updn)
+        return updn
+
+    def _gpio_init_updn(self, direction, updown):
+        updn = self._gpio_updn_num(updown)
+
+        # Safety check, outputs are never pulled.
+        if direction.lower() == 'out':
+            return self.board.UPDN_NONE
+
+        return updn
 
     def _gpio_updn(self, pin, updn):
-        self._gpio_mem_seek_addr(pin, self.board.GPIO_UPD_OFFSET)
-        self._gpio_mem_write2(pin, updn)
+        self._gpio_mem_write2(self._gpio_mem_addr(pin, self.board.GPIO_UPD_OFFSET), pin, updn)
+
+    def _gpio_mem_addr(self, pin, offset_bank):
+        return self._base[pin] + offset_bank
+
+    def _gpio_mem_write(self, addr, pin, value):
+        pin_num = self._num[pin]
+        self._mem_modify(addr, 1 << pin_num, (value & 1) << pin_num)
+
+    def _gpio_mem_write2(self, addr, pin, value):
+        pin_num = self._num[pin]
+        self._mem_modify(addr, 3 << (pin_num * 2), (value & 3) << (pin_num * 2))
+
+    def _gpio_mem_write_many(self, offset_bank, values, width):
+        # Collect each pin's field into one (mask, value) per bank register.
+        field = (1 << width) - 1
+        regs = {}
+
+        for pin in values:
+            addr = self._base[pin] + offset_bank
+            shift = self._num[pin] * width
+            mask, data = regs.get(addr, (0, 0))
+            regs[addr] = (mask | (field << shift), data | ((values[pin] & field) << shift))
+
+        for addr in sorted(regs):
+            self._mem_modify(addr, regs[addr][0], regs[addr][1])
 
-    def _gpio_mem_seek_addr(self, pin, offset_bank):
-        bank = self.board.pins[pin]['bank']
-        self._mm.seek(self._mem_base_addr_offset + self.board.banks[bank] + offset_bank)
+    def _port_addr(self, bank):
+        if bank not in self.layout.banks:
+            self._value_error('Not a valid bank: %s' % bank)
 
-    def _gpio_mem_write(self, pin, value):
-        pin_num = self.board.pins[pin][self._type_gpio]['num']
-        data = self._mem_read()
-        data = (data & ~(1 << (pin_num))) | ((value & 1) << (pin_num))
-        self._mem_write(data)
+        if self._regs == None:
+            self._mem_open()
 
-    def _gpio_mem_write2(self, pin, value):
-        pin_num = self.board.pins[pin][self._type_gpio]['num']
-        data = self._mem_read()
-        data = (data & ~(3 << (pin_num * 2))) | ((value & 3) << (pin_num * 2))
-        self._mem_write(data)
+        return self.layout.banks[bank] + self.board.GPIO_DATA_OFFSET
 
     def _eint_close(self, pin):
-        if self.board.pins[pin]['used'] == self._type_eint:
+        if self._used[pin] == self._type_eint:
             self._eint_control(pin, self.board.EINT_RESET)
+            self._eint_triggers.pop(pin, None)
             self._gpio_close(pin)
 
     def _eint_trigger(self, pin, trigger):
@@ -433,71 +955,124 @@ class GPIO(object):
             self._value_error('Trigger must be low, high, rising, falling, or both.')
 
         self._eint_control(pin, trig_num)
+        self._eint_triggers[pin] = trigger
 
     def _eint_control(self, pin, value):
-        pin_num = self.board.pins[pin][self._type_eint]['num']
-        self._eint_mem_seek_addr(self.board.EINT_CONT_OFFSET + (((pin_num * 4) / 32))*4)
-        data = self._mem_read()
-        pin_offset = ((pin_num * 4) % 32)
-        data = (data & ~(7 << pin_offset)) | ((value & 7) << pin_offset)
-        self._mem_write(data)
+        addr, pin_offset = self._eint_field(pin)
+        self._mem_modify(addr, 7 << pin_offset, (value & 7) << pin_offset)
+
+    def _eint_field(self, pin):
+        # (address, shift) of the pin's trigger field in EINT control.
+        return (self._eint_mem_addr(self._eint_word[pin]), self._eint_shift[pin])
 
     def _eint_get_event(self, pin):
-        self._eint_mem_seek_addr(self.board.EINT_PEND_OFFSET)
-        data = self._mem_read()
-        return 0x01 & (data >> self.board.pins[pin][self._type_eint]['num'])
+        data = self._mem_read(self._eint_mem_addr(self.board.EINT_PEND_OFFSET))
+        return 0x01 & (data >> self._eint_num[pin])
 
     def _eint_clear_event(self, pin):
-        self._eint_mem_seek_addr(self.board.EINT_PEND_OFFSET)
-        data = self._mem_read()
-        pin_num = self.board.pins[pin][self._type_eint]['num'] 
-        data = (data & ~(1 << pin_num)) | (1 << pin_num)
-        self._mem_write(data)
+        # EINT_PEND is write 1 to clear, writing back other set bits would clear them too.
+        self._mem_write(self._eint_mem_addr(self.board.EINT_PEND_OFFSET), 1 << self._eint_num[pin])
 
-    def _eint_mem_seek_addr(self, offset):
-        self._mm.seek(self._mem_base_addr_offset + offset)
+    def _eint_mem_addr(self, offset):
+        return offset
 
     def _mem_open(self):
-        f = os.open('/dev/mem', os.O_RDWR | os.O_SYNC)
-        self._mm = mmap.mmap(f, self.board.MEM_LENGTH,
-                            mmap.MAP_SHARED,
-                            mmap.PROT_READ | mmap.PROT_WRITE,
-                            offset=self._mem_base_addr)
+        self._regs = self._backend.open(self.board)
+
+        if self._ownership is not None:
+            # Every read-modify-write, handles and engines included, holds the bank.
+            self._regs.lock = self._ownership.lock
+
+        if self._shadow:
+            self._regs = self._shadow_regs(self._regs)
 
     def _mem_close(self):
-        for pin in self.board.pins:
-            if self.board.pins[pin]['used'] is not False:
+        if self._batch is not None:
+            # Closed once the batch is committed or aborted.
+            return
+
+        for pin in self.layout.pins:
+            if self._used[pin] is not False:
                 break
         else:
-             self._mm.close()
-             self._mm = None
+            if self._regs is not None:
+                self._regs.close()
 
-    def _mem_read(self):
-        ret = struct.unpack('I',  self._mm.read(4))[0]
-        self._mm.seek(self._mm.tell()-4)
-        return ret
+            self._regs = None
+
+    def _shadow_regs(self, regs):
+        banks = []
+
+        for bank in sorted(self.layout.banks):
+            base = self.layout.banks[bank]
+            banks.append((base + self.board.GPIO_CON_OFFSET,
+                          base + self.board.GPIO_DATA_OFFSET,
+                          base + self.board.GPIO_UPD_OFFSET))
+
+        return ShadowRegisters(regs, banks, self._eint_control_addrs(), self.board.FUNC_OUT, self._shadow_verify)
 
-    def _mem_write(self, data):
-        self._mm.write(struct.pack('I', data))
+    def _eint_control_addrs(self):
+        return sorted(self._eint_mem_addr(addr) for addr in self.layout.eint_words)
+
+    def _mem_rank(self, addr):
+        # Batch write order, see Batch.
+        if self._mem_ranks is None:
+            ranks = {}
+
+            for bank in self.layout.banks:
+                base = self.layout.banks[bank]
+                ranks[base + self.board.GPIO_DATA_OFFSET] = 0
+                ranks[base + self.board.GPIO_UPD_OFFSET] = 1
+                ranks[base + self.board.GPIO_CON_OFFSET] = 2
+
+            for a in self._eint_control_addrs():
+                ranks[a] = 3
+
+            self._mem_ranks = ranks
+
+        return (self._mem_ranks.get(addr, 4), addr)
+
+    def _mem_read(self, addr):
+        if self._batch is not None:
+            return self._batch.read(addr, self._regs.read(addr))
+
+        return self._regs.read(addr)
+
+    def _mem_write(self, addr, data):
+        if self._batch is not None:
+            self._batch.write(addr, data)
+        else:
+            self._regs.write(addr, data)
+
+    def _mem_modify(self, addr, mask, data):
+        if self._batch is not None:
+            self._batch.modify(addr, mask, data)
+        else:
+            self._regs.modify(addr, mask, data)
 
     def _pwm_close(self, pin):
-        if self.board.pins[pin]['used'] == self._type_pwm:
-            self.board.pins[pin]['used'] = False
+        if self._used[pin] == self._type_pwm:
+            self._pwm_release(pin)
+            self._gpio_function(pin, self.board.FUNC_RESET)
+            self._pin_use(pin, False)
 
-            try:
-                self._pwm_duty_cycle(pin, 0)
-                self._pwm_enable(pin, 0)
-                self._sys_write(self._sys_pwm_unexport, self.board.pins[pin][self._type_pwm]['num'])
-            except:
-                pass
+    def _pwm_release(self, pin):
+        # Stop and unexport the PWM, registers are left to the caller.
+        try:
+            self._pwm_duty_cycle(pin, 0)
+            self._pwm_enable(pin, 0)
+        except:
+            pass
 
-    def _pwm_get_period(self, pin):
-        path = self._sys_pwm_period % self.board.pins[pin][self._type_pwm]['num']
+        self._pwm_fds_close(pin)
 
-        if not os.path.exists(path):
-            self._exception('PWM pin %s period path does not exist.' % pin)
+        try:
+            self._sys_write(self._sys_pwm_unexport, self._pwm_num[pin])
+        except:
+            pass
 
-        return self._sys_read(path)
+    def _pwm_get_period(self, pin):
+        return self._pwm_sys_read(pin, 'period')
 
     def _pwm_period(self, pin, period):
         self._int_check(period, 'period')
@@ -505,20 +1080,10 @@ class GPIO(object):
         if period <= 0:
             self._value_error('PWM period must be greater than 0.')
 
-        path = self._sys_pwm_period % self.board.pins[pin][self._type_pwm]['num']
-
-        if not os.path.exists(path):
-            self._exception('PWM pin %s period path does not exist.' % pin)
-
-        self._sys_write(path, period)
+        self._pwm_sys_write(pin, 'period', period)
 
     def _pwm_get_duty_cycle(self, pin):
-        path = self._sys_pwm_duty_cycle % self.board.pins[pin][self._type_pwm]['num']
-
-        if not os.path.exists(path):
-            self._exception('PWM pin %s duty cycle path does not exist.' % pin)
-
-        return self._sys_read(path)
+        return self._pwm_sys_read(pin, 'duty_cycle')
 
     def _pwm_duty_cycle(self, pin, duty_cycle):
         self._int_check(duty_cycle, 'duty cycle')
@@ -526,20 +1091,84 @@ class GPIO(object):
         if duty_cycle > self._pwm_get_period(pin):
             self._exception('PWM duty cycle must be less than period.')
 
-        path = self._sys_pwm_duty_cycle % self.board.pins[pin][self._type_pwm]['num']
+        self._pwm_sys_write(pin, 'duty_cycle', duty_cycle)
 
-        if not os.path.exists(path):
-            self._exception('PWM pin %s duty cycle path does not exist.' % pin)
+    def _pwm_enable(self, pin, onoff):
+        self._pwm_sys_write(pin, 'enable', onoff)
 
-        self._sys_write(path, duty_cycle)
+    def _pwm_open(self, pin):
+        # Keep the sys files open, values are written with pwrite and cached.
+        num = self._pwm_num[pin]
+        paths = {'period': self._sys_pwm_period % num,
+                 'duty_cycle': self._sys_pwm_duty_cycle % num,
+                 'enable': self._sys_pwm_enable % num}
+        fds = {}
 
-    def _pwm_enable(self, pin, onoff):
-        path = self._sys_pwm_enable % self.board.pins[pin][self._type_pwm]['num']
+        try:
+            for name in paths:
+                fds[name] = os.open(paths[name], os.O_RDWR)
+        except OSError as e:
+            for fd in fds.values():
+                os.close(fd)
 
-        if not os.path.exists(path):
-            self._exception('PWM pin %s enable path does not exist.' % pin)
+            self._exception('PWM pin %s sys file could not be opened. %s' % (pin, e))
+
+        self._pwm_fds[pin] = fds
+        self._pwm_values.setdefault(pin, {})
+
+    def _pwm_fds_close(self, pin):
+        for fd in self._pwm_fds.pop(pin, {}).values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+        self._pwm_values.pop(pin, None)
+
+    def _pwm_sys_read(self, pin, name):
+        values = self._pwm_values.get(pin)
+
+        if values is not None and name in values:
+            return values[name]
+
+        fds = self._pwm_fds.get(pin)
+
+        if fds is None:
+            value = self._sys_read(self._sys_pwm_paths[name] % self._pwm_num[pin])
+        else:
+            try:
+                value = int(_pread(fds[name], 32))
+            except (OSError, ValueError) as e:
+                self._exception('PWM pin %s %s read failed. %s' % (pin, name, e))
+
+            values[name] = value
+
+        return value
+
+    def _pwm_sys_write(self, pin, name, value):
+        fds = self._pwm_fds.get(pin)
+
+        if fds is None:
+            self._sys_write(self._sys_pwm_paths[name] % self._pwm_num[pin], value)
+            return
+
+        data = ('%s' % value).encode('ascii')
+
+        try:
+            _pwrite(fds[name], data)
+        except OSError:
+            # fd may have gone stale, reopen and retry once.
+            values = self._pwm_values.get(pin, {})
+            self._pwm_fds_close(pin)
+            self._pwm_open(pin)
+            self._pwm_values[pin] = values
+
+            try:
+                _pwrite(self._pwm_fds[pin][name], data)
+            except OSError as e:
+                self._exception('PWM pin %s %s write failed. %s' % (pin, name, e))
 
-        self._sys_write(path, onoff)
+        self._pwm_values[pin][name] = value
 
     def _sys_write(self, path, value):
         if not os.path.exists(path):
@@ -0,0 +1,191 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from .registers import CLOSED
+
+
+class GPIOHandle(object):
+    """ Precompiled access to a single initialized GPIO pin.
+
+        The register index, bit shift and mask are worked out once, so
+        read/write/toggle skip the pin checks and board dict lookups done
+        by GPIO.gpio_read/gpio_write. Get one from gpio_init(..., handle=True),
+        it stops working once the pin is closed. write() and toggle() hold
+        the register's lock, see Registers.lock().
+    """
+
+    __slots__ = ('pin', '_words', '_index', '_shift', '_mask', '_lock_acquire', '_lock_release')
+
+    def __init__(self, pin, regs, offset, shift):
+        """ Initialize GPIOHandle
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+            regs:Registers  Register window of the board.
+            offset:Int      Byte offset of the GPIO_DATA register.
+            shift:Int       Bit of the pin in the GPIO_DATA register.
+        """
+
+        self.pin = pin
+        self._words = regs.words
+        self._index = offset >> 2
+        self._shift = shift
+        self._mask = 1 << shift
+        lock = regs.lock(offset)
+        # Bound up front, cheaper than a with block per call.
+        self._lock_acquire = lock.acquire
+        self._lock_release = lock.release
+
+    def read(self):
+        """ Read pin value.
+
+        Returns:Int     1 for high, 0 for low.
+        """
+
+        return (self._words[self._index] >> self._shift) & 1
+
+    def write(self, value):
+        """ Set value of pin.
+
+        Arguments:
+            value:Int       1 or 0.
+        """
+
+        w = self._words
+        i = self._index
+
+        self._lock_acquire()
+
+        try:
+            if value:
+                w[i] |= self._mask
+            else:
+                w[i] &= ~self._mask
+        finally:
+            self._lock_release()
+
+    def toggle(self):
+        """ Invert value of pin."""
+
+        self._lock_acquire()
+
+        try:
+            self._words[self._index] ^= self._mask
+        finally:
+            self._lock_release()
+
+    def _release(self):
+        self._words = CLOSED
+
+
+class GPIOSetClearHandle(GPIOHandle):
+    """ GPIOHandle for banks with set and clear registers.
+
+        write() stores the pin's bit to the set or clear register, a
+        single write with no read-modify-write and no lock.
+    """
+
+    __slots__ = ('_set_index', '_clr_index')
+
+    def __init__(self, pin, regs, offset, shift, set_offset, clr_offset):
+        """ Initialize GPIOSetClearHandle
+
+        Arguments:
+            pin:Int             Pin number of board connector.
+            regs:Registers      Register window of the board.
+            offset:Int          Byte offset of the GPIO_DATA register.
+            shift:Int           Bit of the pin in the GPIO_DATA register.
+            set_offset:Int      Byte offset of the set register.
+            clr_offset:Int      Byte offset of the clear register.
+        """
+
+        GPIOHandle.__init__(self, pin, regs, offset, shift)
+        self._set_index = set_offset >> 2
+        self._clr_index = clr_offset >> 2
+
+    def write(self, value):
+        """ Set value of pin.
+
+        Arguments:
+            value:Int       1 or 0.
+        """
+
+        if value:
+            self._words[self._set_index] = self._mask
+        else:
+            self._words[self._clr_index] = self._mask
+
+    def toggle(self):
+        """ Invert value of pin."""
+
+        w = self._words
+
+        if w[self._index] & self._mask:
+            w[self._clr_index] = self._mask
+        else:
+            w[self._set_index] = self._mask
+
+
+class EINTHandle(GPIOHandle):
+    """ Precompiled access to a single initialized EINT pin.
+
+        Same as GPIOHandle, with event()/clear() working directly on
+        the EINT_PEND register. Get one from eint_init(..., handle=True).
+    """
+
+    __slots__ = ('_pend_index', '_pend_mask')
+
+    def __init__(self, pin, regs, offset, shift, pend_offset, eint_num):
+        """ Initialize EINTHandle
+
+        Arguments:
+            pin:Int             Pin number of board connector.
+            regs:Registers      Register window of the board.
+            offset:Int          Byte offset of the GPIO_DATA register.
+            shift:Int           Bit of the pin in the GPIO_DATA register.
+            pend_offset:Int     Byte offset of the EINT_PEND register.
+            eint_num:Int        EINT number of the pin.
+        """
+
+        GPIOHandle.__init__(self, pin, regs, offset, shift)
+        self._pend_index = pend_offset >> 2
+        self._pend_mask = 1 << eint_num
+
+    def event(self):
+        """Check if event triggered.
+
+        Returns:Int 0 for False 1 for True.
+        """
+
+        if self._words[self._pend_index] & self._pend_mask:
+            return 1
+
+        return 0
+
+    def clear(self):
+        """Clear triggered event."""
+
+        # EINT_PEND is write 1 to clear, only touch our own bit.
+        self._words[self._pend_index] = self._pend_mask
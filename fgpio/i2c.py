@@ -0,0 +1,644 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from timeit import default_timer as _clock
+
+from .registers import byte_view
+
+
+class I2C(object):
+    """ Bit-banged I2C master on two GPIO pins of one bank.
+
+        Open drain is emulated with the data latch of both pins held at
+        0 and GPIO_CON switching them between output (drive low) and
+        input (released, pulled high). Other writes to the bank's
+        GPIO_DATA read back the high level of released pins into their
+        latch, so it is cleared again at each start, stop and byte.
+        Both pins sit in one GPIO_CON
+        word, so each bus change is one register write from a table of
+        the four SDA/SCL states. Bytes go out and in straight on the
+        registers with the bus locks taken once per byte.
+
+        A slave holding SCL low stretches the clock, up to timeout
+        seconds. There is no multi-master arbitration.
+
+        Example:
+            gpio.gpio_init_many([27, 28], 'in')
+            i2c = I2C(gpio, sda=27, scl=28)
+            print(i2c.scan())
+            i2c.write(0x50, b'\\x00\\x10hello')
+            data = i2c.write_read(0x50, b'\\x00\\x10', 5)
+    """
+
+    def __init__(self, gpio, sda=27, scl=28, frequency=100000, timeout=0.01, pullup=True):
+        """ Initialize I2C
+
+        Arguments:
+            gpio:GPIO       GPIO object with both pins initialized as GPIO.
+            sda:Int         Data pin.
+            scl:Int         Clock pin, on the same bank as sda.
+            frequency:Int   Upper bound of the SCL rate in Hz, 0 runs as
+                            fast as the register path allows.
+            timeout:Float   Seconds a slave may stretch the clock.
+            pullup:Bool     Enable the internal pull ups, set False with
+                            external pull up resistors only.
+        """
+
+        if sda == scl:
+            gpio._value_error('I2C pins must be different.')
+
+        for pin in (sda, scl):
+            gpio._pin_check(pin, gpio._type_gpio)
+
+        board = gpio.board
+
+        if gpio.layout.bank[sda] != gpio.layout.bank[scl]:
+            gpio._value_error('I2C pins must be on one bank.')
+
+        self._gpio = gpio
+        self.sda = sda
+        self.scl = scl
+        self.frequency = frequency
+        self.timeout = timeout
+        self._half = 0.5 / frequency if frequency else 0
+        self._started = False
+
+        sda_num = gpio._num[sda]
+        scl_num = gpio._num[scl]
+        self._con = gpio._gpio_mem_addr(sda, board.GPIO_CON_OFFSET) >> 2
+        self._data = gpio._gpio_mem_addr(sda, board.GPIO_DATA_OFFSET) >> 2
+        self._keep = ~((3 << (sda_num * 2)) | (3 << (scl_num * 2))) & 0xffffffff
+        self._sda_bit = 1 << sda_num
+        self._scl_bit = 1 << scl_num
+        self._latch = ~(self._sda_bit | self._scl_bit) & 0xffffffff
+
+        # GPIO_CON bits per bus state, index is sda released << 1 | scl released.
+        self._states = [((board.FUNC_IN if s & 2 else board.FUNC_OUT) << (sda_num * 2)) |
+                        ((board.FUNC_IN if s & 1 else board.FUNC_OUT) << (scl_num * 2))
+                        for s in range(4)]
+
+        # States per byte value sent, three per bit: set SDA with SCL
+        # low, release SCL, pull SCL low.
+        self._bytes = []
+
+        for byte in range(256):
+            states = []
+
+            for n in range(7, -1, -1):
+                bit = ((byte >> n) & 1) << 1
+                states.extend([bit, bit | 1, bit])
+
+            self._bytes.append(states)
+
+        for pin in (sda, scl):
+            gpio.gpio_direction(pin, 'in')
+
+            if pullup:
+                gpio.gpio_updown(pin, 'up')
+
+        regs = gpio._regs
+
+        with self._bus_lock(regs):
+            self._clear_latch(regs.words)
+
+    def start(self):
+        """ Send a start condition, a repeated start if already started."""
+
+        regs = self._gpio._regs
+        w = regs.words
+        con = self._con
+        s = self._states
+
+        with self._bus_lock(regs):
+            self._clear_latch(w)
+            base = w[con] & self._keep
+            target = _clock()
+
+            if self._started:
+                w[con] = base | s[2]
+                target = self._wait(target)
+                w[con] = base | s[3]
+                target = self._stretch(w, target)
+
+            w[con] = base | s[1]
+            target = self._wait(target)
+            w[con] = base | s[0]
+            self._wait(target)
+
+        self._started = True
+
+    def stop(self):
+        """ Send a stop condition."""
+
+        regs = self._gpio._regs
+        w = regs.words
+        con = self._con
+        s = self._states
+
+        with self._bus_lock(regs):
+            self._clear_latch(w)
+            base = w[con] & self._keep
+            target = _clock()
+            w[con] = base | s[0]
+            target = self._wait(target)
+            w[con] = base | s[1]
+            target = self._stretch(w, target)
+            w[con] = base | s[3]
+            self._wait(target)
+
+        self._started = False
+
+    def write_bytes(self, data):
+        """ Clock out bytes after start(), stopping at the first NACK.
+
+        Arguments:
+            data:Bytes      bytes, bytearray or other byte buffer.
+
+        Returns:Int     Bytes acknowledged.
+        """
+
+        regs = self._gpio._regs
+        w = regs.words
+        con = self._con
+        di = self._data
+        keep = self._keep
+        sda_bit = self._sda_bit
+        scl_bit = self._scl_bit
+        s = self._states
+        tables = self._bytes
+        half = self._half
+        lock = self._bus_lock(regs)
+        clear = self._clear_latch
+        target = _clock()
+
+        for k in range(len(data)):
+            seq = tables[data[k]]
+            lock.acquire()
+
+            try:
+                clear(w)
+                base = w[con] & keep
+
+                for j in range(0, 24, 3):
+                    w[con] = base | s[seq[j]]
+
+                    if half:
+                        target = self._wait(target)
+
+                    w[con] = base | s[seq[j + 1]]
+
+                    if half or not w[di] & scl_bit:
+                        target = self._stretch(w, target)
+
+                    w[con] = base | s[seq[j + 2]]
+
+                # ACK clock, SDA released for the slave.
+                w[con] = base | s[2]
+
+                if half:
+                    target = self._wait(target)
+
+                w[con] = base | s[3]
+
+                if half or not w[di] & scl_bit:
+                    target = self._stretch(w, target)
+
+                nack = w[di] & sda_bit
+                w[con] = base | s[2]
+            finally:
+                lock.release()
+
+            if nack:
+                return k
+
+        return len(data)
+
+    def read_bytes(self, out, count=None, last_nack=True):
+        """ Clock in bytes after start(), acknowledging each.
+
+        Arguments:
+            out:Buffer      Writable buffer for the bytes read.
+            count:Int       Bytes to read, len(out) if None.
+            last_nack:Bool  NACK the last byte, ending the read.
+
+        Returns:Buffer  out.
+        """
+
+        if count is None:
+            count = len(out)
+
+        regs = self._gpio._regs
+        w = regs.words
+        con = self._con
+        di = self._data
+        keep = self._keep
+        sda_bit = self._sda_bit
+        scl_bit = self._scl_bit
+        s = self._states
+        half = self._half
+        lock = self._bus_lock(regs)
+        clear = self._clear_latch
+        target = _clock()
+
+        for k in range(count):
+            # SDA state of the ACK clock, a NACK leaves it released.
+            ack = 2 if last_nack and k == count - 1 else 0
+            r = 0
+            lock.acquire()
+
+            try:
+                clear(w)
+                base = w[con] & keep
+                w[con] = base | s[2]
+
+                for n in range(8):
+                    if half:
+                        target = self._wait(target)
+
+                    w[con] = base | s[3]
+
+                    if half or not w[di] & scl_bit:
+                        target = self._stretch(w, target)
+
+                    r = (r << 1) | (1 if w[di] & sda_bit else 0)
+                    w[con] = base | s[2]
+
+                w[con] = base | s[ack]
+
+                if half:
+                    target = self._wait(target)
+
+                w[con] = base | s[ack | 1]
+
+                if half or not w[di] & scl_bit:
+                    target = self._stretch(w, target)
+
+                w[con] = base | s[ack]
+                w[con] = base | s[2]
+            finally:
+                lock.release()
+
+            out[k] = r
+
+        return out
+
+    def write(self, address, data, stop=True):
+        """ Write bytes to a slave.
+
+        Arguments:
+            address:Int     7 bit slave address.
+            data:Bytes      bytes, bytearray or other byte buffer.
+            stop:Bool       End with a stop, False to follow with a
+                            repeated start.
+        """
+
+        data = byte_view(data)
+        self._address(address, 0)
+        sent = self.write_bytes(data)
+
+        if sent < len(data):
+            self.stop()
+            self._gpio._exception('I2C address 0x%02x NACK after %s bytes.' % (address, sent))
+
+        if stop:
+            self.stop()
+
+    def read(self, address, count=None, out=None, stop=True):
+        """ Read bytes from a slave.
+
+        Arguments:
+            address:Int     7 bit slave address.
+            count:Int       Bytes to read, len(out) if None.
+            out:Buffer      Writable buffer, allocated if None.
+            stop:Bool       End with a stop.
+
+        Returns:Buffer  out.
+        """
+
+        if out is None:
+            if count is None:
+                self._gpio._value_error('I2C read needs count or out.')
+
+            out = bytearray(count)
+        elif count is not None and len(out) < count:
+            self._gpio._value_error('I2C out buffer smaller than count.')
+
+        self._address(address, 1)
+
+        try:
+            self.read_bytes(out, count)
+        finally:
+            if stop:
+                self.stop()
+
+        return out
+
+    def write_read(self, address, data, count=None, out=None):
+        """ Write then read with a repeated start, ie a register read.
+
+        Arguments:
+            address:Int     7 bit slave address.
+            data:Bytes      Bytes written first, ie the register address.
+            count:Int       Bytes to read, len(out) if None.
+            out:Buffer      Writable buffer, allocated if None.
+
+        Returns:Buffer  out.
+        """
+
+        self.write(address, data, stop=False)
+        return self.read(address, count, out)
+
+    def scan(self, first=0x08, last=0x77):
+        """ Find slaves acknowledging their address.
+
+        Arguments:
+            first:Int       Lowest address tried.
+            last:Int        Highest address tried.
+
+        Returns:List    Addresses that acknowledged.
+        """
+
+        found = []
+
+        for address in range(first, last + 1):
+            self.start()
+
+            if self.write_bytes(bytearray([address << 1])):
+                found.append(address)
+
+            self.stop()
+
+        return found
+
+    def reset(self):
+        """ Free a bus held by a slave stuck mid byte.
+
+        Clocks SCL until the slave releases SDA, up to 9 times, then
+        sends a stop.
+        """
+
+        regs = self._gpio._regs
+        w = regs.words
+        con = self._con
+        s = self._states
+
+        for n in range(9):
+            if w[self._data] & self._sda_bit:
+                break
+
+            with self._bus_lock(regs):
+                self._clear_latch(w)
+                base = w[con] & self._keep
+                target = self._wait(_clock())
+                w[con] = base | s[2]
+                target = self._wait(target)
+                w[con] = base | s[3]
+                self._stretch(w, target)
+
+        self._started = True
+        self.stop()
+
+    def _address(self, address, read):
+        if not isinstance(address, int) or not 0 <= address <= 0x7f:
+            self._gpio._value_error('I2C address must be 0-127: %s' % address)
+
+        self.start()
+
+        if not self.write_bytes(bytearray([(address << 1) | read])):
+            self.stop()
+            self._gpio._exception('I2C address 0x%02x NACK.' % address)
+
+    def _bus_lock(self, regs):
+        # Locks of GPIO_CON and GPIO_DATA taken as one. With Ownership both
+        # are the one bank lock, which is not reentrant.
+        con = regs.lock(self._con << 2)
+        data = regs.lock(self._data << 2)
+        return con if data is con else _Locks((con, data))
+
+    def _clear_latch(self, w):
+        # Caller holds _bus_lock().
+        w[self._data] &= self._latch
+
+    def _wait(self, target):
+        # Hold the bus state for half a clock period.
+        if not self._half:
+            return target
+
+        target += self._half
+        now = _clock()
+
+        while now < target:
+            now = _clock()
+
+        return now
+
+    def _stretch(self, w, target):
+        # Half period with SCL released, then wait for the slave to let
+        # it go high.
+        target = self._wait(target)
+
+        if w[self._data] & self._scl_bit:
+            return target
+
+        deadline = _clock() + self.timeout
+
+        while not w[self._data] & self._scl_bit:
+            if _clock() > deadline:
+                self._gpio._exception('I2C clock held low by slave for over %ss.' % self.timeout)
+
+        return _clock()
+
+
+class _Locks(object):
+    # Several locks acquired in order, released in reverse.
+    __slots__ = ('_locks',)
+
+    def __init__(self, locks):
+        self._locks = locks
+
+    def acquire(self):
+        for lock in self._locks:
+            lock.acquire()
+
+    def release(self):
+        for lock in reversed(self._locks):
+            lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+        return False
+
+
+class SimI2CDevice(object):
+    """ Register file I2C slave on a SimBackend, to test I2C off target.
+
+        Follows the SDA and SCL levels through SimBackend.watch() and
+        answers like a small EEPROM: the first byte written after the
+        address sets the register pointer, further bytes are stored from
+        it, reads return bytes from it, the pointer advancing and
+        wrapping. memory holds the registers.
+
+        Example:
+            sim = SimBackend(board)
+            gpio = GPIO(board, backend=sim)
+            dev = SimI2CDevice(sim, 0x50)
+            gpio.gpio_init_many([27, 28], 'in')
+            i2c = I2C(gpio)
+            i2c.write(0x50, b'\\x10abc')
+            dev.memory[0x10:0x13]   # bytearray(b'abc')
+    """
+
+    def __init__(self, sim, address, sda=27, scl=28, size=256, stretch=0):
+        """ Initialize SimI2CDevice
+
+        Arguments:
+            sim:SimBackend  Simulated registers the master runs on.
+            address:Int     7 bit address to answer.
+            sda:Int         Data pin.
+            scl:Int         Clock pin.
+            size:Int        Register count.
+            stretch:Float   Seconds to hold SCL low after each ACK, 0
+                            does not stretch.
+        """
+
+        self._sim = sim
+        self.address = address
+        self.sda = sda
+        self.scl = scl
+        self.stretch = stretch
+        self.memory = bytearray(size)
+        self.pointer = 0
+        self.starts = 0
+        self.stops = 0
+        self._state = None
+        self._bits = 0
+        self._byte = 0
+        self._first = False
+        self._nack = False
+        self._prev = (sim.level(scl), sim.level(sda))
+        sim.watch(self._bus)
+
+    def close(self):
+        """ Detach from the bus."""
+
+        self._sim.unwatch(self._bus)
+        self._sim.drive(self.sda, None)
+
+    def _bus(self):
+        sim = self._sim
+        scl = sim.level(self.scl)
+        sda = sim.level(self.sda)
+        pscl, psda = self._prev
+
+        if (scl, sda) == self._prev:
+            return
+
+        if scl and pscl:
+            if psda and not sda:
+                self.starts += 1
+                self._state = 'address'
+                self._bits = 0
+                self._byte = 0
+            elif sda and not psda:
+                self.stops += 1
+                self._state = None
+                sim.drive(self.sda, None)
+        elif self._state is not None and scl and not pscl:
+            self._rise(sda)
+        elif self._state is not None and pscl and not scl:
+            self._fall()
+
+        self._prev = (sim.level(self.scl), sim.level(self.sda))
+
+    def _rise(self, sda):
+        if self._state == 'read':
+            if self._bits == 9:
+                self._nack = bool(sda)
+        elif self._bits < 8:
+            self._byte = (self._byte << 1) | sda
+            self._bits += 1
+
+    def _fall(self):
+        sim = self._sim
+
+        if self._state == 'read':
+            if self._bits < 8:
+                self._send_bit()
+            elif self._bits == 8:
+                # Master's ACK clock.
+                sim.drive(self.sda, None)
+                self._bits = 9
+            elif self._nack:
+                self._state = None
+            else:
+                self._load()
+        elif self._bits == 8:
+            if self._state == 'address':
+                if self._byte >> 1 != self.address:
+                    self._state = None
+                    return
+
+                self._rw = self._byte & 1
+            elif self._first:
+                self.pointer = self._byte % len(self.memory)
+                self._first = False
+            else:
+                self.memory[self.pointer] = self._byte
+                self.pointer = (self.pointer + 1) % len(self.memory)
+
+            sim.drive(self.sda, 0)
+            self._bits = 9
+        elif self._bits == 9:
+            sim.drive(self.sda, None)
+            self._bits = 0
+            self._byte = 0
+
+            if self.stretch:
+                sim.drive(self.scl, 0)
+                sim.schedule([(self.stretch, self.scl, None)])
+
+            if self._state == 'address':
+                if self._rw:
+                    self._state = 'read'
+                    self._load()
+                else:
+                    self._state = 'write'
+                    self._first = True
+
+    def _load(self):
+        self._byte = self.memory[self.pointer]
+        self.pointer = (self.pointer + 1) % len(self.memory)
+        self._bits = 0
+        self._nack = False
+        self._send_bit()
+
+    def _send_bit(self):
+        bit = (self._byte >> (7 - self._bits)) & 1
+        self._sim.drive(self.sda, None if bit else 0)
+        self._bits += 1
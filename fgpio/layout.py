@@ -0,0 +1,523 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" Compiled board layouts.
+
+    A board is defined declaratively in a JSON (or TOML, where tomllib or
+    tomli is importable) file, see boards/nanopi.json:
+
+        registers   Register offsets and field values, ie MEM_OFFSET,
+                    GPIO_CON_OFFSET, FUNC_OUT. Ints or strings like '0x88'.
+        banks       Bank name to byte offset from MEM_OFFSET.
+        windows     Optional, name to [address, length] mapped besides the
+                    main window, see MEM_WINDOWS.
+        pins        Connector pin number to {bank, gpio, eint, pwm, name},
+                    only bank and gpio are required.
+
+    load() validates the definition, then compiles it into a Layout of flat
+    tuples indexed by pin number, which GPIO reads on every access. The
+    compiled tables are cached next to the definition (or under
+    $XDG_CACHE_HOME/fgpio) keyed on its size, mtime and COMPILER, so
+    loading a board is a single unmarshal.
+
+    Board is a Config compatible view of a Layout, with a fresh pins Dict
+    per instance. Old style Config classes are compiled with from_config().
+"""
+
+import os
+import sys
+import marshal
+import tempfile
+
+FORMAT = 1
+
+# Version of the compiled tables, bump when compile_layout() output changes
+# so stale caches are recompiled.
+COMPILER = 1
+
+# Every board defines these, see boards/nanopi.json.
+REQUIRED = ('MEM_OFFSET', 'MEM_LENGTH',
+            'GPIO_CON_OFFSET', 'GPIO_DATA_OFFSET', 'GPIO_UPD_OFFSET',
+            'UPDN_UP', 'UPDN_DOWN', 'UPDN_NONE',
+            'FUNC_IN', 'FUNC_OUT', 'FUNC_EINT', 'FUNC_PWM', 'FUNC_RESET',
+            'DATA_RESET', 'UPDN_RESET',
+            'EINT_CONT_OFFSET', 'EINT_EN_OFFSET', 'EINT_PEND_OFFSET',
+            'EINT_LOW', 'EINT_HIGH', 'EINT_FALL', 'EINT_RISE', 'EINT_BOTH', 'EINT_RESET',
+            'PWMCHIP_ID')
+
+TABLES = ('bank', 'base', 'num', 'eint', 'eint_word', 'eint_shift', 'pwm', 'types', 'label')
+
+_memo = {}
+
+try:
+    _text = basestring
+    _ints = (int, long)
+except NameError:
+    _text = str
+    _ints = (int,)
+
+
+def _error(source, msg):
+    raise ValueError('fgpio: %s: %s' % (source, msg))
+
+
+def _int(source, what, value):
+    if isinstance(value, _ints) and not isinstance(value, bool):
+        return value
+
+    if isinstance(value, _text):
+        try:
+            return int(value, 0)
+        except ValueError:
+            pass
+
+    _error(source, '%s is not an integer: %r' % (what, value))
+
+
+def compile_layout(spec, source='board'):
+    """ Validate a board definition and compile its tables.
+
+    Arguments:
+        spec:Dict       Parsed definition, see module docstring.
+        source:Str      Name used in error messages.
+
+    Returns:Dict    Compiled tables, marshal friendly, for Layout().
+    """
+
+    if not isinstance(spec, dict):
+        _error(source, 'definition is not a table.')
+
+    if spec.get('format', FORMAT) != FORMAT:
+        _error(source, 'unsupported format %r, expected %s.' % (spec.get('format'), FORMAT))
+
+    unknown = set(spec) - set(['format', 'name', 'registers', 'banks', 'windows', 'pins'])
+
+    if unknown:
+        _error(source, 'unknown sections: %s' % ', '.join(sorted(unknown)))
+
+    regs = {}
+
+    for name in spec.get('registers', {}):
+        if not name.isupper():
+            _error(source, 'register names are upper case: %s' % name)
+
+        regs[str(name)] = _int(source, name, spec['registers'][name])
+
+    missing = [name for name in REQUIRED if name not in regs]
+
+    if missing:
+        _error(source, 'missing registers: %s' % ', '.join(missing))
+
+    length = regs['MEM_LENGTH']
+
+    if length <= 0 or length % 4:
+        _error(source, 'MEM_LENGTH 0x%x is not a positive multiple of 4.' % length)
+
+    # Byte ranges of the window in use, to catch overlapping registers.
+    spans = []
+
+    def claim(what, start, size):
+        if start < 0 or start % 4 or start + size > length:
+            _error(source, '%s at 0x%x is not a word within MEM_LENGTH 0x%x.' % (what, start, length))
+
+        for other, s, e in spans:
+            if start < e and s < start + size:
+                _error(source, '%s at 0x%x overlaps %s.' % (what, start, other))
+
+        spans.append((what, start, start + size))
+
+    gpio_offsets = sorted(regs[name] for name in regs
+                          if name.startswith('GPIO_') and name.endswith('_OFFSET'))
+
+    if len(set(gpio_offsets)) != len(gpio_offsets):
+        _error(source, 'GPIO register offsets overlap.')
+
+    banks = {}
+
+    for name in spec.get('banks', {}):
+        base = _int(source, 'bank %s' % name, spec['banks'][name])
+        claim('bank %s' % name, base + gpio_offsets[0], gpio_offsets[-1] - gpio_offsets[0] + 4)
+        banks[str(name)] = base
+
+    if not banks:
+        _error(source, 'no banks.')
+
+    windows = {}
+
+    for name in spec.get('windows', {}):
+        window = spec['windows'][name]
+
+        if not isinstance(window, (list, tuple)) or len(window) != 2:
+            _error(source, 'window %s is not [address, length].' % name)
+
+        address = _int(source, 'window %s address' % name, window[0])
+        size = _int(source, 'window %s length' % name, window[1])
+
+        if size <= 0:
+            _error(source, 'window %s length is not positive.' % name)
+
+        windows[str(name)] = (address, size)
+
+    pins = {}
+    bits = {}
+    eints = {}
+    pwms = {}
+
+    for key in spec.get('pins', {}):
+        cfg = spec['pins'][key]
+        pin = _int(source, 'pin number', key)
+        what = 'pin %s' % pin
+
+        if pin <= 0 or pin in pins:
+            _error(source, '%s is not a unique positive number.' % what)
+
+        if not isinstance(cfg, dict) or 'bank' not in cfg or 'gpio' not in cfg:
+            _error(source, '%s needs a bank and gpio number.' % what)
+
+        unknown = set(cfg) - set(['bank', 'gpio', 'eint', 'pwm', 'name'])
+
+        if unknown:
+            _error(source, '%s unknown keys: %s' % (what, ', '.join(sorted(unknown))))
+
+        bank = str(cfg['bank'])
+
+        if bank not in banks:
+            _error(source, '%s bank %s is not defined.' % (what, bank))
+
+        num = _int(source, '%s gpio' % what, cfg['gpio'])
+
+        # GPIO_CON and GPIO_UPD hold 2 bits per pin.
+        if not 0 <= num < 16:
+            _error(source, '%s gpio %s is not 0 to 15.' % (what, num))
+
+        if (bank, num) in bits:
+            _error(source, '%s gpio %s%s is also pin %s.' % (what, bank, num, bits[(bank, num)]))
+
+        bits[(bank, num)] = pin
+        eint = cfg.get('eint')
+        pwm = cfg.get('pwm')
+
+        if eint is not None:
+            eint = _int(source, '%s eint' % what, eint)
+
+            if not 0 <= eint < 32:
+                _error(source, '%s eint %s is not 0 to 31.' % (what, eint))
+
+            if eint in eints:
+                _error(source, '%s eint %s is also pin %s.' % (what, eint, eints[eint]))
+
+            eints[eint] = pin
+
+        if pwm is not None:
+            pwm = _int(source, '%s pwm' % what, pwm)
+
+            if pwm < 0:
+                _error(source, '%s pwm %s is negative.' % (what, pwm))
+
+            if pwm in pwms:
+                _error(source, '%s pwm %s is also pin %s.' % (what, pwm, pwms[pwm]))
+
+            pwms[pwm] = pin
+
+        pins[pin] = (bank, num, eint, pwm, str(cfg.get('name', '%s%s' % (bank, num))))
+
+    if not pins:
+        _error(source, 'no pins.')
+
+    words = sorted(set(regs['EINT_CONT_OFFSET'] + ((eint * 4) // 32) * 4 for eint in eints))
+
+    for word in words:
+        claim('EINT control 0x%x' % word, word, 4)
+
+    if eints:
+        claim('EINT_EN_OFFSET', regs['EINT_EN_OFFSET'], 4)
+        claim('EINT_PEND_OFFSET', regs['EINT_PEND_OFFSET'], 4)
+
+    size = max(pins) + 1
+    tables = dict((name, [None] * size) for name in TABLES)
+
+    for pin in sorted(pins):
+        bank, num, eint, pwm, label = pins[pin]
+        types = ['gpio']
+        tables['bank'][pin] = bank
+        tables['base'][pin] = banks[bank]
+        tables['num'][pin] = num
+        tables['pwm'][pin] = pwm
+        tables['label'][pin] = label
+
+        if eint is not None:
+            types.append('eint')
+            tables['eint'][pin] = eint
+            tables['eint_word'][pin] = regs['EINT_CONT_OFFSET'] + ((eint * 4) // 32) * 4
+            tables['eint_shift'][pin] = (eint * 4) % 32
+
+        if pwm is not None:
+            types.append('pwm')
+
+        tables['types'][pin] = tuple(types)
+
+    ret = dict((name, tuple(tables[name])) for name in TABLES)
+    ret.update({'format': FORMAT,
+                'name': str(spec.get('name', source)),
+                'registers': regs,
+                'banks': banks,
+                'windows': windows,
+                'pins': tuple(sorted(pins)),
+                'eint_words': tuple(words)})
+    return ret
+
+
+class _FrozenDict(dict):
+    # Read only Dict for the board constants of a Layout.
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('fgpio: Layout is immutable.')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+
+class Layout(object):
+    """ Immutable compiled board layout.
+
+        Per pin tables are tuples indexed by connector pin number, None for
+        numbers that are not pins:
+
+        bank        Bank name.
+        base        Bank byte offset from MEM_OFFSET.
+        num         Bit of the pin in its bank.
+        eint        EINT number, None without.
+        eint_word   Byte offset of its EINT control register.
+        eint_shift  Shift of its trigger field in that register.
+        pwm         PWM channel, None without.
+        types       Functions the pin has, ie ('gpio', 'eint').
+        label       Name from the definition, ie 'EINT4/GPF4'.
+
+        pins is the sorted pin numbers, registers, banks and windows the
+        board constants as read only Dicts, eint_words the EINT control
+        registers in use.
+    """
+
+    __slots__ = TABLES + ('name', 'pins', 'registers', 'banks', 'windows', 'eint_words')
+
+    def __init__(self, data):
+        """ Initialize Layout
+
+        Arguments:
+            data:Dict       From compile_layout().
+        """
+
+        for name in self.__slots__:
+            value = data[name]
+
+            if isinstance(value, dict):
+                value = _FrozenDict(value)
+
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('fgpio: Layout is immutable.')
+
+    def __repr__(self):
+        return 'Layout(%r, %s pins)' % (self.name, len(self.pins))
+
+
+class Board(object):
+    """ Config compatible board from a Layout.
+
+        Register constants are attributes as on the old Config classes,
+        pins and banks fresh Dicts for each Board. GPIO uses layout,
+        changing pins has no effect on it.
+    """
+
+    def __init__(self, layout):
+        """ Initialize Board
+
+        Arguments:
+            layout:Layout|Str   Compiled layout, or a definition to load().
+        """
+
+        if not isinstance(layout, Layout):
+            layout = load(layout)
+
+        self.layout = layout
+
+        for name in layout.registers:
+            setattr(self, name, layout.registers[name])
+
+        if layout.windows:
+            self.MEM_WINDOWS = dict(layout.windows)
+
+        self.banks = dict(layout.banks)
+        self.pins = {}
+
+        for pin in layout.pins:
+            cfg = {'bank': layout.bank[pin], 'gpio': {'num': layout.num[pin]}}
+
+            if layout.eint[pin] is not None:
+                cfg['eint'] = {'num': layout.eint[pin]}
+
+            if layout.pwm[pin] is not None:
+                cfg['pwm'] = {'num': layout.pwm[pin]}
+
+            self.pins[pin] = cfg
+
+
+def parse(path):
+    """ Parse a board definition file, JSON or, by its .toml extension, TOML.
+
+    Arguments:
+        path:Str        Definition file.
+
+    Returns:Dict
+    """
+
+    # Parsers are imported here, a cached layout needs neither.
+    if path.endswith('.toml'):
+        try:
+            import tomllib as toml
+        except ImportError:
+            try:
+                import tomli as toml
+            except ImportError:
+                _error(path, 'TOML definitions need tomllib or tomli.')
+
+        with open(path, 'rb') as f:
+            return toml.load(f)
+
+    import json
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def load(path, cache=True):
+    """ Load a board definition, compiled tables are cached on disk.
+
+    Arguments:
+        path:Str        Definition file, JSON or TOML.
+        cache:Bool      Use and write the on disk cache.
+
+    Returns:Layout
+    """
+
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime)
+    memo = _memo.get(path)
+
+    if memo is not None and memo[0] == key:
+        return memo[1]
+
+    data = _cache_read(path, key) if cache else None
+
+    if data is None:
+        data = compile_layout(parse(path), os.path.basename(path))
+
+        if cache:
+            _cache_write(path, key, data)
+
+    layout = Layout(data)
+    _memo[path] = (key, layout)
+    return layout
+
+
+def from_config(board):
+    """ Compile an old style Config object.
+
+    Arguments:
+        board:Config    Object with register attributes, banks and pins.
+
+    Returns:Layout
+    """
+
+    spec = {'name': board.__class__.__name__,
+            'registers': dict((name, getattr(board, name)) for name in dir(board)
+                              if name.isupper() and isinstance(getattr(board, name), int)),
+            'banks': board.banks,
+            'windows': getattr(board, 'MEM_WINDOWS', {}),
+            'pins': {}}
+
+    for pin in board.pins:
+        cfg = board.pins[pin]
+        spec['pins'][pin] = {'bank': cfg['bank'], 'gpio': cfg['gpio']['num']}
+
+        for ptype in ('eint', 'pwm'):
+            if ptype in cfg:
+                spec['pins'][pin][ptype] = cfg[ptype]['num']
+
+    return Layout(compile_layout(spec, spec['name']))
+
+
+def _cache_paths(path):
+    # marshal's format changes between Python versions.
+    tag = getattr(getattr(sys, 'implementation', None), 'cache_tag', None) or 'py%s%s' % sys.version_info[:2]
+    home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    # Outside the definition's directory the cache is named by its full path.
+    return [os.path.join(os.path.dirname(path), '__pycache__', '%s.%s.layout' % (os.path.basename(path), tag)),
+            os.path.join(home, 'fgpio', '%s.%s.layout' % (path.replace(os.sep, '%'), tag))]
+
+
+def _cache_read(path, key):
+    for cache in _cache_paths(path):
+        try:
+            # marshal.load() on a file reads it in small pieces.
+            with open(cache, 'rb') as f:
+                data = marshal.loads(f.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            continue
+
+        if (isinstance(data, dict) and data.get('key') == key and data.get('format') == FORMAT and
+                data.get('compiler') == COMPILER):
+            return data['layout']
+
+    return None
+
+
+def _cache_write(path, key, data):
+    blob = marshal.dumps({'format': FORMAT, 'compiler': COMPILER, 'key': key, 'layout': data})
+
+    for cache in _cache_paths(path):
+        tmp = None
+
+        try:
+            directory = os.path.dirname(cache)
+
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            f, tmp = tempfile.mkstemp(prefix='.layout-', dir=directory)
+
+            try:
+                os.write(f, blob)
+            finally:
+                os.close(f)
+
+            # Readers see the old or the new cache, never half of one.
+            os.rename(tmp, cache)
+            return
+        except (IOError, OSError):
+            if tmp is not None and os.path.exists(tmp):
+                os.unlink(tmp)
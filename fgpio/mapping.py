@@ -0,0 +1,217 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import os
+import mmap
+import threading
+from timeit import default_timer as _clock
+
+from .registers import Registers, CLOSED
+
+
+class MappedRegisters(Registers):
+    """ A user's reference to a mapping shared through a MappingManager.
+
+        Same words and register locks as every other reference to the
+        mapping. close() drops this reference only, the mapping goes
+        once the last one is closed and the linger time has passed.
+
+        Windows named in the board's MEM_WINDOWS are in windows, mapped
+        along with the main window.
+    """
+
+    def __init__(self, manager, key, regs):
+        self._manager = manager
+        self._key = key
+        self._buf = None
+        self._view = None
+        self._locks = regs._locks
+        self.words = regs.words
+        self.windows = {}
+
+    def close(self):
+        """ Drop this reference to the mapping, and its windows."""
+
+        if self.words is CLOSED:
+            return
+
+        self.words = CLOSED
+
+        for window in self.windows.values():
+            window.close()
+
+        self._manager.release(self._key)
+
+
+class MappingManager(object):
+    """ Process wide register mappings, shared and reference counted.
+
+        Mappings are keyed by (device, base, length), so GPIO objects on
+        the same registers share one mapping, and with it the register
+        locks. The device is closed as soon as it's mapped, on Python 3.13
+        and later no descriptor is left open for the mapping. Older
+        versions of mmap keep a duplicate of it until the mapping goes,
+        one per shared mapping rather than per GPIO object. When the last
+        reference is closed the mapping stays for linger seconds, so code
+        closing and opening pins in a loop doesn't pay an open, mmap and
+        munmap each time.
+    """
+
+    def __init__(self, linger=0):
+        """ Initialize MappingManager
+
+        Arguments:
+            linger:Float    Seconds to keep unreferenced mappings, 0 unmaps
+                            at once.
+        """
+
+        self.linger = linger
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._reaper = None
+        self.opens = 0
+        self.reuses = 0
+
+    def open(self, path, base, length, flags=os.O_RDWR | os.O_SYNC):
+        """ Reference a mapping, mapping it if needed.
+
+        Arguments:
+            path:Str        Device or file to map.
+            base:Int        Byte offset of the window in path, need not
+                            be page aligned.
+            length:Int      Bytes in the window.
+            flags:Int       os.open flags of path.
+
+        Returns:MappedRegisters
+        """
+
+        key = (os.path.realpath(path), base, length)
+
+        with self._lock:
+            m = self._maps.get(key)
+
+            if m is None:
+                m = self._maps[key] = [self._map(path, base, length, flags), 0, None]
+                self.opens += 1
+            elif m[1] == 0:
+                self.reuses += 1
+
+            m[1] += 1
+            m[2] = None
+            return MappedRegisters(self, key, m[0])
+
+    def release(self, key):
+        """ Drop a reference, from MappedRegisters.close().
+
+        Arguments:
+            key:Tuple       (device, base, length) of the mapping.
+        """
+
+        with self._lock:
+            m = self._maps.get(key)
+
+            if m is None:
+                return
+
+            m[1] -= 1
+
+            if m[1] > 0:
+                return
+
+            if not self.linger:
+                del self._maps[key]
+                m[0].close()
+                return
+
+            m[2] = _clock() + self.linger
+
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap, name='fgpio-mapping')
+                self._reaper.daemon = True
+                self._reaper.start()
+            else:
+                self._cond.notify()
+
+    def flush(self):
+        """ Unmap every unreferenced mapping now, ignoring linger."""
+
+        with self._lock:
+            for key in list(self._maps):
+                if self._maps[key][1] == 0:
+                    self._maps.pop(key)[0].close()
+
+    def mappings(self):
+        """ Current mappings.
+
+        Returns:Dict    (device, base, length) to reference count.
+        """
+
+        with self._lock:
+            return dict((key, self._maps[key][1]) for key in self._maps)
+
+    def _map(self, path, base, length, flags):
+        start = base & ~(mmap.PAGESIZE - 1)
+        offset = base - start
+        f = os.open(path, flags)
+
+        try:
+            try:
+                # The mapping holds its own reference, the fd isn't needed.
+                mm = mmap.mmap(f, length + offset, mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE, offset=start, trackfd=False)
+            except TypeError:
+                # Before Python 3.13 mmap keeps a dup of the fd until closed.
+                mm = mmap.mmap(f, length + offset, mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE, offset=start)
+        finally:
+            os.close(f)
+
+        return Registers(mm, offset)
+
+    def _reap(self):
+        with self._lock:
+            while True:
+                now = _clock()
+                due = [m[2] for m in self._maps.values() if m[2] is not None]
+
+                if not due:
+                    self._reaper = None
+                    return
+
+                for key in list(self._maps):
+                    m = self._maps[key]
+
+                    if m[2] is not None and m[2] <= now:
+                        del self._maps[key]
+                        m[0].close()
+
+                later = [m[2] - now for m in self._maps.values() if m[2] is not None and m[2] > now]
+
+                if later:
+                    self._cond.wait(min(later))
+
+
+manager = MappingManager()
@@ -0,0 +1,368 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import os
+import sys
+import errno
+import fcntl
+import threading
+from timeit import default_timer as _clock
+
+
+class _BankLock(object):
+    """ Lock of one bank's registers, between threads and processes."""
+
+    __slots__ = ('name', '_lock', '_fd', 'count', 'hold', 'hold_max', 'wait', 'wait_max', '_start')
+
+    def __init__(self, name, fd):
+        self.name = name
+        self._lock = threading.Lock()
+        self._fd = fd
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.hold = 0.0
+        self.hold_max = 0.0
+        self.wait = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self):
+        # flock doesn't exclude threads sharing the fd, hold a thread lock too.
+        start = _clock()
+        self._lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._start = _clock()
+        wait = self._start - start
+        self.wait += wait
+
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+        return True
+
+    def release(self):
+        hold = _clock() - self._start
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.count += 1
+        self.hold += hold
+
+        if hold > self.hold_max:
+            self.hold_max = hold
+
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+class Ownership(object):
+    """ Pin ownership and register arbitration between processes.
+
+        Each claimed pin has a file in directory holding the owner's pid,
+        function and program, kept flock()ed while claimed. The kernel
+        drops the lock when the owner exits or crashes, so an unlocked
+        pin file is stale and can be taken over. Two GPIO objects, in the
+        same or different processes, can't claim the same pin.
+
+        Register read-modify-writes take a per bank lock, a thread lock
+        plus flock() on the bank's lock file, held only across the single
+        register update. Registers outside the GPIO banks share one lock.
+        Lock hold and wait times are kept per bank, see stats().
+
+        Example:
+            board = nanopi.Config()
+            own = Ownership(board)
+            gpio = GPIO(board, ownership=own)
+    """
+
+    def __init__(self, board, directory='/run/fgpio'):
+        """ Initialize Ownership
+
+        Arguments:
+            board:Config        board config from boards/
+            directory:Str       Directory for pin and lock files, shared by
+                                all processes using the board.
+        """
+
+        self.board = board
+        self.directory = directory
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        self._claims = {}
+        self._banks = {}
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+        bank_offsets = [getattr(board, name) for name in dir(board)
+                        if name.startswith('GPIO_') and name.endswith('_OFFSET')]
+
+        for bank in board.banks:
+            for offset in bank_offsets:
+                self._banks[(board.banks[bank] + offset) >> 2] = bank
+
+    def claim(self, pin, function):
+        """ Claim pin for this object.
+
+        Claiming a pin already held updates its function.
+
+        Arguments:
+            pin:Int             Pin number of board connector.
+            function:Str        'gpio', 'eint' or 'pwm'.
+        """
+
+        with self._mutex:
+            fd = self._claims.get(pin)
+
+            if fd is None:
+                fd = self._pin_lock(pin)
+                self._claims[pin] = fd
+
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, ('%d %s %s\n' % (os.getpid(), function, _program())).encode('utf-8'))
+
+    def release(self, pin):
+        """ Release a claimed pin, a no-op if not claimed.
+
+        Arguments:
+            pin:Int             Pin number of board connector.
+        """
+
+        with self._mutex:
+            fd = self._claims.pop(pin, None)
+
+            if fd is None:
+                return
+
+            # Unlink while locked, so nobody locks a file about to go.
+            try:
+                os.unlink(self._pin_path(pin))
+            except OSError:
+                pass
+
+            os.close(fd)
+
+    def release_all(self):
+        """ Release all pins claimed by this object."""
+
+        for pin in list(self._claims):
+            self.release(pin)
+
+    def owner(self, pin):
+        """ Current owner of a pin.
+
+        Arguments:
+            pin:Int             Pin number of board connector.
+
+        Returns:Dict    pid, function and program of the owner, None if
+                        free or the owner is gone.
+        """
+
+        try:
+            fd = os.open(self._pin_path(pin), os.O_RDONLY)
+        except OSError:
+            return None
+
+        try:
+            if pin not in self._claims:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    pass
+                else:
+                    # Nobody holds it, stale.
+                    return None
+
+            data = os.read(fd, 4096).decode('utf-8', 'replace')
+        finally:
+            os.close(fd)
+
+        fields = data.split(None, 2)
+
+        if len(fields) < 2:
+            return None
+
+        return {'pid': int(fields[0]),
+                'function': fields[1],
+                'program': fields[2].strip() if len(fields) > 2 else ''}
+
+    def owners(self):
+        """ Owners of all claimed pins of the board.
+
+        Returns:Dict    Pin number to owner(pin) Dict.
+        """
+
+        ret = {}
+
+        for pin in sorted(self.board.pins):
+            owner = self.owner(pin)
+
+            if owner is not None:
+                ret[pin] = owner
+
+        return ret
+
+    def cleanup(self):
+        """ Remove pin files of owners that are gone.
+
+        Returns:List    Pins cleaned up.
+        """
+
+        ret = []
+
+        for pin in sorted(self.board.pins):
+            if pin in self._claims:
+                continue
+
+            path = self._pin_path(pin)
+
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                os.close(fd)
+                continue
+
+            try:
+                # Still the file we locked, not one claimed again since.
+                if os.path.exists(path) and os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    os.unlink(path)
+                    ret.append(pin)
+            finally:
+                os.close(fd)
+
+        return ret
+
+    def lock(self, offset):
+        """ Lock of the bank holding a register.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+
+        Returns:_BankLock   Lock, with acquire()/release() and as a
+                            context manager, holding the bank for one
+                            register update.
+        """
+
+        name = self._banks.get(offset >> 2, 'other')
+        lock = self._locks.get(name)
+
+        if lock is None:
+            with self._mutex:
+                lock = self._locks.get(name)
+
+                if lock is None:
+                    fd = os.open(os.path.join(self.directory, 'lock-%s' % name), os.O_RDWR | os.O_CREAT, 0o644)
+                    lock = self._locks[name] = _BankLock(name, fd)
+
+        return lock
+
+    def stats(self):
+        """ Bank lock statistics.
+
+        Returns:Dict    Bank name to Dict of count, hold_mean, hold_max,
+                        wait_mean and wait_max in seconds.
+        """
+
+        ret = {}
+
+        for name in self._locks:
+            lock = self._locks[name]
+            count = lock.count or 1
+            ret[name] = {'count': lock.count,
+                         'hold_mean': lock.hold / count,
+                         'hold_max': lock.hold_max,
+                         'wait_mean': lock.wait / count,
+                         'wait_max': lock.wait_max}
+
+        return ret
+
+    def stats_reset(self):
+        """ Zero bank lock statistics."""
+
+        for lock in self._locks.values():
+            lock.reset()
+
+    def close(self):
+        """ Release all pins and close lock files."""
+
+        self.release_all()
+
+        for lock in self._locks.values():
+            os.close(lock._fd)
+
+        self._locks = {}
+
+    def _pin_lock(self, pin):
+        path = self._pin_path(pin)
+
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                os.close(fd)
+
+                if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                    raise
+
+                owner = self.owner(pin)
+                raise Exception('fgpio: pin %s owned by pid %s as %s.' % (pin, owner and owner['pid'],
+                                                                       owner and owner['function']))
+
+            # The owner may have released and unlinked it after we opened it.
+            try:
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except OSError:
+                pass
+
+            os.close(fd)
+
+    def _pin_path(self, pin):
+        return os.path.join(self.directory, 'pin-%s' % pin)
+
+
+def _program():
+    try:
+        return os.path.basename(sys.argv[0]) or 'python'
+    except (AttributeError, IndexError):
+        return 'python'
@@ -0,0 +1,336 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import math
+import threading
+from time import sleep
+from timeit import default_timer as _clock
+
+
+def _linear(x):
+    return x
+
+def _exp(x):
+    # Slow start, fast finish, suits brightness and motor fades.
+    return (math.exp(4 * x) - 1) / (math.exp(4) - 1)
+
+_curves = {'linear': _linear, 'exp': _exp}
+
+
+class _Transition(object):
+    __slots__ = ('pin', 'start', 'duration', 'duty', 'period', 'done')
+
+    def __init__(self, pin, start, duration, duty, period):
+        self.pin = pin
+        self.start = start
+        self.duration = duration
+        self.duty = duty
+        self.period = period
+        self.done = threading.Event()
+
+
+class PWMScheduler(object):
+    """ Drives PWM duty/period transitions from one background thread.
+
+        Every tick, values of all active transitions are worked out for
+        the current time and written together, so channels move in step
+        and a late tick skips straight to where the curve should be
+        instead of replaying missed steps. Values come from the PWM value
+        cache, sysfs is never read, and writes are ordered (or duty is
+        clamped) so duty never exceeds period.
+
+        Example:
+            sched = PWMScheduler(gpio, rate=200)
+            sched.start()
+            sched.transition(22, 2.0, duty=900000, curve='exp')
+            sched.transition(26, 2.0, duty=100000)
+            sched.wait()
+    """
+
+    def __init__(self, gpio, rate=200):
+        """ Initialize PWMScheduler
+
+        Arguments:
+            gpio:GPIO       GPIO object, pins initialized with pwm_init.
+            rate:Int        Updates per second.
+        """
+
+        if not rate > 0:
+            gpio._value_error('Rate must be greater than 0.')
+
+        self._gpio = gpio
+        self.rate = rate
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self.stats_reset()
+
+    def transition(self, pin, duration, duty=None, period=None, curve='linear'):
+        """ Move a PWM pin to new values over time.
+
+        Replaces any transition already running on the pin, starting from
+        its current values.
+
+        Arguments:
+            pin:Int             Pin number, initialized with pwm_init.
+            duration:Float      Seconds the transition takes.
+            duty:Int/List       Target duty cycle in ns, or a List of
+                                values spread evenly over duration.
+            period:Int/List     Target period in ns, or a List as for duty.
+            curve:Str           'linear', 'exp', or a callable mapping
+                                0..1 time to 0..1 progress. Not used for
+                                Lists.
+        """
+
+        gpio = self._gpio
+        gpio._pin_check(pin, gpio._type_pwm)
+
+        if not duration >= 0:
+            gpio._value_error('Duration must not be negative.')
+
+        if callable(curve):
+            func = curve
+        elif curve in _curves:
+            func = _curves[curve]
+        else:
+            gpio._value_error('Curve must be linear, exp or callable.')
+
+        cur_period = gpio._pwm_get_period(pin)
+        cur_duty = gpio._pwm_get_duty_cycle(pin)
+        duty = self._values(cur_duty, duty, func)
+        period = self._values(cur_period, period, func)
+
+        end_period = period(1.0) if period else cur_period
+        end_duty = duty(1.0) if duty else cur_duty
+
+        if end_period <= 0:
+            gpio._value_error('PWM period must be greater than 0.')
+
+        if end_duty > end_period:
+            gpio._exception('PWM duty cycle must be less than period.')
+
+        t = _Transition(pin, _clock(), float(duration), duty, period)
+
+        with self._lock:
+            old = self._active.get(pin)
+            self._active[pin] = t
+
+        if old is not None:
+            old.done.set()
+
+        self._wake.set()
+
+    def cancel(self, pin):
+        """ Stop the transition of a pin where it is.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+        """
+
+        with self._lock:
+            t = self._active.pop(pin, None)
+
+        if t is not None:
+            t.done.set()
+
+    def wait(self, pin=None, timeout=None):
+        """ Wait for transitions to finish.
+
+        Arguments:
+            pin:Int         Pin to wait for, None waits for all.
+            timeout:Float   Seconds to wait, None waits forever.
+
+        Returns:Bool    True if finished.
+        """
+
+        with self._lock:
+            if pin is None:
+                ts = list(self._active.values())
+            else:
+                ts = [self._active[pin]] if pin in self._active else []
+
+        end = None if timeout is None else _clock() + timeout
+
+        for t in ts:
+            left = None if end is None else max(0.0, end - _clock())
+
+            if not t.done.wait(left):
+                return False
+
+        return True
+
+    def start(self):
+        """ Start the update thread."""
+
+        if self._running:
+            self._gpio._exception('Scheduler already running.')
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='fgpio-pwm-sched')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the update thread, transitions stop where they are."""
+
+        self._running = False
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        # Release wait() on the transitions left.
+        with self._lock:
+            ts = list(self._active.values())
+            self._active.clear()
+
+        for t in ts:
+            t.done.set()
+
+    def stats(self):
+        """ Scheduler statistics.
+
+        Returns:Dict    ticks, updates (channel writes), dropped (ticks
+                        skipped while behind), errors (transitions ended
+                        by a failed write), rate (achieved ticks/s while
+                        active), max_late (s).
+        """
+
+        return {'ticks': self._ticks,
+                'updates': self._updates,
+                'dropped': self._dropped,
+                'errors': self._errors,
+                'rate': self._ticks / self._busy if self._busy > 0 else 0.0,
+                'max_late': self._max_late}
+
+    def stats_reset(self):
+        """ Reset statistics."""
+
+        self._ticks = 0
+        self._updates = 0
+        self._dropped = 0
+        self._errors = 0
+        self._busy = 0.0
+        self._max_late = 0.0
+
+    def _values(self, current, target, func):
+        if target is None:
+            return None
+
+        if isinstance(target, (list, tuple)) or hasattr(target, 'typecode'):
+            values = [int(v) for v in target]
+
+            if not values:
+                self._gpio._value_error('Value list is empty.')
+
+            last = len(values) - 1
+            return lambda x: values[min(int(x * last + 0.5), last)]
+
+        self._gpio._int_check(target, 'target')
+        return lambda x: int(current + (target - current) * func(x))
+
+    def _run(self):
+        clock = _clock
+        dt = 1.0 / self.rate
+
+        while self._running:
+            if not self._active:
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+
+            begin = clock()
+            target = begin
+
+            while self._running and self._active:
+                now = clock()
+
+                if now < target:
+                    sleep(target - now)
+                    now = clock()
+
+                late = now - target
+
+                if late > self._max_late:
+                    self._max_late = late
+
+                if late >= dt:
+                    skipped = int(late / dt)
+                    self._dropped += skipped
+                    target += skipped * dt
+
+                self._tick(now)
+                self._ticks += 1
+                target += dt
+
+            self._busy += clock() - begin
+
+    def _tick(self, now):
+        with self._lock:
+            active = list(self._active.values())
+
+        for t in active:
+            x = 1.0 if t.duration <= 0 else min(1.0, (now - t.start) / t.duration)
+
+            try:
+                self._update(t.pin, t.duty(x) if t.duty else None, t.period(x) if t.period else None)
+            except Exception:
+                # Give up on a transition the driver rejects.
+                self._errors += 1
+                x = 1.0
+
+            if x >= 1.0:
+                with self._lock:
+                    if self._active.get(t.pin) is t:
+                        del self._active[t.pin]
+
+                t.done.set()
+
+    def _update(self, pin, duty, period):
+        gpio = self._gpio
+        cur_period = gpio._pwm_get_period(pin)
+        cur_duty = gpio._pwm_get_duty_cycle(pin)
+
+        if period is None:
+            period = cur_period
+
+        if duty is None:
+            duty = cur_duty
+
+        duty = min(duty, period)
+
+        # Keep duty <= period at every step between the two writes.
+        if period >= cur_duty:
+            order = [('period', period, cur_period), ('duty_cycle', duty, cur_duty)]
+        else:
+            order = [('duty_cycle', duty, cur_duty), ('period', period, cur_period)]
+
+        for name, value, cur in order:
+            if value != cur:
+                gpio._pwm_sys_write(pin, name, value)
+                self._updates += 1
@@ -0,0 +1,178 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import ctypes
+import threading
+
+
+class _Closed(object):
+    def __getitem__(self, index):
+        raise Exception('fgpio: register window is closed.')
+
+    def __setitem__(self, index, value):
+        raise Exception('fgpio: register window is closed.')
+
+    def __len__(self):
+        return 0
+
+CLOSED = _Closed()
+
+_CAST = hasattr(memoryview, 'cast')
+
+
+def byte_view(data):
+    """ Bytes of a buffer, indexing as ints.
+
+    Arguments:
+        data:Buffer     bytes, bytearray or other byte buffer.
+
+    Returns:Buffer  data itself if it indexes as ints, a 'B' memoryview of
+                    it, or a bytearray copy on Pythons without
+                    memoryview.cast, where str indexes as str.
+    """
+
+    if isinstance(data, bytearray):
+        return data
+
+    if not _CAST:
+        return bytearray(buffer(data))
+
+    if isinstance(data, bytes):
+        return data
+
+    return memoryview(data).cast('B')
+
+
+class Registers(object):
+    """ 32 bit register view over a memory mapping.
+
+        Registers are words of an 'I' memoryview (a ctypes array on
+        Pythons without memoryview.cast) laid over the mapping, so each
+        access is a single aligned 32 bit load or store with no file
+        position to seek and nothing allocated. Without a seek cursor,
+        reads and writes from several threads don't interfere.
+
+        Read-modify-writes take a lock per register word, from lock(), so
+        threads changing different registers (ie GPB and GPG) never
+        contend. Code writing words directly must hold the word's lock
+        around its own read-modify-write.
+
+        Offsets are byte offsets from the start of the board register
+        window (MEM_OFFSET). Hot paths index words directly with the
+        word index, offset >> 2.
+    """
+
+    def __init__(self, buf, offset=0):
+        """ Initialize Registers
+
+        Arguments:
+            buf:mmap        Writable mapping holding the register window.
+            offset:Int      Byte offset of the register window in buf.
+        """
+
+        count = (len(buf) - offset) // 4
+        self._buf = buf
+        self._locks = {}
+
+        try:
+            self._view = memoryview(buf)[offset:offset + count * 4]
+            self.words = self._view.cast('I')
+        except (AttributeError, TypeError):
+            # Python 2, no memoryview.cast and mmap has no new style buffer.
+            self._view = None
+            self.words = (ctypes.c_uint32 * count).from_buffer(buf, offset)
+
+    def read(self, offset):
+        """ Read register.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+
+        Returns:Int     Register value.
+        """
+
+        return self.words[offset >> 2]
+
+    def write(self, offset, value):
+        """ Write register.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+            value:Int       Register value.
+        """
+
+        self.words[offset >> 2] = value
+
+    def modify(self, offset, mask, value):
+        """ Read-modify-write the masked bits of a register.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+            mask:Int        Bits to change.
+            value:Int       New value of the masked bits.
+        """
+
+        w = self.words
+        i = offset >> 2
+
+        with self.lock(offset):
+            w[i] = (w[i] & ~mask) | (value & mask)
+
+    def lock(self, offset):
+        """ Lock serializing read-modify-writes of a register.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+
+        Returns:Lock    The same threading.Lock for every offset in the word.
+        """
+
+        i = offset >> 2
+        lock = self._locks.get(i)
+
+        if lock is None:
+            lock = self._locks.setdefault(i, threading.Lock())
+
+        return lock
+
+    def close(self):
+        """ Release the view and close the mapping.
+
+            Anything still holding words gets an error on access instead
+            of touching unmapped memory.
+        """
+
+        words = self.words
+        self.words = CLOSED
+
+        if self._view is not None:
+            words.release()
+            self._view.release()
+
+        try:
+            self._buf.close()
+        except BufferError:
+            # ctypes fallback, mapping is closed once the last array goes.
+            pass
@@ -0,0 +1,83 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+""" Real-time helpers for timing threads.
+
+    All functions apply to the calling thread and return False instead
+    of raising when the OS or permissions don't allow it.
+"""
+
+import os
+
+
+def set_affinity(cpu):
+    """ Pin the calling thread to a CPU.
+
+    Arguments:
+        cpu:Int         CPU number.
+
+    Returns:Bool    True if set.
+    """
+
+    try:
+        os.sched_setaffinity(0, [cpu])
+    except (AttributeError, OSError, ValueError):
+        return False
+
+    return True
+
+
+def set_realtime(priority=50):
+    """ Run the calling thread with SCHED_FIFO priority.
+
+    Arguments:
+        priority:Int    SCHED_FIFO priority, 1 to 99.
+
+    Returns:Bool    True if set.
+    """
+
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, OSError, ValueError):
+        return False
+
+    return True
+
+
+def lock_memory():
+    """ Lock the process's memory, current and future, into RAM with
+    mlockall, so page faults don't stall timing threads.
+
+    Returns:Bool    True if locked.
+    """
+
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        # MCL_CURRENT | MCL_FUTURE
+        return libc.mlockall(1 | 2) == 0
+    except (AttributeError, OSError):
+        return False
@@ -0,0 +1,321 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import threading
+from array import array
+from timeit import default_timer as _clock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Sampler(object):
+    """ Logic analyzer style capture of bank GPIO_DATA registers.
+
+        A background thread reads the GPIO_DATA register of each bank as
+        fast as it can into preallocated ring buffers, array('I') per
+        bank plus array('d') of clock timestamps in seconds, so no
+        containers are built per sample. Before the trigger the ring keeps
+        the latest size samples of history, after it capture stops once
+        post samples are taken or stop() is called.
+
+        The capture thread publishes count and the ring position only when
+        it ends, so the results are read after stop() or wait().
+
+        Post processing (edges, pulse widths) is vectorized with NumPy
+        when it is installed, plain Python otherwise.
+
+        Example:
+            s = Sampler(gpio, ['GPG'], size=100000)
+            s.start(trigger=(38, 'falling'), post=50000)
+            s.wait()
+            print(s.pulse_widths(38))
+    """
+
+    def __init__(self, gpio, banks, size=65536):
+        """ Initialize Sampler
+
+        Arguments:
+            gpio:GPIO       GPIO object.
+            banks:List      Bank names from board config, ie ['GPG'].
+            size:Int        Samples held in the ring buffer.
+        """
+
+        gpio._int_check(size, 'size')
+
+        if size < 2:
+            gpio._value_error('Sampler size must be at least 2.')
+
+        self._gpio = gpio
+        self.banks = list(banks)
+        self.size = size
+        self._indexes = [gpio._port_addr(bank) >> 2 for bank in self.banks]
+        self._bufs = [array('I', [0]) * size for bank in self.banks]
+        self._times = array('d', [0.0]) * size
+        self._thread = None
+        self._running = False
+        self._reset()
+
+    def start(self, trigger=None, post=None):
+        """ Start capture in a background thread.
+
+        Arguments:
+            trigger:Tuple   (pin, edge) to start on, edge is 'rising',
+                            'falling' or 'both'. None starts at once.
+            post:Int        Samples to take after the trigger, defaults
+                            to size - 1, keeping the trigger sample as
+                            the first of data(). 0 runs until stop().
+        """
+
+        if self._thread is not None and self._thread.is_alive():
+            self._gpio._exception('Sampler already running.')
+
+        if post is None:
+            post = self.size - 1
+
+        self._gpio._int_check(post, 'post')
+        self._trigger = None
+
+        if trigger is not None:
+            pin, edge = trigger
+            b, mask = self._pin_bit(pin)
+
+            if edge == 'rising':
+                want = (mask,)
+            elif edge == 'falling':
+                want = (0,)
+            elif edge == 'both':
+                want = (0, mask)
+            else:
+                self._gpio._value_error('Edge must be rising, falling, or both.')
+
+            self._trigger = (b, mask, want)
+
+        self._reset()
+        self._post = post
+        self._running = True
+        self._thread = threading.Thread(target=self._capture, name='fgpio-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop capture and wait for the thread to end."""
+
+        self._running = False
+        self.wait()
+
+    def wait(self, timeout=None):
+        """ Wait for capture to finish.
+
+        Arguments:
+            timeout:Float   Seconds to wait, None waits forever.
+
+        Returns:Bool    True if capture has finished.
+        """
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+
+        return True
+
+    def triggered(self):
+        """ Check if the trigger fired.
+
+        Returns:Bool
+        """
+
+        return self._trigger_count is not None
+
+    @property
+    def trigger_index(self):
+        """ Index of the trigger sample in data(), None if the trigger
+        did not fire or its sample was overwritten since. 0 when started
+        without a trigger.
+        """
+
+        if self._trigger_count is None:
+            return None
+
+        index = self._trigger_count - max(0, self.count - self.size)
+        return index if index >= 0 else None
+
+    def rate(self):
+        """ Achieved sample rate of the last capture.
+
+        Returns:Float   Samples per second.
+        """
+
+        times, words = self.data()
+
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def data(self):
+        """ Captured samples in time order.
+
+        Empty while a capture runs, call after stop() or wait().
+
+        Returns:Tuple   (times, {bank: words}), times as array('d') of
+                        clock seconds, words as array('I') per bank.
+        """
+
+        n = min(self.count, self.size)
+        start = self._pos if self.count > self.size else 0
+        order = lambda a: a[start:n] + a[:start] if start else a[:n]
+        return order(self._times), dict((bank, order(self._bufs[b])) for b, bank in enumerate(self.banks))
+
+    def edges(self, pin):
+        """ Edges of a pin in the capture.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+
+        Returns:List    (time, level) per edge, level is 1 for a rising
+                        edge, 0 for falling.
+        """
+
+        b, mask = self._pin_bit(pin)
+        times, words = self.data()
+        words = words[self.banks[b]]
+        shift = mask.bit_length() - 1
+
+        if numpy is not None:
+            levels = (numpy.frombuffer(words, dtype=numpy.uint32) >> shift) & 1
+            idx = numpy.flatnonzero(levels[1:] != levels[:-1]) + 1
+            t = numpy.frombuffer(times, dtype=numpy.float64)
+            return list(zip(t[idx].tolist(), levels[idx].tolist()))
+
+        ret = []
+        last = None
+
+        for k in range(len(words)):
+            level = (words[k] >> shift) & 1
+
+            if last is not None and level != last:
+                ret.append((times[k], level))
+
+            last = level
+
+        return ret
+
+    def pulse_widths(self, pin):
+        """ Widths of complete pulses of a pin in the capture.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+
+        Returns:List    (level, width) per pulse between two edges,
+                        width in seconds.
+        """
+
+        edges = self.edges(pin)
+
+        if numpy is not None and len(edges) > 1:
+            e = numpy.array(edges)
+            return list(zip(e[:-1, 1].astype(int).tolist(), numpy.diff(e[:, 0]).tolist()))
+
+        return [(edges[k][1], edges[k + 1][0] - edges[k][0]) for k in range(len(edges) - 1)]
+
+    def _pin_bit(self, pin):
+        if pin not in self._gpio._used:
+            self._gpio._value_error('Not a valid pin number: %s' % pin)
+
+        bank = self._gpio.layout.bank[pin]
+
+        if bank not in self.banks:
+            self._gpio._value_error('Pin %s bank %s is not sampled.' % (pin, bank))
+
+        return self.banks.index(bank), 1 << self._gpio._num[pin]
+
+    def _reset(self):
+        self.count = 0
+        # Samples taken before the trigger sample.
+        self._trigger_count = None
+        self.trigger_time = None
+        self._pos = 0
+
+    def _capture(self):
+        w = self._gpio._regs.words
+        banks = list(zip(self._indexes, self._bufs))
+        times = self._times
+        size = self.size
+        clock = _clock
+        pos = 0
+        count = 0
+
+        try:
+            if self._trigger is not None:
+                b, mask, want = self._trigger
+                tbuf = self._bufs[b]
+                last = w[self._indexes[b]] & mask
+
+                while self._running:
+                    for i, buf in banks:
+                        buf[pos] = w[i]
+
+                    times[pos] = clock()
+                    level = tbuf[pos] & mask
+                    pos += 1
+                    count += 1
+
+                    if pos == size:
+                        pos = 0
+
+                    if level != last and level in want:
+                        self._trigger_count = count - 1
+                        self.trigger_time = times[pos - 1]
+                        break
+
+                    last = level
+            else:
+                self._trigger_count = 0
+
+            remaining = self._post
+
+            while self._running:
+                for i, buf in banks:
+                    buf[pos] = w[i]
+
+                times[pos] = clock()
+                pos += 1
+                count += 1
+
+                if pos == size:
+                    pos = 0
+
+                if remaining:
+                    remaining -= 1
+
+                    if not remaining:
+                        break
+        finally:
+            self._pos = pos
+            self.count = count
+            self._running = False
@@ -0,0 +1,339 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import heapq
+import threading
+from array import array
+from timeit import default_timer as _clock
+
+try:
+    from time import monotonic_ns as _now
+except ImportError:
+    def _now():
+        return int(_clock() * 1000000000)
+
+from . import rt
+
+
+class OutputScheduler(object):
+    """ Writes queued output changes at their deadlines from one thread.
+
+        Actions are (deadline, pin or bank mask, value), deadline in
+        nanoseconds on the now() clock (time.monotonic_ns). They are kept
+        in a heap and played by one thread, which sleeps until spin
+        seconds before the next deadline, then spins on the clock. Actions
+        with the same deadline on the same bank go out as one GPIO_DATA
+        write, in the order they were queued. Queueing an earlier
+        deadline wakes the thread.
+
+        Lateness of each action, from its deadline to the clock read just
+        before its write, is kept for the last history actions and
+        summarized by stats().
+
+        start(realtime=True) asks for SCHED_FIFO and locks memory with
+        mlockall, with cpu it pins the thread to a CPU. Each is applied
+        only where permitted, stats() tells which were.
+
+        Example:
+            gpio.gpio_init(40, 'out')
+            sched = OutputScheduler(gpio)
+            sched.start(cpu=0, realtime=True)
+            t = sched.now() + 1000000
+            for n in range(10):
+                sched.schedule(t + n * 500000, 40, n & 1 ^ 1)
+            sched.wait()
+            print(sched.stats()['late'])
+    """
+
+    def __init__(self, gpio, spin=0.0005, history=4096):
+        """ Initialize OutputScheduler
+
+        Arguments:
+            gpio:GPIO       GPIO object, pins initialized as outputs.
+            spin:Float      Seconds before a deadline to stop sleeping
+                            and spin.
+            history:Int     Actions to keep lateness of.
+        """
+
+        gpio._int_check(history, 'history')
+
+        if history < 1:
+            gpio._value_error('History must be at least 1.')
+
+        self._gpio = gpio
+        self.spin = spin
+        self.history = history
+        self._heap = []
+        self._seq = 0
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        self._idle = threading.Condition(lock)
+        self._thread = None
+        self._running = False
+        self._late = array('d', [0.0]) * history
+        self.stats_reset()
+
+    def now(self):
+        """ Current time on the deadline clock.
+
+        Returns:Int     Nanoseconds.
+        """
+
+        return _now()
+
+    def schedule(self, deadline, pin, value):
+        """ Set an output pin at a deadline.
+
+        Arguments:
+            deadline:Int    now() nanoseconds to write at.
+            pin:Int         Pin number, initialized with gpio_init as out.
+            value:Int       1 or 0.
+        """
+
+        gpio = self._gpio
+        gpio._pin_check(pin, gpio._type_gpio)
+        bit = 1 << gpio._num[pin]
+        index = gpio._gpio_mem_addr(pin, gpio.board.GPIO_DATA_OFFSET) >> 2
+        self._push(deadline, index, bit, bit if value else 0)
+
+    def schedule_bank(self, deadline, bank, mask, value):
+        """ Set the masked bits of a bank's GPIO_DATA at a deadline.
+
+        As port_write, bits are not checked against initialized pins.
+
+        Arguments:
+            deadline:Int    now() nanoseconds to write at.
+            bank:Str        Bank name from board config, ie 'GPG'.
+            mask:Int        Bits to change, bit N is GPxN.
+            value:Int       New value of the masked bits.
+        """
+
+        gpio = self._gpio
+        gpio._int_check(mask, 'mask')
+        gpio._int_check(value, 'value')
+        self._push(deadline, gpio._port_addr(bank) >> 2, mask & 0xffffffff, value & mask & 0xffffffff)
+
+    def cancel(self):
+        """ Drop all queued actions.
+
+        Returns:Int     Actions dropped.
+        """
+
+        with self._cond:
+            count = len(self._heap)
+            self._heap = []
+            self._idle.notify_all()
+
+        return count
+
+    def pending(self):
+        """ Actions queued and not written yet.
+
+        Returns:Int
+        """
+
+        return len(self._heap)
+
+    def wait(self, timeout=None):
+        """ Block until all queued actions are written, or the scheduler
+        stops.
+
+        Arguments:
+            timeout:Float   Seconds to wait at most, None waits on.
+
+        Returns:Bool    True if the queue emptied.
+        """
+
+        end = _clock() + timeout if timeout is not None else None
+
+        with self._cond:
+            while self._heap and self._running:
+                remaining = end - _clock() if end is not None else None
+
+                if remaining is not None and remaining <= 0:
+                    break
+
+                self._idle.wait(remaining)
+
+            return not self._heap
+
+    def start(self, cpu=None, realtime=False, priority=50):
+        """ Start the scheduler thread.
+
+        Arguments:
+            cpu:Int         Pin the thread to this CPU, None leaves it.
+            realtime:Bool   Ask for SCHED_FIFO scheduling and lock memory.
+            priority:Int    SCHED_FIFO priority, 1 to 99.
+        """
+
+        if self._running:
+            self._gpio._exception('Output scheduler already running.')
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(cpu, realtime, priority),
+                                        name='fgpio-scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the scheduler thread, queued actions stay queued."""
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            self._idle.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """ Timing statistics.
+
+        Returns:Dict    actions, writes (after merging), late with
+                        count, mean, min, p50, p90, p99, p999 and max in
+                        seconds over the last history actions, cpu,
+                        realtime and memory_locked (whether they were
+                        applied).
+        """
+
+        count = min(self._actions, self.history)
+        late = sorted(self._late[:count])
+        summary = {'count': count}
+
+        if count:
+            summary['mean'] = sum(late) / count
+            summary['min'] = late[0]
+            summary['max'] = late[-1]
+
+            for name, q in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999)]:
+                summary[name] = late[min(int(q * count), count - 1)]
+
+        return {'actions': self._actions,
+                'writes': self._writes,
+                'late': summary,
+                'cpu': self._cpu,
+                'realtime': self._realtime,
+                'memory_locked': self._memory_locked}
+
+    def stats_reset(self):
+        """ Reset statistics."""
+
+        self._actions = 0
+        self._writes = 0
+        self._cpu = False
+        self._realtime = False
+        self._memory_locked = False
+
+    def _push(self, deadline, index, mask, value):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, index, mask, value))
+
+            if self._heap[0][1] == self._seq:
+                self._cond.notify()
+
+    def _run(self, cpu, realtime, priority):
+        try:
+            self._loop(cpu, realtime, priority)
+        finally:
+            # Release wait(), also when the loop ended on an error.
+            with self._cond:
+                self._running = False
+                self._idle.notify_all()
+
+    def _loop(self, cpu, realtime, priority):
+        if cpu is not None:
+            self._cpu = rt.set_affinity(cpu)
+
+        if realtime:
+            self._realtime = rt.set_realtime(priority)
+            self._memory_locked = rt.lock_memory()
+
+        regs = self._gpio._regs
+        w = regs.words
+        heap = self._heap
+        cond = self._cond
+        spin = int(self.spin * 1000000000)
+        now = _now
+        late = self._late
+        history = self.history
+
+        while True:
+            with cond:
+                heap = self._heap
+
+                while self._running and not heap:
+                    self._idle.notify_all()
+                    cond.wait()
+                    heap = self._heap
+
+                if not self._running:
+                    break
+
+                deadline = heap[0][0]
+                t = now()
+
+                if deadline - t > spin:
+                    cond.wait((deadline - t - spin) / 1000000000.0)
+                    continue
+
+            while now() < deadline:
+                pass
+
+            with cond:
+                heap = self._heap
+                due = []
+
+                while heap and heap[0][0] == deadline:
+                    due.append(heapq.heappop(heap))
+
+            # One write per bank, later actions win on shared bits.
+            writes = {}
+
+            for d, seq, index, mask, value in due:
+                mv = writes.get(index)
+
+                if mv is None:
+                    writes[index] = [mask, value]
+                else:
+                    mv[0] |= mask
+                    mv[1] = (mv[1] & ~mask) | value
+
+            t = now()
+
+            for index in sorted(writes):
+                mask, value = writes[index]
+
+                with regs.lock(index << 2):
+                    w[index] = (w[index] & ~mask & 0xffffffff) | value
+
+            lateness = (t - deadline) / 1000000000.0
+
+            for n in range(len(due)):
+                late[self._actions % history] = lateness
+                self._actions += 1
+
+            self._writes += len(writes)
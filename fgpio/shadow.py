@@ -0,0 +1,198 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from array import array
+
+
+class _ShadowWords(object):
+    """ words for ShadowRegisters users, reads live, writes keep the shadow."""
+
+    __slots__ = ('_live', '_shadow', '_owned')
+
+    def __init__(self, live, shadow, owned):
+        self._live = live
+        self._shadow = shadow
+        self._owned = owned
+
+    def __getitem__(self, index):
+        return self._live[index]
+
+    def __setitem__(self, index, value):
+        self._live[index] = value
+
+        if self._owned[index]:
+            self._shadow[index] = value
+
+    def __len__(self):
+        return len(self._live)
+
+
+class ShadowRegisters(object):
+    """ Registers with a shadow copy of the words only fgpio changes.
+
+        modify() on a shadowed register works from the shadow and writes
+        only the final word, so read-modify-writes don't read the slow
+        uncached device. Shadowed are GPIO_CON, GPIO_UPD and GPIO_DATA of
+        each bank and the EINT control words. Writes to input pins' DATA
+        bits are ignored by the chip, so DATA can be shadowed, but reads
+        always go to the device so input bits and EINT_PEND stay live.
+
+        The shadow is loaded when created and by resync(). verify()
+        compares it with the device, and with verify_every set it runs
+        every verify_every modifies, resyncing on a mismatch.
+    """
+
+    def __init__(self, regs, banks, eint_offsets, func_out, verify_every=0):
+        """ Initialize ShadowRegisters
+
+        Arguments:
+            regs:Registers          Live register window.
+            banks:List              (con, data, upd) byte offsets per bank.
+            eint_offsets:List       EINT control byte offsets.
+            func_out:Int            GPIO_CON field value of an output.
+            verify_every:Int        Verify after this many modifies, 0 never.
+        """
+
+        self._regs = regs
+        self.lock = regs.lock
+        self._banks = [(con >> 2, data >> 2, upd >> 2) for con, data, upd in banks]
+        self._func_out = func_out
+        self.verify_every = verify_every
+        self._owned = bytearray(len(regs.words))
+
+        for con, data, upd in self._banks:
+            self._owned[con] = self._owned[data] = self._owned[upd] = 1
+
+        for offset in eint_offsets:
+            self._owned[offset >> 2] = 1
+
+        self._shadow = array('I', [0]) * len(regs.words)
+        self.words = _ShadowWords(regs.words, self._shadow, self._owned)
+        self._modifies = 0
+        self.mismatches = 0
+        self.resync()
+
+    def read(self, offset):
+        """ Read register from the device.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+
+        Returns:Int     Register value.
+        """
+
+        return self._regs.words[offset >> 2]
+
+    def write(self, offset, value):
+        """ Write register, updating the shadow.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+            value:Int       Register value.
+        """
+
+        self.words[offset >> 2] = value
+
+    def modify(self, offset, mask, value):
+        """ Read-modify-write the masked bits of a register.
+
+        Shadowed registers are modified from the shadow.
+
+        Arguments:
+            offset:Int      Byte offset of register.
+            mask:Int        Bits to change.
+            value:Int       New value of the masked bits.
+        """
+
+        i = offset >> 2
+        live = self._regs.words
+
+        with self.lock(offset):
+            if self._owned[i]:
+                data = (self._shadow[i] & ~mask) | (value & mask)
+                live[i] = data
+                self._shadow[i] = data
+            else:
+                live[i] = (live[i] & ~mask) | (value & mask)
+
+        if self.verify_every:
+            self._modifies += 1
+
+            if self._modifies >= self.verify_every:
+                self._modifies = 0
+
+                if self.verify():
+                    self.resync()
+
+    def resync(self):
+        """ Reload the shadow from the device."""
+
+        live = self._regs.words
+
+        for i in range(len(self._owned)):
+            if self._owned[i]:
+                self._shadow[i] = live[i]
+
+    def verify(self):
+        """ Compare the shadow with the device.
+
+        For GPIO_DATA only bits of pins set as outputs in the shadowed
+        GPIO_CON are compared.
+
+        Returns:List    Byte offsets of registers that differ.
+        """
+
+        live = self._regs.words
+        shadow = self._shadow
+        ret = []
+        data = {}
+
+        for con, dat, upd in self._banks:
+            mask = 0
+            field = shadow[con]
+
+            for n in range(16):
+                if (field >> (n * 2)) & 3 == self._func_out:
+                    mask |= 1 << n
+
+            data[dat] = mask
+
+        for i in range(len(self._owned)):
+            if not self._owned[i]:
+                continue
+
+            mask = data.get(i, 0xffffffff)
+
+            if (live[i] ^ shadow[i]) & mask:
+                ret.append(i << 2)
+
+        self.mismatches += len(ret)
+        return ret
+
+    def close(self):
+        """ Close the live register window."""
+
+        self._regs.close()
+        self.words = self._regs.words
@@ -0,0 +1,129 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from array import array
+
+
+class Snapshot(object):
+    """ Register state of a board at one point in time.
+
+        Holds GPIO_CON, GPIO_DATA and GPIO_UPD of every bank and the EINT
+        control words, as byte offsets from MEM_OFFSET and their values.
+        Get one from GPIO.snapshot(), put it back with GPIO.restore().
+        to_dict()/from_dict() give a JSON friendly form, so a service can
+        keep a known good state across restarts. Snapshots also pickle.
+    """
+
+    def __init__(self, offsets, values, base):
+        """ Initialize Snapshot
+
+        Arguments:
+            offsets:List    Byte offsets of the registers.
+            values:List     Register values, same order as offsets.
+            base:Int        MEM_OFFSET of the board the registers are from.
+        """
+
+        self.offsets = tuple(offsets)
+        self.values = array('I', values)
+        self.base = base
+
+        if len(self.offsets) != len(self.values):
+            raise ValueError('fgpio: %s offsets for %s values.' % (len(self.offsets), len(self.values)))
+
+    def __getitem__(self, offset):
+        return self.values[self.offsets.index(offset)]
+
+    def __contains__(self, offset):
+        return offset in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __eq__(self, other):
+        return (isinstance(other, Snapshot) and self.base == other.base
+                and self.offsets == other.offsets and self.values == other.values)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def items(self):
+        """ (offset, value) pairs.
+
+        Returns:List
+        """
+
+        return list(zip(self.offsets, self.values))
+
+    def diff(self, other):
+        """ Registers that differ from other, see diff()."""
+
+        return diff(self, other)
+
+    def to_dict(self):
+        """ JSON friendly form of the snapshot.
+
+        Returns:Dict    base and registers, a Dict of hex offset to value.
+        """
+
+        return {'base': self.base,
+                'registers': dict(('0x%02x' % offset, value) for offset, value in self.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Snapshot from to_dict() output.
+
+        Arguments:
+            data:Dict       to_dict() output.
+
+        Returns:Snapshot
+        """
+
+        regs = sorted((int(offset, 16), data['registers'][offset]) for offset in data['registers'])
+        return cls([r[0] for r in regs], [r[1] for r in regs], data['base'])
+
+
+def diff(a, b):
+    """ Registers that differ between two snapshots.
+
+    Arguments:
+        a:Snapshot      First snapshot.
+        b:Snapshot      Second snapshot.
+
+    Returns:Dict    Byte offset to (a value, b value), None where a
+                    snapshot doesn't have the register.
+    """
+
+    if a.base != b.base:
+        raise ValueError('fgpio: Snapshots of different boards, 0x%x and 0x%x.' % (a.base, b.base))
+
+    old = dict(a.items())
+    new = dict(b.items())
+    ret = {}
+
+    for offset in set(old) | set(new):
+        if old.get(offset) != new.get(offset):
+            ret[offset] = (old.get(offset), new.get(offset))
+
+    return ret
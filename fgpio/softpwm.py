@@ -0,0 +1,298 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+import threading
+from time import sleep
+from timeit import default_timer as _clock
+
+from . import rt
+
+
+class SoftPWM(object):
+    """ Software PWM on any output pins through the register path.
+
+        The PWM period is split into resolution slots. Channel duties are
+        compiled into a schedule of the slots where outputs change, with
+        one GPIO_DATA write per bank per change, so all channels of a bank
+        switch together. One timing thread plays the schedule every
+        period with sleep-then-spin deadlines, and duty updates swap in a
+        new schedule at the next period without a restart.
+
+        Example:
+            gpio.gpio_init_many([29, 31, 32], 'out')
+            pwm = SoftPWM(gpio, frequency=100, resolution=100)
+            pwm.add(29, 0.25)
+            pwm.add(31, 0.5)
+            pwm.start()
+            pwm.set_duty(29, 0.75)
+    """
+
+    def __init__(self, gpio, frequency=100, resolution=100):
+        """ Initialize SoftPWM
+
+        Arguments:
+            gpio:GPIO           GPIO object, pins initialized as outputs.
+            frequency:Float     PWM frequency in Hz.
+            resolution:Int      Duty steps per period.
+        """
+
+        gpio._int_check(resolution, 'resolution')
+
+        if not frequency > 0 or resolution < 1:
+            gpio._value_error('Frequency and resolution must be greater than 0.')
+
+        self._gpio = gpio
+        self.frequency = float(frequency)
+        self.resolution = resolution
+        self._channels = {}
+        self._schedule = ()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        # Sleep until this close to a deadline, then spin.
+        self.spin = 0.0005
+        self.stats_reset()
+
+    def add(self, pin, duty=0.0):
+        """ Add an output pin as a PWM channel.
+
+        Arguments:
+            pin:Int         Pin number, initialized with gpio_init as out.
+            duty:Float      Duty cycle 0.0 to 1.0.
+        """
+
+        gpio = self._gpio
+        gpio._pin_check(pin, gpio._type_gpio)
+
+        with self._lock:
+            self._channels[pin] = [gpio._gpio_mem_addr(pin, gpio.board.GPIO_DATA_OFFSET) >> 2,
+                                   1 << gpio._num[pin],
+                                   self._slots(duty)]
+            self._compile()
+
+    def remove(self, pin):
+        """ Remove a PWM channel, leaving the pin low.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+        """
+
+        with self._lock:
+            ch = self._channels.pop(pin, None)
+            self._compile()
+
+        if ch is not None:
+            regs = self._gpio._regs
+
+            with regs.lock(ch[0] << 2):
+                regs.words[ch[0]] &= ~ch[1]
+
+    def set_duty(self, pin, duty):
+        """ Change the duty cycle of a channel from the next period.
+
+        Arguments:
+            pin:Int         Pin number of board connector.
+            duty:Float      Duty cycle 0.0 to 1.0.
+        """
+
+        if pin not in self._channels:
+            self._gpio._value_error('Pin %s is not a soft PWM channel.' % pin)
+
+        with self._lock:
+            self._channels[pin][2] = self._slots(duty)
+            self._compile()
+
+    def get_duty(self, pin):
+        """ Get the duty cycle of a channel, as quantized to resolution.
+
+        Returns:Float   Duty cycle 0.0 to 1.0.
+        """
+
+        if pin not in self._channels:
+            self._gpio._value_error('Pin %s is not a soft PWM channel.' % pin)
+
+        return self._channels[pin][2] / float(self.resolution)
+
+    def start(self, cpu=None, realtime=False, priority=50):
+        """ Start the timing thread.
+
+        Arguments:
+            cpu:Int         Pin the thread to this CPU, None leaves it.
+            realtime:Bool   Ask for SCHED_FIFO scheduling.
+            priority:Int    SCHED_FIFO priority, 1 to 99.
+        """
+
+        if self._running:
+            self._gpio._exception('Soft PWM already running.')
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(cpu, realtime, priority),
+                                        name='fgpio-softpwm')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the timing thread, leaving all channels low."""
+
+        self._running = False
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        regs = self._gpio._regs
+
+        for i, bit, slots in self._channels.values():
+            with regs.lock(i << 2):
+                regs.words[i] &= ~bit
+
+    def calibrate(self, count=10000):
+        """ Measure what the register path and clock allow.
+
+        Arguments:
+            count:Int       Timed write events to average over.
+
+        Returns:Dict    step (s per change event), max_frequency (Hz at
+                        this resolution), max_resolution (at this
+                        frequency).
+        """
+
+        gpio = self._gpio
+        w = gpio._regs.words
+        pins = list(self._channels) or [None]
+        i = self._channels[pins[0]][0] if pins[0] is not None else 0
+        lock = gpio._regs.lock(i << 2)
+        clock = _clock
+        start = clock()
+
+        # A clock read and a locked rewrite of the current value per event.
+        for n in range(count):
+            clock()
+
+            with lock:
+                w[i] = w[i]
+
+        step = (clock() - start) / count
+        return {'step': step,
+                'max_frequency': 1.0 / (step * self.resolution),
+                'max_resolution': int(1.0 / (step * self.frequency))}
+
+    def stats(self):
+        """ Timing statistics.
+
+        Returns:Dict    cycles, frequency (achieved Hz), max_late (s),
+                        cpu and realtime (whether they were applied).
+        """
+
+        return {'cycles': self._cycles,
+                'frequency': self._cycles / self._busy if self._busy > 0 else 0.0,
+                'max_late': self._max_late,
+                'cpu': self._cpu,
+                'realtime': self._realtime}
+
+    def stats_reset(self):
+        """ Reset statistics."""
+
+        self._cycles = 0
+        self._busy = 0.0
+        self._max_late = 0.0
+        self._cpu = False
+        self._realtime = False
+
+    def _slots(self, duty):
+        if not 0.0 <= duty <= 1.0:
+            self._gpio._value_error('Duty cycle must be between 0.0 and 1.0.')
+
+        return int(round(duty * self.resolution))
+
+    def _compile(self):
+        # Slot -> {index: [mask, value]}, channels turn on at slot 0 and
+        # off at their duty slot.
+        events = {}
+
+        for i, bit, slots in self._channels.values():
+            on = events.setdefault(0, {}).setdefault(i, [0, 0])
+            on[0] |= bit
+
+            if slots > 0:
+                on[1] |= bit
+
+            if 0 < slots < self.resolution:
+                off = events.setdefault(slots, {}).setdefault(i, [0, 0])
+                off[0] |= bit
+
+        period = 1.0 / self.frequency
+        lock = self._gpio._regs.lock if events else None
+        self._schedule = tuple((slot * period / self.resolution,
+                                tuple((i, ~mv[0] & 0xffffffff, mv[1], lock(i << 2))
+                                      for i, mv in sorted(events[slot].items())))
+                               for slot in sorted(events))
+
+    def _run(self, cpu, realtime, priority):
+        if cpu is not None:
+            self._cpu = rt.set_affinity(cpu)
+
+        if realtime:
+            self._realtime = rt.set_realtime(priority)
+
+        w = self._gpio._regs.words
+        clock = _clock
+        spin = self.spin
+        period = 1.0 / self.frequency
+        max_late = self._max_late
+        begin = base = clock()
+
+        while self._running:
+            for offset, writes in self._schedule:
+                t = base + offset
+                now = clock()
+
+                if now < t:
+                    if t - now > spin:
+                        sleep(t - now - spin)
+
+                    while now < t:
+                        now = clock()
+
+                if now - t > max_late:
+                    max_late = now - t
+
+                for i, keep, value, lock in writes:
+                    with lock:
+                        w[i] = (w[i] & keep) | value
+
+            base += period
+            self._cycles += 1
+
+            if not self._schedule:
+                sleep(period)
+
+            # Fell a whole period behind, restart timing rather than burst.
+            if clock() - base > period:
+                base = clock()
+
+        self._max_late = max_late
+        self._busy += clock() - begin
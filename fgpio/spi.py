@@ -0,0 +1,344 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from array import array
+from timeit import default_timer as _clock
+
+from .registers import byte_view
+
+
+class SPI(object):
+    """ Bit-banged SPI master on GPIO pins.
+
+        The GPIO_DATA words for each bit of every byte value are worked
+        out up front, so a transfer writes the registers straight from
+        tables, with the bank lock taken once per byte. When SCLK and
+        MOSI share a bank each bit is two register writes and, full
+        duplex, one read of MISO.
+
+        Pins must be initialized as GPIO, SCLK, MOSI and CS as outputs,
+        MISO as input. CS is asserted for each transfer, or across
+        several inside a select() block.
+
+        Example:
+            gpio.gpio_init_many([24, 29, 31], 'out')
+            gpio.gpio_init(32, 'in')
+            spi = SPI(gpio, sclk=29, mosi=31, miso=32, cs=24, mode=0)
+            out = bytearray(3)
+            spi.transfer(b'\\x01\\x80\\x00', out)
+    """
+
+    def __init__(self, gpio, sclk, mosi=None, miso=None, cs=None, mode=0, lsb_first=False,
+                 cs_active=0, delay=0):
+        """ Initialize SPI
+
+        Arguments:
+            gpio:GPIO       GPIO object with the pins initialized.
+            sclk:Int        Clock pin.
+            mosi:Int        Data out pin, None for read only.
+            miso:Int        Data in pin, None for write only. May be mosi
+                            to read back what is sent.
+            cs:Int          Chip select pin, None if not used.
+            mode:Int        SPI mode 0-3, CPOL is bit 1, CPHA bit 0.
+            lsb_first:Bool  Send least significant bit first.
+            cs_active:Int   CS level while selected.
+            delay:Float     Half clock period in seconds, 0 runs as fast
+                            as possible.
+        """
+
+        if mode not in (0, 1, 2, 3):
+            gpio._value_error('SPI mode must be 0, 1, 2 or 3.')
+
+        outs = [p for p in (sclk, mosi, cs) if p is not None]
+
+        if len(set(outs)) != len(outs) or miso is not None and miso in (sclk, cs):
+            gpio._value_error('SPI pins must be different.')
+
+        for pin in outs + [miso]:
+            if pin is not None:
+                gpio._pin_check(pin, gpio._type_gpio)
+
+        self._gpio = gpio
+        self.sclk = sclk
+        self.mosi = mosi
+        self.miso = miso
+        self.cs = cs
+        self.mode = mode
+        self.lsb_first = lsb_first
+        self.cs_active = 1 if cs_active else 0
+        self.delay = delay
+        self._selected = 0
+
+        cpol = mode >> 1
+        cpha = mode & 1
+        idle = cpol
+        active = 1 - cpol
+
+        # Banks written per bit, (word index, mask of SPI bits).
+        self._slots = []
+        clk = self._slot(sclk)
+        dat = self._slot(mosi) if mosi is not None else None
+
+        if miso is not None:
+            self._miso = (gpio._gpio_mem_addr(miso, gpio.board.GPIO_DATA_OFFSET) >> 2,
+                          gpio._num[miso])
+        else:
+            self._miso = None
+
+        # Half steps of a bit as (sclk level, sample after), CPHA 0
+        # sets data then clocks in on the leading edge, CPHA 1 sets data
+        # on the leading edge and clocks in on the trailing one.
+        if cpha:
+            halves = [(active, False), (idle, True)]
+        else:
+            halves = [(idle, False), (active, True)]
+
+        # Per byte value, a list of writes per slot of each half step.
+        nslots = len(self._slots)
+        self._tables = []
+
+        for byte in range(256):
+            steps = []
+
+            for n in range(8):
+                bit = (byte >> (n if lsb_first else 7 - n)) & 1
+
+                for level, sample in halves:
+                    values = [0] * nslots
+
+                    if level:
+                        values[clk[0]] |= clk[1]
+
+                    if dat is not None and bit:
+                        values[dat[0]] |= dat[1]
+
+                    steps.append(values)
+
+            # CPHA 0 ends the byte with the clock active, back to idle.
+            if not cpha:
+                steps.append(steps[14])
+
+            self._tables.append(steps)
+
+        self._single = nslots == 1
+
+        if self._single:
+            self._words = [array('I', [s[0] for s in steps]) for steps in self._tables]
+
+        # Bit order of bytes read, MISO is shifted in as sent.
+        self._order = [int('{:08b}'.format(n)[::-1], 2) for n in range(256)] if lsb_first else None
+        gpio.gpio_write(sclk, idle)
+
+        if cs is not None:
+            gpio.gpio_write(cs, 1 - self.cs_active)
+
+    def select(self):
+        """ Keep CS asserted across transfers in a with block.
+
+        Returns:SPI
+        """
+
+        return self
+
+    def __enter__(self):
+        if self._selected == 0 and self.cs is not None:
+            self._gpio.gpio_write(self.cs, self.cs_active)
+
+        self._selected += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._selected -= 1
+
+        if self._selected == 0 and self.cs is not None:
+            self._gpio.gpio_write(self.cs, 1 - self.cs_active)
+
+        return False
+
+    def transfer(self, data, out=None):
+        """ Full duplex transfer, reading a byte for each byte sent.
+
+        Arguments:
+            data:Bytes      bytes, bytearray or other buffer of bytes to
+                            send.
+            out:Buffer      Writable buffer of at least len(data) bytes
+                            for the bytes read, allocated if None.
+
+        Returns:Buffer  out.
+        """
+
+        data = byte_view(data)
+
+        if out is None:
+            out = bytearray(len(data))
+        elif len(out) < len(data):
+            self._gpio._value_error('SPI out buffer smaller than data.')
+
+        with self:
+            self._run(data, out)
+
+        return out
+
+    def write(self, data):
+        """ Send bytes, ignoring MISO.
+
+        Arguments:
+            data:Bytes      bytes, bytearray or other buffer of bytes.
+        """
+
+        data = byte_view(data)
+
+        with self:
+            self._run(data, None)
+
+    def read(self, count, out=None, fill=0):
+        """ Read bytes, sending fill for each.
+
+        Arguments:
+            count:Int       Bytes to read.
+            out:Buffer      Writable buffer of at least count bytes,
+                            allocated if None.
+            fill:Int        Byte value sent while reading.
+
+        Returns:Buffer  out.
+        """
+
+        self._gpio._int_check(count, 'count')
+        return self.transfer(bytes(bytearray([fill & 0xff]) * count), out)
+
+    def _slot(self, pin):
+        gpio = self._gpio
+        index = gpio._gpio_mem_addr(pin, gpio.board.GPIO_DATA_OFFSET) >> 2
+        bit = 1 << gpio._num[pin]
+
+        for n, (i, mask) in enumerate(self._slots):
+            if i == index:
+                self._slots[n] = (i, mask | bit)
+                return n, bit
+
+        self._slots.append((index, bit))
+        return len(self._slots) - 1, bit
+
+    def _run(self, data, out):
+        if out is not None and self._miso is None:
+            self._gpio._exception('SPI has no MISO pin to read.')
+
+        if self._single and not self.delay:
+            self._run_fast(data, out)
+        else:
+            self._run_slots(data, out)
+
+    def _run_fast(self, data, out):
+        # SCLK and MOSI on one bank, two writes per bit.
+        regs = self._gpio._regs
+        w = regs.words
+        i, mask = self._slots[0]
+        keep = ~mask & 0xffffffff
+        lock = regs.lock(i << 2)
+        acquire = lock.acquire
+        release = lock.release
+        tables = self._words
+
+        if out is None:
+            for k in range(len(data)):
+                seq = tables[data[k]]
+                acquire()
+
+                try:
+                    base = w[i] & keep
+
+                    for v in seq:
+                        w[i] = base | v
+                finally:
+                    release()
+
+            return
+
+        mi, ms = self._miso
+        order = self._order
+        tail = len(tables[0]) > 16
+
+        for k in range(len(data)):
+            seq = tables[data[k]]
+            r = 0
+            acquire()
+
+            try:
+                base = w[i] & keep
+
+                for j in (0, 2, 4, 6, 8, 10, 12, 14):
+                    w[i] = base | seq[j]
+                    w[i] = base | seq[j + 1]
+                    r = (r << 1) | ((w[mi] >> ms) & 1)
+
+                if tail:
+                    w[i] = base | seq[16]
+            finally:
+                release()
+
+            out[k] = order[r] if order is not None else r
+
+    def _run_slots(self, data, out):
+        # Any pin layout and clock delay, each step writes every bank.
+        regs = self._gpio._regs
+        w = regs.words
+        slots = [(i, ~mask & 0xffffffff, regs.lock(i << 2)) for i, mask in self._slots]
+        locks = [s[2] for s in sorted(slots)]
+        order = self._order
+        delay = self.delay
+        clock = _clock
+        target = clock()
+        miso = self._miso if out is not None else None
+
+        for k in range(len(data)):
+            steps = self._tables[data[k]]
+            r = 0
+
+            for lock in locks:
+                lock.acquire()
+
+            try:
+                bases = [w[i] & keep for i, keep, lock in slots]
+
+                for j in range(len(steps)):
+                    values = steps[j]
+
+                    for n in range(len(slots)):
+                        w[slots[n][0]] = bases[n] | values[n]
+
+                    if delay:
+                        target += delay
+
+                        while clock() < target:
+                            pass
+
+                    if miso is not None and j & 1 and j < 16:
+                        r = (r << 1) | ((w[miso[0]] >> miso[1]) & 1)
+            finally:
+                for lock in locks:
+                    lock.release()
+
+            if out is not None:
+                out[k] = order[r] if order is not None else r
@@ -0,0 +1,368 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from array import array
+from bisect import bisect_right
+from timeit import default_timer as _clock
+
+from .registers import CLOSED
+
+# Latency histogram bucket upper edges in seconds, 100ns doubling to ~52ms.
+EDGES = tuple(1e-7 * (1 << i) for i in range(20))
+
+
+class _CountedWords(object):
+    """ words wrapper counting reads and writes per word."""
+
+    __slots__ = ('_live', '_reads', '_writes')
+
+    def __init__(self, live, reads, writes):
+        self._live = live
+        self._reads = reads
+        self._writes = writes
+
+    def __getitem__(self, index):
+        self._reads[index] += 1
+        return self._live[index]
+
+    def __setitem__(self, index, value):
+        self._writes[index] += 1
+        self._live[index] = value
+
+    def __len__(self):
+        return len(self._live)
+
+
+class _TracedWords(_CountedWords):
+    """ words wrapper counting, and tracing writes to the ring."""
+
+    __slots__ = ('_trace',)
+
+    def __init__(self, live, reads, writes, trace):
+        _CountedWords.__init__(self, live, reads, writes)
+        self._trace = trace
+
+    def __setitem__(self, index, value):
+        self._writes[index] += 1
+        live = self._live
+        self._trace(index << 2, live[index], value)
+        live[index] = value
+
+
+class _InstrumentedRegisters(object):
+    """ Registers wrapper counting accesses, see Instrument."""
+
+    def __init__(self, regs, inst):
+        self._regs = regs
+        self._inst = inst
+        self._reads = inst._reads
+        self._writes = inst._writes
+
+        if inst.trace:
+            self.words = _TracedWords(regs.words, self._reads, self._writes, inst._record)
+        else:
+            self.words = _CountedWords(regs.words, self._reads, self._writes)
+
+    def __getattr__(self, name):
+        # resync(), verify() and friends of wrapped ShadowRegisters.
+        return getattr(self._regs, name)
+
+    def read(self, offset):
+        self._reads[offset >> 2] += 1
+        return self._regs.read(offset)
+
+    def write(self, offset, value):
+        self._writes[offset >> 2] += 1
+
+        if self._inst.trace:
+            self._inst._record(offset, self._regs.read(offset), value)
+
+        self._regs.write(offset, value)
+
+    def modify(self, offset, mask, value):
+        i = offset >> 2
+        self._reads[i] += 1
+        self._writes[i] += 1
+
+        if self._inst.trace:
+            old = self._regs.read(offset)
+            self._regs.modify(offset, mask, value)
+            self._inst._record(offset, old, (old & ~mask) | (value & mask))
+        else:
+            self._regs.modify(offset, mask, value)
+
+    def close(self):
+        self._regs.close()
+        self.words = CLOSED
+
+
+class Instrument(object):
+    """ Counters, latency histograms and a register trace for a GPIO.
+
+        Installed by GPIO.instrument(). Each public GPIO method is
+        replaced on the instance by a wrapper counting calls, per pin
+        calls and call latency, and the register window by one counting
+        reads and writes per register. Removing it deletes the wrappers,
+        so a GPIO without instrumentation runs the plain class methods
+        with no extra checks.
+
+        Latency histograms have fixed buckets, EDGES, preallocated per
+        method. With trace set, the last trace register writes are kept
+        in a ring as (timestamp, offset, old, new), costing an extra
+        register read per write. Handles and engines pick up the
+        counting words only when created or started after instrumenting.
+
+        Counters are not locked, with several threads they may lose
+        counts.
+    """
+
+    def __init__(self, gpio, trace=0):
+        """ Initialize Instrument
+
+        Arguments:
+            gpio:GPIO       GPIO object to instrument.
+            trace:Int       Register writes to keep in the trace ring, 0 off.
+        """
+
+        self._gpio = gpio
+        self.trace = trace
+        self._methods = []
+
+        for name in sorted(dir(type(gpio))):
+            if name.startswith('_') or name in ('instrument', 'stats', 'stats_reset'):
+                continue
+
+            func = getattr(type(gpio), name)
+
+            if callable(func):
+                code = getattr(func, '__code__', None)
+                pinned = code is not None and code.co_argcount > 1 and code.co_varnames[1] == 'pin'
+                self._methods.append((name, pinned))
+
+        self._calls = dict((name, [0, 0.0]) for name, pinned in self._methods)
+        self._hists = dict((name, array('L', [0]) * (len(EDGES) + 1)) for name, pinned in self._methods)
+        self._pins = {}
+        self._sysfs = {}
+        size = gpio.board.MEM_LENGTH // 4
+        self._reads = array('L', [0]) * size
+        self._writes = array('L', [0]) * size
+        self._trace_pos = 0
+        self._trace_ts = array('d', [0.0]) * trace
+        self._trace_offset = array('L', [0]) * trace
+        self._trace_old = array('L', [0]) * trace
+        self._trace_new = array('L', [0]) * trace
+        self._installed = False
+
+    def reset(self):
+        """ Zero all counters, histograms and the trace."""
+
+        # In place, installed wrappers hold references to these.
+        for name in self._calls:
+            self._calls[name][:] = [0, 0.0]
+            self._hists[name][:] = array('L', [0]) * len(self._hists[name])
+
+        self._pins.clear()
+        self._sysfs.clear()
+        self._reads[:] = array('L', [0]) * len(self._reads)
+        self._writes[:] = array('L', [0]) * len(self._writes)
+        self._trace_pos = 0
+
+    def install(self):
+        """ Replace GPIO methods and register window with counting ones."""
+
+        if self._installed:
+            return
+
+        gpio = self._gpio
+
+        for name, pinned in self._methods:
+            setattr(gpio, name, self._wrap(name, getattr(gpio, name), pinned))
+
+        mem_open = gpio._mem_open
+
+        def _mem_open():
+            mem_open()
+            gpio._regs = _InstrumentedRegisters(gpio._regs, self)
+
+        sys_read = gpio._sys_read
+        sys_write = gpio._sys_write
+        pwm_open = gpio._pwm_open
+
+        def _sys_read(path):
+            self._sysfs[path] = self._sysfs.get(path, 0) + 1
+            return sys_read(path)
+
+        def _sys_write(path, value):
+            self._sysfs[path] = self._sysfs.get(path, 0) + 1
+            sys_write(path, value)
+
+        def _pwm_open(pin):
+            pwm_open(pin)
+            num = gpio._pwm_num[pin]
+
+            for name in gpio._sys_pwm_paths:
+                path = gpio._sys_pwm_paths[name] % num
+                self._sysfs[path] = self._sysfs.get(path, 0) + 1
+
+        gpio._mem_open = _mem_open
+        gpio._sys_read = _sys_read
+        gpio._sys_write = _sys_write
+        gpio._pwm_open = _pwm_open
+
+        if gpio._regs is not None:
+            gpio._regs = _InstrumentedRegisters(gpio._regs, self)
+
+        self._installed = True
+
+    def remove(self):
+        """ Restore the plain GPIO methods and register window."""
+
+        if not self._installed:
+            return
+
+        gpio = self._gpio
+
+        for name, pinned in self._methods:
+            del gpio.__dict__[name]
+
+        for name in ('_mem_open', '_sys_read', '_sys_write', '_pwm_open'):
+            del gpio.__dict__[name]
+
+        if isinstance(gpio._regs, _InstrumentedRegisters):
+            gpio._regs = gpio._regs._regs
+
+        self._installed = False
+
+    def _wrap(self, name, func, pinned):
+        acc = self._calls[name]
+        hist = self._hists[name]
+        pins = self._pins
+
+        if pinned:
+            def wrapper(pin, *args, **kwargs):
+                start = _clock()
+
+                try:
+                    return func(pin, *args, **kwargs)
+                finally:
+                    elapsed = _clock() - start
+                    acc[0] += 1
+                    acc[1] += elapsed
+                    hist[bisect_right(EDGES, elapsed)] += 1
+                    counts = pins.get(pin)
+
+                    if counts is None:
+                        counts = pins[pin] = {}
+
+                    counts[name] = counts.get(name, 0) + 1
+        else:
+            def wrapper(*args, **kwargs):
+                start = _clock()
+
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    elapsed = _clock() - start
+                    acc[0] += 1
+                    acc[1] += elapsed
+                    hist[bisect_right(EDGES, elapsed)] += 1
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def _record(self, offset, old, new):
+        i = self._trace_pos % self.trace
+        self._trace_ts[i] = _clock()
+        self._trace_offset[i] = offset
+        self._trace_old[i] = old
+        self._trace_new[i] = new
+        self._trace_pos += 1
+
+    def stats(self):
+        """ Snapshot of the counters.
+
+        Returns:Dict    methods: per method calls, total and mean seconds,
+                        histogram counts per EDGES bucket (last is over)
+                        and p50/p99 bucket edges. pins: per pin calls per
+                        method. registers: reads and writes totals and
+                        per byte offset. sysfs: opens per path. trace:
+                        (timestamp, offset, old, new) oldest first.
+        """
+
+        methods = {}
+
+        for name, pinned in self._methods:
+            count, total = self._calls[name]
+
+            if not count:
+                continue
+
+            hist = list(self._hists[name])
+            methods[name] = {'calls': count,
+                             'total': total,
+                             'mean': total / count,
+                             'histogram': hist,
+                             'p50': _quantile(hist, count, 0.5),
+                             'p99': _quantile(hist, count, 0.99)}
+
+        offsets = {}
+
+        for i in range(len(self._reads)):
+            if self._reads[i] or self._writes[i]:
+                offsets[i << 2] = {'reads': self._reads[i], 'writes': self._writes[i]}
+
+        trace = []
+
+        if self.trace:
+            start = max(0, self._trace_pos - self.trace)
+
+            for n in range(start, self._trace_pos):
+                i = n % self.trace
+                trace.append((self._trace_ts[i], self._trace_offset[i],
+                              self._trace_old[i], self._trace_new[i]))
+
+        return {'methods': methods,
+                'pins': dict((pin, dict(self._pins[pin])) for pin in self._pins),
+                'registers': {'reads': sum(self._reads),
+                              'writes': sum(self._writes),
+                              'offsets': offsets},
+                'sysfs': dict(self._sysfs),
+                'edges': list(EDGES),
+                'trace': trace}
+
+
+def _quantile(hist, count, q):
+    # Upper edge of the bucket holding the q quantile, None if over.
+    want = q * count
+    seen = 0
+
+    for i in range(len(hist)):
+        seen += hist[i]
+
+        if seen >= want:
+            return EDGES[i] if i < len(EDGES) else None
+
+    return None
@@ -0,0 +1,370 @@
+
+#############################################################################
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Jason Pruitt
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#############################################################################
+
+from array import array
+from time import sleep
+from timeit import default_timer as _clock
+
+
+class Pattern(object):
+    """ Waveform compiled to raw GPIO_DATA register words.
+
+        For each bank register touched there is a word index, the mask of
+        the pattern's pins in it and one value per step. durations holds
+        the time of each step in seconds.
+    """
+
+    __slots__ = ('indexes', 'masks', 'words', 'durations')
+
+    def __init__(self, indexes, masks, words, durations):
+        self.indexes = indexes
+        self.masks = masks
+        self.words = words
+        self.durations = durations
+
+    def __len__(self):
+        return len(self.durations)
+
+
+class Waveform(object):
+    """ Bit-banged output patterns played straight to the bank registers.
+
+        Steps are compiled up front into one GPIO_DATA word per bank, so
+        playback is a register write per bank per step with deadline
+        based timing, instead of gpio_write and sleep per pin. Banks are
+        written one after the other within a step.
+
+        play() and stream() return stats as a Dict of steps, elapsed (s),
+        requested_rate and achieved_rate (steps/s, requested is None when
+        all durations are 0), max_late and mean_late (s) of step writes
+        against their deadlines.
+
+        Example:
+            wave = Waveform(gpio, [29, 31])
+            pat = wave.compile([({29:1, 31:0}, 0.0001), ({29:0}, 0.0001)])
+            stats = wave.play(pat, loops=100)
+    """
+
+    def __init__(self, gpio, pins):
+        """ Initialize Waveform
+
+        Arguments:
+            gpio:GPIO       GPIO object with pins initialized as outputs.
+            pins:List       Pin numbers the waveform drives.
+        """
+
+        self._gpio = gpio
+        self.pins = list(pins)
+        self._index = {}
+        self._bit = {}
+        self._banks = {}
+        self._running = False
+
+        # Sleep until this close to a deadline, then spin.
+        self.spin = 0.001
+
+        for pin in self.pins:
+            gpio._pin_check(pin, gpio._type_gpio)
+            bank = gpio.layout.bank[pin]
+            self._index[pin] = gpio._gpio_mem_addr(pin, gpio.board.GPIO_DATA_OFFSET) >> 2
+            self._bit[pin] = 1 << gpio._num[pin]
+            self._banks[bank] = self._index[pin]
+
+        self._indexes = sorted(set(self._index.values()))
+        self._masks = [0] * len(self._indexes)
+
+        for pin in self.pins:
+            self._masks[self._indexes.index(self._index[pin])] |= self._bit[pin]
+
+    def compile(self, steps):
+        """ Compile steps into a Pattern.
+
+        Pins missing from a step keep their value from the step before,
+        all pins start low.
+
+        Arguments:
+            steps:Iterable  (state, duration) pairs, state is a Dict of
+                            pin number to value, or an Int with bit N for
+                            pins[N]. Duration in seconds.
+
+        Returns:Pattern
+        """
+
+        words = [array('I') for i in self._indexes]
+        durations = array('d')
+        state = dict((pin, 0) for pin in self.pins)
+
+        for step, duration in steps:
+            if isinstance(step, dict):
+                for pin in step:
+                    if pin not in state:
+                        self._gpio._value_error('Pin %s not in waveform.' % pin)
+
+                    state[pin] = 1 if step[pin] else 0
+            else:
+                for n, pin in enumerate(self.pins):
+                    state[pin] = (step >> n) & 1
+
+            values = [0] * len(self._indexes)
+
+            for pin in self.pins:
+                if state[pin]:
+                    values[self._indexes.index(self._index[pin])] |= self._bit[pin]
+
+            for i, value in enumerate(values):
+                words[i].append(value)
+
+            durations.append(duration)
+
+        return Pattern(self._indexes, self._masks, words, durations)
+
+    def compile_words(self, words, period):
+        """ Compile packed per step bank values into a Pattern.
+
+        Bits outside the waveform's pins are ignored.
+
+        Arguments:
+            words:List      Bank register values per step, or a Dict of
+                            bank name to values if pins span banks.
+            period:Float    Step time in seconds, or a List per step.
+
+        Returns:Pattern
+        """
+
+        if not isinstance(words, dict):
+            if len(self._banks) != 1:
+                self._gpio._value_error('Pins span banks, words must be a dict of bank to values.')
+
+            words = {list(self._banks)[0]: words}
+
+        out = [None] * len(self._indexes)
+
+        for bank in words:
+            if bank not in self._banks:
+                self._gpio._value_error('Bank %s has no waveform pins.' % bank)
+
+            i = self._indexes.index(self._banks[bank])
+            out[i] = array('I', [w & self._masks[i] for w in words[bank]])
+
+        count = max(len(w) for w in out if w is not None)
+
+        for i, w in enumerate(out):
+            if w is None:
+                out[i] = array('I', [0] * count)
+            elif len(w) != count:
+                self._gpio._value_error('Bank word lists must be the same length.')
+
+        if isinstance(period, (int, float)):
+            durations = array('d', [period] * count)
+        else:
+            durations = array('d', period)
+
+            if len(durations) != count:
+                self._gpio._value_error('Need one period per step.')
+
+        return Pattern(self._indexes, self._masks, out, durations)
+
+    def play(self, pattern, loops=1):
+        """ Play a compiled pattern, blocking until done or stopped.
+
+        Arguments:
+            pattern:Pattern     From compile() or compile_words().
+            loops:Int           Times to repeat, 0 loops until stop().
+
+        Returns:Dict    Playback stats.
+        """
+
+        self._gpio._int_check(loops, 'loops')
+        stats = self._stats_new()
+        self._running = True
+        target = stats['start'] = _clock()
+        loop = 0
+
+        try:
+            while self._running and (loops == 0 or loop < loops):
+                target = self._play(pattern, target, stats)
+                loop += 1
+
+            if self._running:
+                self._wait(target)
+        finally:
+            self._running = False
+
+        return self._stats_done(stats, target)
+
+    def stream(self, steps, chunk=256):
+        """ Play steps from an iterable, compiling chunk steps at a time.
+
+        For unbounded patterns from a generator, runs until the
+        iterable ends or stop() is called. Timing continues across
+        chunks, but compiling a chunk adds to the lateness of its first
+        step.
+
+        Arguments:
+            steps:Iterable  (state, duration) pairs as for compile().
+            chunk:Int       Steps compiled per batch.
+
+        Returns:Dict    Playback stats.
+        """
+
+        stats = self._stats_new()
+        self._running = True
+        target = stats['start'] = _clock()
+        steps = iter(steps)
+        state = {}
+
+        try:
+            while self._running:
+                batch = []
+
+                for step in steps:
+                    batch.append(step)
+
+                    if len(batch) >= chunk:
+                        break
+
+                if not batch:
+                    break
+
+                # Carry pin state over from the last chunk.
+                if state and isinstance(batch[0][0], dict):
+                    first = dict(state)
+                    first.update(batch[0][0])
+                    batch[0] = (first, batch[0][1])
+
+                pattern = self.compile(batch)
+                state = self._last_state(pattern)
+                target = self._play(pattern, target, stats)
+
+            if self._running:
+                self._wait(target)
+        finally:
+            self._running = False
+
+        return self._stats_done(stats, target)
+
+    def stop(self):
+        """ Stop play() or stream() running in another thread."""
+
+        self._running = False
+
+    def _play(self, pattern, target, stats):
+        w = self._gpio._regs.words
+        durations = pattern.durations
+        regs = self._gpio._regs
+        banks = [(pattern.indexes[i], ~pattern.masks[i] & 0xffffffff, pattern.words[i],
+                  regs.lock(pattern.indexes[i] << 2))
+                 for i in range(len(pattern.indexes))]
+        if not any(durations):
+            return self._play_fast(w, banks, len(durations), target, stats)
+
+        spin = self.spin
+        clock = _clock
+        max_late = stats['max_late']
+        total_late = 0.0
+        k = 0
+
+        for k in range(len(durations)):
+            if not self._running:
+                break
+
+            now = clock()
+
+            if now < target:
+                if target - now > spin:
+                    sleep(target - now - spin)
+
+                while now < target:
+                    now = clock()
+
+            late = now - target
+            total_late += late
+
+            if late > max_late:
+                max_late = late
+
+            for i, keep, words, lock in banks:
+                with lock:
+                    w[i] = (w[i] & keep) | words[k]
+
+            target += durations[k]
+        else:
+            k = len(durations)
+
+        stats['steps'] += k
+        stats['requested'] += sum(durations[:k])
+        stats['max_late'] = max_late
+        stats['total_late'] += total_late
+        return target
+
+    def _play_fast(self, w, banks, count, target, stats):
+        # No timing, write steps back to back.
+        k = 0
+
+        for k in range(count):
+            if not self._running:
+                break
+
+            for i, keep, words, lock in banks:
+                with lock:
+                    w[i] = (w[i] & keep) | words[k]
+        else:
+            k = count
+
+        stats['steps'] += k
+        return _clock()
+
+    def _wait(self, target):
+        # Hold the last step for its duration, sleeping until spin before.
+        now = _clock()
+
+        if target - now > self.spin:
+            sleep(target - now - self.spin)
+
+        while _clock() < target:
+            pass
+
+    def _last_state(self, pattern):
+        state = {}
+
+        for pin in self.pins:
+            i = pattern.indexes.index(self._index[pin])
+            state[pin] = 1 if pattern.words[i][-1] & self._bit[pin] else 0
+
+        return state
+
+    def _stats_new(self):
+        return {'start': 0.0, 'steps': 0, 'requested': 0.0, 'max_late': 0.0, 'total_late': 0.0}
+
+    def _stats_done(self, stats, target):
+        elapsed = _clock() - stats['start']
+        steps = stats['steps']
+        requested = stats['requested']
+        return {'steps': steps,
+                'elapsed': elapsed,
+                'requested_rate': steps / requested if requested > 0 else None,
+                'achieved_rate': steps / elapsed if elapsed > 0 else None,
+                'max_late': stats['max_late'],
+                'mean_late': stats['total_late'] / steps if steps else 0.0}
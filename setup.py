@@ -12,4 +12,5 @@ setup(
     url='https://github.com/jrspruitt/pyfa_gpio',
     license='MIT',
     packages = find_packages(),
+    package_data = {'fgpio.boards': ['*.json', '*.toml']},
 )
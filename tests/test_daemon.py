@@ -0,0 +1,187 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from fgpio import GPIO, SimBackend
+from fgpio.daemon import GPIODaemon, GPIOClient, FRAME, OP, RESULT, REQUEST, VALUE_ERROR, MAX_OPS, recv_frame
+from fgpio.boards import nanopi
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        board = nanopi.Config()
+        self.tmp = tempfile.mkdtemp()
+        self.sim = SimBackend(board)
+        self.daemon = GPIODaemon(GPIO(board, backend=self.sim), os.path.join(self.tmp, 'sock'))
+        self.daemon.start()
+        self.c1 = GPIOClient(self.daemon.path)
+        self.c2 = GPIOClient(self.daemon.path)
+
+    def tearDown(self):
+        self.c1.close()
+        self.c2.close()
+        self.daemon.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        self.c1.gpio_init(40, 'out')
+        self.c1.gpio_write(40, 1)
+        self.assertEqual(self.c1.gpio_read(40), 1)
+        self.c1.gpio_write(40, 0)
+        self.assertEqual(self.c1.gpio_read(40), 0)
+        self.assertRaises(ValueError, self.c1.gpio_init, 40, 'bogus')
+
+    def test_pins_belong_to_client(self):
+        self.c1.gpio_init(40, 'out')
+        self.assertRaises(Exception, self.c2.gpio_init, 40, 'out')
+        self.assertRaises(Exception, self.c2.gpio_write, 40, 1)
+        self.c1.close()
+        deadline = time.time() + 5
+
+        # The daemon releases the pins once it sees the connection close.
+        while True:
+            try:
+                self.c2.gpio_init(40, 'out')
+                break
+            except Exception:
+                if time.time() > deadline:
+                    raise
+
+                time.sleep(0.01)
+
+    def test_pipeline(self):
+        with self.c1.pipeline() as p:
+            p.gpio_init(40, 'out')
+            p.gpio_write(40, 1)
+            p.gpio_read(40)
+
+        self.assertEqual(p.results[-1], 1)
+        self.c1.gpio_init_many([36, 37], 'out')
+        self.c1.gpio_write_many({36: 1, 37: 0})
+        self.assertEqual(self.c1.gpio_read_many([36, 37]), {36: 1, 37: 0})
+
+    def test_subscribe(self):
+        events = []
+        fired = threading.Event()
+
+        def callback(pin, trigger, timestamp):
+            events.append(pin)
+            fired.set()
+
+        self.c1.eint_init(38, 'falling')
+        self.c1.subscribe(38, callback)
+        self.sim.drive(38, 1)
+        self.sim.drive(38, 0)
+        self.assertTrue(fired.wait(5))
+        self.assertEqual(events[0], 38)
+        self.c1.unsubscribe(38)
+
+    def test_concurrent_clients(self):
+        pins = [29, 31, 32, 33]
+        clients = [GPIOClient(self.daemon.path) for pin in pins]
+        lost = []
+
+        def worker(client, pin):
+            client.gpio_init(pin, 'out')
+
+            for n in range(200):
+                client.gpio_write(pin, n & 1)
+
+                if client.gpio_read(pin) != n & 1:
+                    lost.append(pin)
+
+        threads = [threading.Thread(target=worker, args=args) for args in zip(clients, pins)]
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            for client in clients:
+                client.close()
+
+        self.assertEqual(lost, [])
+
+    def test_port_write_mask(self):
+        # Pin 40 is GPG11, pin 38 GPG10, GPG0 is not on the connector.
+        self.c1.gpio_init(40, 'out')
+        self.c1.eint_init(38, 'falling')
+        self.c1.port_write('GPG', 1 << 11, 1 << 11)
+        self.assertEqual(self.c1.gpio_read(40), 1)
+        self.assertRaises(Exception, self.c1.port_write, 'GPG', 1 << 10, 0)
+        self.assertRaises(Exception, self.c1.port_write, 'GPG', 1 << 0, 0)
+        self.assertRaises(Exception, self.c2.port_write, 'GPG', 1 << 11, 0)
+        self.assertRaises(ValueError, self.c1.port_write, 'GPX', 1, 0)
+
+    def test_port_read_mask(self):
+        self.c1.gpio_init(40, 'out')
+        self.c1.gpio_write(40, 1)
+        self.assertRaises(Exception, self.c2.port_read, 'GPG')
+        self.assertEqual(self.c1.port_read('GPG'), 1 << 11)
+
+    def test_unsubscribe_with_blocked_worker(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def event(pin, trigger, timestamp):
+            entered.set()
+            release.wait(10)
+
+        self.daemon._event = event
+        self.c1.eint_init(38, 'falling')
+        self.c1.subscribe(38, lambda *args: None)
+        self.sim.drive(38, 1)
+        self.sim.drive(38, 0)
+        self.assertTrue(entered.wait(5))
+
+        try:
+            done = threading.Thread(target=self.c1.unsubscribe, args=(38,))
+            done.start()
+            done.join(2)
+            self.assertFalse(done.is_alive())
+            self.c2.gpio_init(40, 'out')
+        finally:
+            release.set()
+
+
+    def bad_request(self, length, payload):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.daemon.path)
+
+        try:
+            sock.sendall(FRAME.pack(length, REQUEST, 7) + payload)
+            ftype, seq, body = recv_frame(sock)
+            self.assertEqual(seq, 7)
+            self.assertEqual(RESULT.unpack_from(body)[0], VALUE_ERROR)
+            self.assertIsNone(recv_frame(sock))
+        finally:
+            sock.close()
+
+    def test_request_limits(self):
+        self.bad_request(0xffffffff, b'')
+        self.bad_request((MAX_OPS + 1) * OP.size, b'')
+        self.bad_request(OP.size + 1, b'\0' * (OP.size + 1))
+
+        self.c1.gpio_init(40, 'out')
+        p = self.c1.pipeline()
+
+        for n in range(MAX_OPS):
+            p.gpio_read(40)
+
+        self.assertEqual(len(p.execute()), MAX_OPS)
+
+        for n in range(MAX_OPS + 1):
+            p.gpio_read(40)
+
+        self.assertRaises(ValueError, p.execute)
+        self.assertEqual(self.c1.gpio_read(40), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
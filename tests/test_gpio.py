@@ -0,0 +1,40 @@
+import unittest
+
+from fgpio import GPIO, SimBackend
+from fgpio.boards import nanopi
+
+
+class GPIOInitTest(unittest.TestCase):
+    def setUp(self):
+        self.board = nanopi.Config()
+        self.gpio = GPIO(self.board, backend=SimBackend(self.board))
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+
+    def updn(self, pin):
+        gpio = self.gpio
+        addr = gpio._base[pin] + self.board.GPIO_UPD_OFFSET
+        return (gpio._regs.words[addr >> 2] >> (gpio._num[pin] * 2)) & 3
+
+    def test_output_not_pulled(self):
+        self.gpio.gpio_init(40, 'out', 'up')
+        self.gpio.gpio_init_many([36, 37], 'out', 'up')
+
+        for pin in (36, 37, 40):
+            self.assertEqual(self.updn(pin), self.board.UPDN_NONE)
+
+    def test_input_pulled(self):
+        self.gpio.gpio_init(40, 'in', 'up')
+        self.gpio.gpio_init_many([36, 37], 'in', 'up')
+
+        for pin in (36, 37, 40):
+            self.assertEqual(self.updn(pin), self.board.UPDN_UP)
+
+    def test_bad_updown(self):
+        self.assertRaises(ValueError, self.gpio.gpio_init, 40, 'out', 'sideways')
+        self.assertRaises(ValueError, self.gpio.gpio_init_many, [36, 37], 'out', 'sideways')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from array import array
+
+from fgpio import GPIO, SimBackend
+from fgpio.i2c import I2C, SimI2CDevice
+from fgpio.ownership import Ownership
+from fgpio.boards import nanopi
+
+
+class I2CTest(unittest.TestCase):
+    ownership = False
+
+    def setUp(self):
+        self.board = nanopi.Config()
+        self.tmp = tempfile.mkdtemp()
+        self.hung = False
+        self.sim = SimBackend(self.board)
+        owners = Ownership(self.board, os.path.join(self.tmp, 'own')) if self.ownership else None
+        self.gpio = GPIO(self.board, backend=self.sim, ownership=owners)
+        self.dev = SimI2CDevice(self.sim, 0x50, 27, 28)
+        self.gpio.gpio_init_many([27, 28], 'in')
+
+    def tearDown(self):
+        # A hung transfer still holds the bank lock.
+        if not self.hung:
+            self.gpio.gpio_close_all()
+        shutil.rmtree(self.tmp)
+
+    def _run(self, func):
+        # A deadlock shows up as a thread that never finishes.
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.hung = thread.is_alive()
+        self.assertFalse(thread.is_alive(), 'I2C transfer deadlocked.')
+        return result[0]
+
+    def _transfer(self):
+        i2c = I2C(self.gpio, frequency=0)
+        found = i2c.scan()
+        i2c.write(0x50, b'\x10hello')
+        return found, bytes(i2c.write_read(0x50, b'\x10', 5))
+
+    def test_round_trip(self):
+        found, data = self._run(self._transfer)
+        self.assertEqual(found, [0x50])
+        self.assertEqual(data, b'hello')
+        self.assertEqual(bytes(self.dev.memory[0x10:0x15]), b'hello')
+
+    def test_buffer_data(self):
+        i2c = I2C(self.gpio, frequency=0)
+        i2c.write(0x50, array('B', [0x20, 1, 2, 3]))
+        self.assertEqual(list(self.dev.memory[0x20:0x23]), [1, 2, 3])
+
+    def test_nack(self):
+        i2c = I2C(self.gpio, frequency=0)
+        self.assertRaises(Exception, i2c.write, 0x51, b'x')
+        self.assertEqual(self.sim.level(27), 1)
+        self.assertEqual(self.sim.level(28), 1)
+
+    def test_clock_stretch(self):
+        dev = SimI2CDevice(self.sim, 0x68, 27, 28, stretch=0.0002)
+        i2c = I2C(self.gpio, frequency=0)
+        i2c.write(0x68, b'\x00\xaa\x55')
+        self.assertEqual(bytes(dev.memory[:2]), b'\xaa\x55')
+
+
+class I2COwnershipTest(I2CTest):
+    ownership = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fgpio import layout
+
+
+class LayoutTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.old_cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.tmp, 'cache')
+        source = os.path.join(os.path.dirname(layout.__file__), 'boards', 'nanopi.json')
+        self.path = os.path.join(self.tmp, 'board.json')
+        shutil.copy(source, self.path)
+        layout._memo.clear()
+
+    def tearDown(self):
+        if self.old_cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.old_cache
+
+        layout._memo.clear()
+        shutil.rmtree(self.tmp)
+
+    def test_int(self):
+        self.assertEqual(layout._int('t', 'x', 0x88), 0x88)
+        self.assertEqual(layout._int('t', 'x', '0x88'), 0x88)
+        self.assertEqual(layout._int('t', 'x', u'0x88'), 0x88)
+        self.assertRaises(ValueError, layout._int, 't', 'x', True)
+        self.assertRaises(ValueError, layout._int, 't', 'x', 'GPF')
+
+    def test_immutable(self):
+        compiled = layout.load(self.path)
+        self.assertRaises(AttributeError, setattr, compiled, 'name', 'x')
+
+        for table in (compiled.registers, compiled.banks, compiled.windows):
+            self.assertRaises(TypeError, table.__setitem__, 'x', 1)
+            self.assertRaises(TypeError, table.update, {'x': 1})
+            self.assertRaises(TypeError, table.clear)
+
+        board = layout.Board(compiled)
+        board.banks['x'] = 1
+        self.assertNotIn('x', compiled.banks)
+
+    def test_cache_compiler_key(self):
+        layout.load(self.path)
+        st = os.stat(self.path)
+        key = (st.st_size, st.st_mtime)
+        self.assertIsNotNone(layout._cache_read(self.path, key))
+
+        compiler = layout.COMPILER
+        layout.COMPILER = compiler + 1
+
+        try:
+            self.assertIsNone(layout._cache_read(self.path, key))
+        finally:
+            layout.COMPILER = compiler
+
+
+if __name__ == '__main__':
+    unittest.main()
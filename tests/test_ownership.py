@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fgpio import GPIO, FileBackend
+from fgpio.ownership import Ownership
+from fgpio.boards import nanopi
+
+
+class OwnershipTest(unittest.TestCase):
+    def setUp(self):
+        self.board = nanopi.Config()
+        self.tmp = tempfile.mkdtemp()
+        self.owners = Ownership(self.board, os.path.join(self.tmp, 'own'))
+        self.gpio = GPIO(self.board, backend=FileBackend(), sys_pwm=os.path.join(self.tmp, 'pwm'),
+                         ownership=self.owners)
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+        shutil.rmtree(self.tmp)
+
+    def test_failed_init_releases_claim(self):
+        self.assertRaises(ValueError, self.gpio.gpio_init, 38, 'bogus')
+        self.assertRaises(ValueError, self.gpio.gpio_init_many, [36, 38], 'bogus')
+        self.assertRaises(ValueError, self.gpio.eint_init, 38, 'bogus')
+        self.assertRaises(Exception, self.gpio.pwm_init, 22, 1000000, 0)
+        self.assertEqual(self.owners.owners(), {})
+        self.assertIsNone(self.gpio._regs)
+        self.gpio.gpio_init(38, 'out')
+        self.assertEqual(list(self.owners.owners()), [38])
+
+    def test_batch_abort_keeps_claims(self):
+        self.gpio.gpio_init(38, 'out')
+        self.gpio.eint_init(40, 'falling')
+
+        try:
+            with self.gpio.batch():
+                self.gpio.gpio_close(38)
+                self.gpio.eint_close(40)
+                self.gpio.gpio_init(40, 'out')
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        owners = self.owners.owners()
+        self.assertEqual(sorted(owners), [38, 40])
+        self.assertEqual(owners[40]['function'], 'eint')
+
+    def test_batch_commit_releases(self):
+        self.gpio.gpio_init_many([36, 38], 'out')
+
+        with self.gpio.batch():
+            self.gpio.gpio_close(38)
+            self.gpio.gpio_close(36)
+            self.gpio.gpio_init(36, 'in')
+            self.assertEqual(sorted(self.owners.owners()), [36, 38])
+
+        self.assertEqual(list(self.owners.owners()), [36])
+
+
+if __name__ == '__main__':
+    unittest.main()
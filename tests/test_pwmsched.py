@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from fgpio import GPIO, FileBackend, PWMScheduler
+from fgpio.bench import sys_pwm_dir
+from fgpio.boards import nanopi
+
+
+class PWMSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        board = nanopi.Config()
+        self.tmp = tempfile.mkdtemp()
+        self.gpio = GPIO(board, backend=FileBackend(), sys_pwm=sys_pwm_dir(board, os.path.join(self.tmp, 'pwm')))
+        self.gpio.pwm_init(22, 1000000, 0)
+
+    def tearDown(self):
+        self.gpio.pwm_close_all()
+        shutil.rmtree(self.tmp)
+
+    def test_stop_releases_wait(self):
+        sched = PWMScheduler(self.gpio, rate=100)
+        sched.start()
+        sched.transition(22, 60.0, duty=900000)
+        done = []
+        waiter = threading.Thread(target=lambda: done.append(sched.wait()))
+        waiter.start()
+        sched.stop()
+        waiter.join(5)
+        self.assertEqual(done, [True])
+        self.assertTrue(sched.wait())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from fgpio import GPIO, SimBackend, Sampler
+from fgpio.boards import nanopi
+
+
+class SamplerTest(unittest.TestCase):
+    def setUp(self):
+        board = nanopi.Config()
+        self.sim = SimBackend(board)
+        self.gpio = GPIO(board, backend=self.sim)
+        self.gpio.gpio_init(38, 'in')
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+
+    def capture(self, size, post):
+        sampler = Sampler(self.gpio, ['GPG'], size=size)
+        self.sim.drive(38, 1)
+        sampler.start(trigger=(38, 'falling'), post=post)
+        # Let the ring wrap before the trigger.
+        time.sleep(0.05)
+        self.sim.drive(38, 0)
+        self.assertTrue(sampler.wait(5))
+        self.assertTrue(sampler.triggered())
+        return sampler
+
+    def test_trigger_index_after_wrap(self):
+        sampler = self.capture(64, 16)
+        self.assertGreater(sampler.count, 64)
+        self.assertEqual(sampler.trigger_index, 64 - 16 - 1)
+        times, words = sampler.data()
+        bit = 1 << 10
+        self.assertEqual(times[sampler.trigger_index], sampler.trigger_time)
+        self.assertEqual(words['GPG'][sampler.trigger_index] & bit, 0)
+        self.assertEqual(words['GPG'][sampler.trigger_index - 1] & bit, bit)
+
+    def test_default_post_keeps_trigger(self):
+        sampler = self.capture(64, None)
+        self.assertEqual(sampler.trigger_index, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
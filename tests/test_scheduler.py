@@ -0,0 +1,57 @@
+import threading
+import unittest
+
+from fgpio import GPIO, SimBackend, OutputScheduler
+from fgpio.boards import nanopi
+
+
+class OutputSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        board = nanopi.Config()
+        self.gpio = GPIO(board, backend=SimBackend(board))
+        self.gpio.gpio_init(40, 'out')
+        self.sched = OutputScheduler(self.gpio)
+
+    def tearDown(self):
+        self.sched.stop()
+        self.gpio.gpio_close_all()
+
+    def waiter(self):
+        done = []
+        waiter = threading.Thread(target=lambda: done.append(self.sched.wait()))
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+        return waiter, done
+
+    def test_stop_releases_wait(self):
+        self.sched.start()
+        self.sched.schedule(self.sched.now() + 60 * 1000000000, 40, 1)
+        waiter, done = self.waiter()
+        self.sched.stop()
+        waiter.join(5)
+        self.assertEqual(done, [False])
+        self.assertEqual(self.sched.pending(), 1)
+
+    def test_error_releases_wait(self):
+        def lock(offset):
+            raise RuntimeError('lock')
+
+        self.sched.start()
+        self.sched.schedule(self.sched.now() + 60 * 1000000000, 40, 1)
+        waiter, done = self.waiter()
+        regs = self.gpio._regs
+        regs.lock = lock
+
+        try:
+            self.sched.schedule(self.sched.now(), 40, 1)
+            waiter.join(5)
+        finally:
+            del regs.lock
+
+        self.assertEqual(done, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from fgpio import GPIO, SimBackend
+from fgpio.snapshot import Snapshot
+from fgpio.boards import nanopi
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        board = nanopi.Config()
+        self.gpio = GPIO(board, backend=SimBackend(board))
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+
+    def test_restore_partial(self):
+        gpio = self.gpio
+        gpio.gpio_init_many([38, 40], 'out')
+        gpio.gpio_write(38, 1)
+        data = gpio.snapshot().to_dict()
+        # Keep GPG DATA only.
+        data['registers'] = {'0x64': data['registers']['0x64']}
+        gpio.gpio_write(38, 0)
+        gpio.gpio_write(40, 1)
+        gpio.gpio_direction(40, 'in')
+        self.assertEqual(gpio.restore(Snapshot.from_dict(data)), 1)
+        self.assertEqual(gpio.gpio_read(38), 1)
+        self.assertEqual(gpio.snapshot()[0x60] >> 22 & 3, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
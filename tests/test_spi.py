@@ -0,0 +1,27 @@
+import unittest
+from array import array
+
+from fgpio import GPIO, SimBackend
+from fgpio.spi import SPI
+from fgpio.boards import nanopi
+
+
+class SPITest(unittest.TestCase):
+    def setUp(self):
+        self.board = nanopi.Config()
+        self.gpio = GPIO(self.board, backend=SimBackend(self.board))
+        self.gpio.gpio_init_many([24, 29, 31], 'out')
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+
+    def test_loopback(self):
+        # MISO on MOSI reads back what is sent.
+        spi = SPI(self.gpio, sclk=29, mosi=31, miso=31, cs=24)
+
+        for data in (b'\x01\x80\x55', bytearray(b'\x01\x80\x55'), array('B', [1, 0x80, 0x55])):
+            self.assertEqual(bytes(spi.transfer(data)), b'\x01\x80\x55')
+
+
+if __name__ == '__main__':
+    unittest.main()
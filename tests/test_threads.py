@@ -0,0 +1,29 @@
+import unittest
+
+from fgpio import GPIO, FileBackend, SimBackend
+from fgpio.bench import bench_threads
+from fgpio.boards import nanopi
+
+PINS = [29, 31, 32, 33, 35, 36]
+
+
+class ThreadsTest(unittest.TestCase):
+    def setUp(self):
+        self.board = nanopi.Config()
+
+    def check(self, backend):
+        gpio = GPIO(self.board, backend=backend)
+        ret = bench_threads(gpio, PINS, 300)
+        self.assertEqual(ret['word']['lost'], 0)
+        self.assertEqual(ret['global']['lost'], 0)
+        self.assertGreater(ret['unlocked']['lost'], 0)
+
+    def test_file_backend(self):
+        self.check(FileBackend())
+
+    def test_sim_backend(self):
+        self.check(SimBackend(self.board))
+
+
+if __name__ == '__main__':
+    unittest.main()
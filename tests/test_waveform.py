@@ -0,0 +1,28 @@
+import os
+import time
+import unittest
+
+from fgpio import GPIO, FileBackend, Waveform
+from fgpio.boards import nanopi
+
+
+class WaveformTest(unittest.TestCase):
+    def setUp(self):
+        self.gpio = GPIO(nanopi.Config(), backend=FileBackend())
+        self.gpio.gpio_init_many([29, 31], 'out')
+
+    def tearDown(self):
+        self.gpio.gpio_close_all()
+
+    def test_last_step_sleeps(self):
+        wave = Waveform(self.gpio, [29, 31])
+        pattern = wave.compile([({29: 1}, 0.001), ({29: 0}, 0.2)])
+        cpu = sum(os.times()[:2])
+        start = time.time()
+        wave.play(pattern)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertLess(sum(os.times()[:2]) - cpu, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()